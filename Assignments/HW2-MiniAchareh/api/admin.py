@@ -1,6 +1,8 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User, Advertisement, Bid, Comment, Ticket
+from django.db.models import Q
+from .models import User, Advertisement, Bid, Comment, ContractorStats, Ticket
+from .search import fts_available, fts_query, matching_ids
 
 @admin.register(User)
 class CustomUserAdmin(UserAdmin):
@@ -21,6 +23,14 @@ class AdvertisementAdmin(admin.ModelAdmin):
     search_fields = ('title', 'description', 'owner__username')
     raw_id_fields = ('owner', 'assigned_contractor')
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term or not fts_available():
+            return super().get_search_results(request, queryset, search_term)
+        query = fts_query(search_term)
+        if query is None:
+            return queryset.none(), False
+        return queryset.filter(Q(id__in=matching_ids(query)) | Q(owner__username=search_term)), False
+
 @admin.register(Bid)
 class BidAdmin(admin.ModelAdmin):
     list_display = ('contractor', 'advertisement', 'created_at')
@@ -33,6 +43,12 @@ class CommentAdmin(admin.ModelAdmin):
     list_filter = ('score', 'created_at')
     search_fields = ('author__username', 'contractor__username', 'text')
 
+@admin.register(ContractorStats)
+class ContractorStatsAdmin(admin.ModelAdmin):
+    list_display = ('contractor', 'avg_score', 'comment_count', 'done_count', 'assigned_count', 'not_done_count')
+    search_fields = ('contractor__username',)
+    raw_id_fields = ('contractor',)
+
 @admin.register(Ticket)
 class TicketAdmin(admin.ModelAdmin):
     list_display = ('title', 'author', 'status', 'created_at', 'updated_at')
@@ -0,0 +1,164 @@
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework import exceptions, status
+from rest_framework.request import Request
+
+from .authentication import SignedTokenAuthentication
+from . import events
+from .cache import acached_leaderboard
+from .middleware import serialize
+from .models import User, Advertisement, Comment, ContractorStats
+from .pagination import KeysetPagination
+from .policies import ADVERTISEMENTS, USERS
+from .renderers import FastJSONRenderer
+from .scheduling import contractor_schedule, parse_day
+from .serializers import UserSerializer, ContractorSerializer, AdvertisementSerializer, CommentSerializer
+from .stats import rebuild_contractor_stats
+from .views import AdvertisementViewSet, contractor_leaderboard
+
+
+def render(data, status=status.HTTP_200_OK, headers=None):
+    # same bytes as the DRF endpoints produce
+    return HttpResponse(FastJSONRenderer().render(data), content_type='application/json', status=status, headers=headers)
+
+
+async def authenticate(request):
+    request = Request(request)
+    result = await SignedTokenAuthentication().aauthenticate(request)
+    user = result[0] if result else await request._request.auser()
+    if not user.is_authenticated:
+        raise exceptions.NotAuthenticated()
+    request.user = user
+    return request
+
+
+def read_view(view):
+    """
+    Async twin of a read-only API endpoint: bearer token or session auth,
+    DRF query params and DRF-style error bodies, without a worker thread per request.
+    """
+    @require_GET
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            return await view(await authenticate(request), *args, **kwargs)
+        except exceptions.APIException as exc:
+            headers = None
+            if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+                headers = {'WWW-Authenticate': SignedTokenAuthentication.keyword}
+            return render({'detail': exc.detail}, status=exc.status_code, headers=headers)
+    return wrapper
+
+
+async def get_visible(policy, queryset, request, pk, denied=None):
+    # PolicyMixin.get_object() for the async views
+    try:
+        return await policy.scope(queryset, request.user).aget(pk=pk)
+    except queryset.model.DoesNotExist:
+        if await queryset.model.objects.filter(pk=pk).aexists():
+            raise exceptions.PermissionDenied(denied)
+        raise exceptions.NotFound()
+
+
+@read_view
+async def advertisement_list(request):
+    # the sync viewset's filter backends (?q=, ?ordering=) build the queryset; only the fetch is async
+    view = AdvertisementViewSet(request=request, args=(), kwargs={}, action='list', format_kwarg=None)
+    queryset = view.filter_queryset(view.get_queryset())
+    page = await view.paginator.apaginate_queryset(queryset, request, view=view)
+    return render(view.paginator.get_paginated_response(serialize(AdvertisementSerializer(page, many=True))).data)
+
+
+@read_view
+async def advertisement_detail(request, pk):
+    ad = await get_visible(ADVERTISEMENTS, Advertisement.objects.select_related('owner'), request, pk)
+    return render(serialize(AdvertisementSerializer(ad)))
+
+
+async def contractor_stats(contractor_id):
+    try:
+        return await ContractorStats.objects.aget(contractor_id=contractor_id)
+    except ContractorStats.DoesNotExist:
+        await sync_to_async(rebuild_contractor_stats)([contractor_id])
+        return await ContractorStats.objects.aget(contractor_id=contractor_id)
+
+
+@read_view
+async def user_profile(request, pk):
+    user = await get_visible(USERS, User.objects.all(), request, pk, "Not allowed to view this profile.")
+
+    data = serialize(UserSerializer(user))
+    paginator = KeysetPagination()
+    if user.role == User.Role.CONTRACTOR:
+        comments = Comment.objects.filter(contractor_id=user.id).select_related('author').order_by('-created_at')
+        # one after the other: Django's async ORM runs every query through sync_to_async on the
+        # same database thread, so gathering them would not overlap anything
+        stats = await contractor_stats(user.id)
+        page = await paginator.apaginate_queryset(comments, request)
+        data['avg_score'] = stats.avg_score
+        data['done_ads_count'] = stats.done_count
+        data['in_progress_count'] = stats.assigned_count
+        data['not_done_count'] = stats.not_done_count
+        data['comments'] = serialize(CommentSerializer(page, many=True))
+        data['comments_next'] = paginator.get_next_link()
+    elif user.role == User.Role.CUSTOMER:
+        ads = Advertisement.objects.filter(owner_id=user.id).select_related('owner').order_by('-created_at')
+        page = await paginator.apaginate_queryset(ads, request)
+        data['ads'] = serialize(AdvertisementSerializer(page, many=True))
+        data['ads_next'] = paginator.get_next_link()
+    return render(data)
+
+
+@read_view
+async def contractor_list(request):
+    async def compute():
+        paginator = KeysetPagination()
+        page = await paginator.apaginate_queryset(contractor_leaderboard(request.query_params), request)
+        return paginator.get_paginated_response(serialize(ContractorSerializer(page, many=True))).data
+
+    data, outcome = await acached_leaderboard(request, compute)
+    return render(data, headers={'X-Cache': outcome})
+
+
+@read_view
+async def schedule(request):
+    if request.user.role != User.Role.CONTRACTOR:
+        raise exceptions.PermissionDenied()
+
+    day = None
+    date_str = request.query_params.get('date')
+    if date_str:
+        day = parse_day(date_str)
+        if day is None:
+            return render({"error": "date must be in YYYY-MM-DD format"}, status=status.HTTP_400_BAD_REQUEST)
+
+    ads = contractor_schedule(request.user.id, day).select_related('owner')
+    return render(serialize(AdvertisementSerializer([ad async for ad in ads.aiterator()], many=True)))
+
+
+@read_view
+async def event_stream(request):
+    """
+    Server-Sent Events for the requesting user: bid.created on their ads,
+    advertisement.assigned / marked_done / confirmed_done / cancelled on ads
+    they own or work on, and ticket.replied. Resumes after the Last-Event-ID
+    header (or ?last_event_id=) that EventSource sends when it reconnects.
+    """
+    if not isinstance(request._request, ASGIRequest):
+        return render({'detail': 'Event streams are served by the ASGI application (mini_achareh.asgi).'},
+                      status=status.HTTP_501_NOT_IMPLEMENTED)
+    last_event_id = request.META.get('HTTP_LAST_EVENT_ID') or request.query_params.get('last_event_id')
+    if last_event_id is not None:
+        try:
+            last_event_id = int(last_event_id)
+        except ValueError:
+            raise exceptions.ValidationError({'last_event_id': 'Must be an event id.'})
+    response = StreamingHttpResponse(events.stream(request.user.pk, last_event_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # nginx would otherwise hold the events back in its buffer
+    response['X-Accel-Buffering'] = 'no'
+    return response
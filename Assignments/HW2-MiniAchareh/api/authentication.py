@@ -0,0 +1,76 @@
+from rest_framework import authentication, exceptions
+from .cache import acache_user, aget_cached_user, cache_user, get_cached_user
+from .models import User
+from .tokens import ACCESS, InvalidToken, averify, verify
+
+
+def active(user):
+    if user is None or not user.is_active:
+        raise exceptions.AuthenticationFailed('User inactive or deleted.')
+    return user
+
+
+def user_from_claims(claims):
+    # the user as it is now, not as the token saw it: a role change or deactivation applies on the next request
+    user, version = get_cached_user(claims['uid'])
+    if user is None:
+        user = User.objects.filter(pk=claims['uid']).first()
+        if user is not None:
+            cache_user(user, version)
+    return active(user)
+
+
+async def auser_from_claims(claims):
+    """user_from_claims() for the async views."""
+    user, version = await aget_cached_user(claims['uid'])
+    if user is None:
+        user = await User.objects.filter(pk=claims['uid']).afirst()
+        if user is not None:
+            await acache_user(user, version)
+    return active(user)
+
+
+class SignedTokenAuthentication(authentication.BaseAuthentication):
+    """
+    `Authorization: Bearer <access token>` issued by /api/token/.
+
+    The token is checked against the deny-list and the user is read from the
+    shared user cache (api.cache), both without a database query; the user
+    row is only read when its cached copy is missing or older than its last save.
+    """
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        token = self.get_token(request)
+        if token is None:
+            return None
+        try:
+            claims = verify(token, ACCESS)
+        except InvalidToken as exc:
+            raise exceptions.AuthenticationFailed(str(exc))
+        return user_from_claims(claims), claims
+
+    async def aauthenticate(self, request):
+        """authenticate() for the async views."""
+        token = self.get_token(request)
+        if token is None:
+            return None
+        try:
+            claims = await averify(token, ACCESS)
+        except InvalidToken as exc:
+            raise exceptions.AuthenticationFailed(str(exc))
+        return await auser_from_claims(claims), claims
+
+    def get_token(self, request):
+        header = authentication.get_authorization_header(request).split()
+        if not header or header[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(header) != 2:
+            raise exceptions.AuthenticationFailed('Invalid token header.')
+        try:
+            return header[1].decode()
+        except UnicodeError:
+            raise exceptions.AuthenticationFailed('Invalid token.')
+
+    def authenticate_header(self, request):
+        return self.keyword
@@ -1,18 +1,51 @@
+import re
 from django.contrib.auth.backends import ModelBackend
 from django.contrib.auth import get_user_model
-from django.db.models import Q
+from .cache import get_cached_user, cache_user
 
 User = get_user_model()
 
+PHONE_RE = re.compile(r'^\+?\d{7,15}$')
+
+
+def identifier_field(identifier):
+    """Pick the single unique column an identifier can match, so the lookup hits exactly one index."""
+    if '@' in identifier:
+        return 'email'
+    if PHONE_RE.match(identifier):
+        return 'phone_number'
+    return 'username'
+
+
 class EmailPhoneUsernameBackend(ModelBackend):
     def authenticate(self, request, username=None, password=None, **kwargs):
-        try:
-            user = User.objects.get(
-                Q(username=username) | Q(email=username) | Q(phone_number=username)
-            )
-        except User.DoesNotExist:
+        if not username or password is None:
+            return None
+        field = identifier_field(username)
+        user = self.lookup(field, username)
+        if user is None and field != 'username':
+            # usernames may also contain '@' or be all digits
+            user = self.lookup('username', username)
+        if user is None:
             return None
 
         if user.check_password(password) and self.user_can_authenticate(user):
             return user
         return None
+
+    @staticmethod
+    def lookup(field, value):
+        try:
+            return User.objects.get(**{field: value})
+        except User.DoesNotExist:
+            return None
+
+    def get_user(self, user_id):
+        user, version = get_cached_user(user_id)
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                cache_user(user, version)
+        elif not self.user_can_authenticate(user):
+            return None
+        return user
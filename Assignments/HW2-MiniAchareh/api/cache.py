@@ -0,0 +1,230 @@
+import asyncio
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import caches
+
+LEADERBOARD_PARAMS = ('min_score', 'min_comments', 'ordering', 'cursor', 'page_size')
+GENERATION_KEY = 'leaderboard:generation'
+COUNTER_KEYS = {'hit': 'leaderboard:hits', 'miss': 'leaderboard:misses', 'stale': 'leaderboard:stale'}
+
+HIT, MISS, STALE = 'HIT', 'MISS', 'STALE'
+
+# bump when the User model changes shape so old pickled rows are never read back
+USER_CACHE_VERSION = 1
+
+
+def get_cache():
+    return caches[getattr(settings, 'API_CACHE_ALIAS', 'default')]
+
+
+def leaderboard_key(request):
+    """Cache key for the normalized leaderboard parameters; unknown parameters do not fragment the cache."""
+    params = sorted(
+        (name, request.query_params.get(name).strip())
+        for name in LEADERBOARD_PARAMS if request.query_params.get(name, '').strip()
+    )
+    raw = request.get_host() + request.path + '?' + '&'.join(f'{name}={value}' for name, value in params)
+    return 'leaderboard:page:' + hashlib.sha1(raw.encode()).hexdigest()
+
+
+def current_generation(cache):
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        # an evicted counter must not make old pages look fresh again
+        cache.add(GENERATION_KEY, time.time_ns(), timeout=None)
+        generation = cache.get(GENERATION_KEY)
+    return generation
+
+
+def invalidate_leaderboard():
+    get_cache().set(GENERATION_KEY, time.time_ns(), timeout=None)
+
+
+def count(cache, outcome):
+    key = COUNTER_KEYS[outcome]
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        pass
+
+
+def lookup_leaderboard(cache, key):
+    """
+    Return (data, outcome, generation, locked) for a cached leaderboard page.
+
+    Pages are stored with the generation they were computed in. Whether the
+    page is missing or from an older generation, exactly one request, holding
+    a short lock, recomputes it. Meanwhile an old page is served as STALE,
+    and without one the other requests wait for the lock holder's page
+    (wait_for_leaderboard()). `outcome` is None when the caller has to
+    compute the page itself (`locked`) or wait for it (not `locked`).
+    """
+    generation = current_generation(cache)
+    entry = cache.get(key)
+
+    if entry is not None and entry['generation'] == generation:
+        count(cache, 'hit')
+        return entry['data'], HIT, generation, False
+
+    if cache.add(key + ':lock', 1, timeout=getattr(settings, 'LEADERBOARD_LOCK_TIMEOUT', 30)):
+        return None, None, generation, True
+    if entry is not None:
+        count(cache, 'stale')
+        return entry['data'], STALE, generation, False
+    return None, None, generation, False
+
+
+def waited_page(cache, key):
+    entry = cache.get(key)
+    if entry is not None:
+        count(cache, 'hit')
+        return entry['data']
+    return None
+
+
+def wait_for_leaderboard(cache, key):
+    """
+    Poll for the page another request is computing. Return None if it has
+    not arrived within LEADERBOARD_WAIT_TIMEOUT (the lock holder died or is
+    slow); the caller then computes the page itself.
+    """
+    deadline = time.monotonic() + getattr(settings, 'LEADERBOARD_WAIT_TIMEOUT', 5)
+    while time.monotonic() < deadline:
+        time.sleep(getattr(settings, 'LEADERBOARD_WAIT_INTERVAL', 0.05))
+        data = waited_page(cache, key)
+        if data is not None:
+            return data
+    return None
+
+
+async def await_leaderboard(cache, key):
+    """wait_for_leaderboard() for async views."""
+    deadline = time.monotonic() + getattr(settings, 'LEADERBOARD_WAIT_TIMEOUT', 5)
+    while time.monotonic() < deadline:
+        await asyncio.sleep(getattr(settings, 'LEADERBOARD_WAIT_INTERVAL', 0.05))
+        data = waited_page(cache, key)
+        if data is not None:
+            return data
+    return None
+
+
+def store_leaderboard(cache, key, generation, data):
+    cache.set(key, {'generation': generation, 'data': data},
+              timeout=getattr(settings, 'LEADERBOARD_CACHE_TIMEOUT', 300))
+    count(cache, 'miss')
+
+
+def cached_leaderboard(request, compute):
+    """Return (data, outcome) for a leaderboard page, calling compute() on a miss."""
+    cache = get_cache()
+    key = leaderboard_key(request)
+    data, outcome, generation, locked = lookup_leaderboard(cache, key)
+    if outcome:
+        return data, outcome
+    if not locked:
+        data = wait_for_leaderboard(cache, key)
+        if data is not None:
+            return data, HIT
+    try:
+        data = compute()
+        store_leaderboard(cache, key, generation, data)
+    finally:
+        if locked:
+            cache.delete(key + ':lock')
+    return data, MISS
+
+
+async def acached_leaderboard(request, compute):
+    """cached_leaderboard() for async views; compute is a coroutine function."""
+    cache = get_cache()
+    key = leaderboard_key(request)
+    data, outcome, generation, locked = lookup_leaderboard(cache, key)
+    if outcome:
+        return data, outcome
+    if not locked:
+        data = await await_leaderboard(cache, key)
+        if data is not None:
+            return data, HIT
+    try:
+        data = await compute()
+        store_leaderboard(cache, key, generation, data)
+    finally:
+        if locked:
+            cache.delete(key + ':lock')
+    return data, MISS
+
+
+def leaderboard_cache_stats():
+    cache = get_cache()
+    values = cache.get_many(COUNTER_KEYS.values())
+    stats = {outcome: values.get(key, 0) for outcome, key in COUNTER_KEYS.items()}
+    total = sum(stats.values())
+    stats['hit_ratio'] = (stats['hit'] + stats['stale']) / total if total else None
+    return stats
+
+
+def get_user_cache():
+    return caches[getattr(settings, 'USER_CACHE_ALIAS', 'default')]
+
+
+def user_key(user_id):
+    return f'auth:user:{user_id}:v{USER_CACHE_VERSION}'
+
+
+def user_version_key(user_id):
+    return f'auth:user:{user_id}:version'
+
+
+def get_cached_user(user_id):
+    """
+    Return (user, version) for `user_id`; user is None unless the cached copy
+    was stored under the user's current version.
+
+    Every write to the user bumps the version (invalidate_user()), so copies
+    cached by any worker, including one that read the row just before the
+    write, stop matching at once. Pass `version` on to cache_user().
+    """
+    cache = get_user_cache()
+    key, version_key = user_key(user_id), user_version_key(user_id)
+    found = cache.get_many([key, version_key])
+    version = found.get(version_key)
+    if version is None:
+        # an evicted version must not make old copies look current again
+        cache.add(version_key, time.time_ns(), timeout=None)
+        version = cache.get(version_key)
+    return current_copy(found.get(key), version), version
+
+
+async def aget_cached_user(user_id):
+    """get_cached_user() for async views."""
+    cache = get_user_cache()
+    key, version_key = user_key(user_id), user_version_key(user_id)
+    found = await cache.aget_many([key, version_key])
+    version = found.get(version_key)
+    if version is None:
+        await cache.aadd(version_key, time.time_ns(), timeout=None)
+        version = await cache.aget(version_key)
+    return current_copy(found.get(key), version), version
+
+
+def current_copy(entry, version):
+    if entry is not None and entry['version'] == version:
+        return entry['user']
+    return None
+
+
+def cache_user(user, version):
+    # stored under the version read before the row was, so a write in between is never cached
+    get_user_cache().set(user_key(user.pk), {'version': version, 'user': user},
+                         timeout=getattr(settings, 'USER_CACHE_TIMEOUT', 300))
+
+
+async def acache_user(user, version):
+    await get_user_cache().aset(user_key(user.pk), {'version': version, 'user': user},
+                                timeout=getattr(settings, 'USER_CACHE_TIMEOUT', 300))
+
+
+def invalidate_user(user_id):
+    get_user_cache().set(user_version_key(user_id), time.time_ns(), timeout=None)
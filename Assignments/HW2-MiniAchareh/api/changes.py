@@ -0,0 +1,248 @@
+import base64
+import json
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Exists, Max, OuterRef, QuerySet
+from django.utils import timezone
+from rest_framework import exceptions, permissions, status, views
+from rest_framework.response import Response
+from .models import User, Advertisement, Bid, Change, Comment, Ticket
+from .policies import ADVERTISEMENTS, BIDS, COMMENTS, TICKETS
+from .readers import values_reader
+from .serializers import AdvertisementSerializer, BidSerializer, CommentSerializer, TicketSerializer
+
+# Change.kind -> (model, read policy, serializer, key in the feed)
+SYNCED = {
+    Change.Kind.ADVERTISEMENT: (Advertisement, ADVERTISEMENTS, AdvertisementSerializer, 'advertisements'),
+    Change.Kind.BID: (Bid, BIDS, BidSerializer, 'bids'),
+    Change.Kind.COMMENT: (Comment, COMMENTS, CommentSerializer, 'comments'),
+    Change.Kind.TICKET: (Ticket, TICKETS, TicketSerializer, 'tickets'),
+}
+KINDS = {model: kind for kind, (model, _, _, _) in SYNCED.items()}
+
+
+def retention():
+    return settings.CHANGE_LOG_RETENTION
+
+
+# Change.audience values; a user's feed reads the entries of their own three
+EVERYONE = 'all'
+
+
+def role_audience(role):
+    return f'role:{role}'
+
+
+def user_audience(user_id):
+    return f'user:{user_id}'
+
+
+def audiences(user):
+    return [EVERYONE, role_audience(user.role), user_audience(user.pk)]
+
+
+def advertisement_audience(row):
+    audience = {role_audience(User.Role.ADMIN), role_audience(User.Role.SUPPORT), user_audience(row['owner_id'])}
+    if row['assigned_contractor_id'] is not None:
+        audience.add(user_audience(row['assigned_contractor_id']))
+    if row['status'] == Advertisement.Status.OPEN:
+        audience.add(role_audience(User.Role.CONTRACTOR))
+    return audience
+
+
+def bid_audience(row):
+    return {user_audience(row['contractor_id']), user_audience(row['advertisement__owner_id'])}
+
+
+def comment_audience(row):
+    return {EVERYONE}
+
+
+def ticket_audience(row):
+    return {role_audience(User.Role.SUPPORT), user_audience(row['author_id'])}
+
+
+# Change.kind -> (columns, who may read a row with those values); these mirror the
+# read rules of api.policies and must change with them
+AUDIENCES = {
+    Change.Kind.ADVERTISEMENT: (('owner_id', 'assigned_contractor_id', 'status'), advertisement_audience),
+    Change.Kind.BID: (('contractor_id', 'advertisement__owner_id'), bid_audience),
+    Change.Kind.COMMENT: ((), comment_audience),
+    Change.Kind.TICKET: (('author_id',), ticket_audience),
+}
+
+
+def instance_row(instance, columns):
+    row = {'pk': instance.pk}
+    for column in columns:
+        if column == 'advertisement__owner_id':
+            row[column] = instance.advertisement.owner_id
+        else:
+            row[column] = getattr(instance, column)
+    return row
+
+
+def record(model, rows, action=Change.Action.UPDATED):
+    """
+    Log `action` on `rows` of `model`: instances, or a queryset of them. Each
+    entry goes to whoever could read the row as it is now or, for instances
+    that remember their loaded state, as it was before this write.
+    """
+    kind = KINDS[model]
+    columns, audience = AUDIENCES[kind]
+    if isinstance(rows, QuerySet):
+        states = [(row, row) for row in rows.values('pk', *columns)]
+    else:
+        states = []
+        for instance in rows:
+            row = instance_row(instance, columns)
+            loaded = instance.loaded_state() if hasattr(instance, 'loaded_state') else None
+            states.append((row, {**row, **loaded} if loaded else row))
+    Change.objects.bulk_create([
+        Change(kind=kind, object_id=row['pk'], action=action, audience=value)
+        for row, before in states
+        for value in sorted(audience(row) | audience(before))
+    ])
+
+
+def encode_token(position, at):
+    payload = json.dumps([position, int(at.timestamp())], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_token(token):
+    try:
+        position, at = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        return int(position), datetime.fromtimestamp(int(at), dt_timezone.utc)
+    except (TypeError, ValueError, OverflowError):
+        raise exceptions.ValidationError({'since': 'Invalid token.'})
+
+
+class ChangeLogTrimmed(exceptions.APIException):
+    status_code = status.HTTP_410_GONE
+    default_detail = 'Token is older than the change log retention; fetch the lists again and start from a new token.'
+    default_code = 'change_log_trimmed'
+
+
+def current_rows(kind, pks, user):
+    """The rows among `pks` that `user` can read now, rendered like the list endpoint."""
+    model, policy, serializer_class, _ = SYNCED[kind]
+    queryset = policy.scope(model.objects.all(), user).filter(pk__in=pks).order_by('pk')
+    reader = values_reader(serializer_class)
+    if reader is None:
+        return [(obj.pk, data) for obj, data in zip(queryset, serializer_class(queryset, many=True).data)]
+    rows = list(reader.values(queryset, ['pk']))
+    return [(row['pk'], data) for row, data in zip(rows, reader.represent(rows))]
+
+
+class ChangeFeedView(views.APIView):
+    """
+    Rows of the synced models changed after `?since=<token>`, grouped per model:
+    `saved` holds the current representation of each row the user can read,
+    `removed` the ids that were deleted or are no longer visible to them. A row
+    changed several times in the batch appears once, so a client that applies
+    the batch and keeps `next` is in sync with the lists. Only entries of rows
+    the user could read before or after the write are read, so `removed` holds
+    only rows the user could see at some point.
+
+    Without `since` the response is empty and `next` points at the head of the
+    log: take it before fetching the lists. Tokens older than
+    CHANGE_LOG_RETENTION answer 410, since compaction may have removed entries
+    after them.
+
+    A batch is an index range scan per audience of the user plus one query per
+    model with changes, whatever the size of the tables. SQLite has a single writer, so
+    log ids become visible in order and a position is never skipped.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    page_size = 100
+    max_page_size = 1000
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params['page_size'])
+        except (KeyError, ValueError):
+            return self.page_size
+        return self.page_size if size <= 0 else min(size, self.max_page_size)
+
+    def get_kinds(self, request):
+        names = request.query_params.get('types')
+        if not names:
+            return list(SYNCED)
+        by_name = {key: kind for kind, (_, _, _, key) in SYNCED.items()}
+        try:
+            return [by_name[name.strip()] for name in names.split(',')]
+        except KeyError:
+            raise exceptions.ValidationError({'types': f'Choose from {", ".join(by_name)}.'})
+
+    def get(self, request):
+        now = timezone.now()
+        token = request.query_params.get('since')
+        if not token:
+            head = Change.objects.aggregate(head=Max('id'))['head'] or 0
+            return Response({'next': encode_token(head, now), 'has_more': False})
+
+        position, at = decode_token(token)
+        if at < now - retention():
+            raise ChangeLogTrimmed()
+
+        size = self.get_page_size(request)
+        entries = list(Change.objects.filter(audience__in=audiences(request.user), id__gt=position,
+                                             kind__in=self.get_kinds(request))
+                       .order_by('id').values_list('id', 'kind', 'object_id', 'action', 'at')[:size + 1])
+        has_more = len(entries) > size
+        entries = entries[:size]
+
+        # a row's later entries supersede its earlier ones; the current row says it all.
+        # Rows created inside the batch were never on the client, so they need no removal.
+        changed = {}
+        for _, kind, object_id, action, _ in entries:
+            changed.setdefault(kind, {}).setdefault(object_id, action != Change.Action.CREATED)
+
+        data = {}
+        for kind, pks in changed.items():
+            saved = current_rows(kind, list(pks), request.user)
+            visible = {pk for pk, _ in saved}
+            removed = [pk for pk, existed in pks.items() if existed and pk not in visible]
+            if saved or removed:
+                data[SYNCED[kind][3]] = {'saved': [row for _, row in saved], 'removed': removed}
+
+        if entries:
+            position = entries[-1][0]
+        # entries after the last one were written no earlier than it was, or than now once caught up
+        at = entries[-1][4] if has_more else now
+        return Response({'next': encode_token(position, at), 'has_more': has_more, **data})
+
+
+def compact(batch_size=1000, pause=0.0):
+    """
+    Delete log entries older than CHANGE_LOG_RETENTION, then entries superseded
+    by a later one for the same row, in batches. Returns the number deleted.
+    """
+    cutoff = timezone.now() - retention()
+    deleted = 0
+    while True:
+        ids = list(Change.objects.filter(at__lt=cutoff).order_by('at').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            break
+        deleted += Change.objects.filter(id__in=ids).delete()[0]
+        if pause:
+            time.sleep(pause)
+
+    # per audience: a later entry only stands in for an earlier one if the same users read it
+    superseded = Exists(Change.objects.filter(kind=OuterRef('kind'), object_id=OuterRef('object_id'),
+                                              audience=OuterRef('audience'), id__gt=OuterRef('id')))
+    position = 0
+    while True:
+        window = list(Change.objects.filter(id__gt=position).order_by('id').values_list('id', flat=True)[:batch_size])
+        if not window:
+            break
+        position = window[-1]
+        ids = list(Change.objects.filter(superseded, id__in=window).values_list('id', flat=True))
+        if ids:
+            deleted += Change.objects.filter(id__in=ids).delete()[0]
+            if pause:
+                time.sleep(pause)
+    return deleted
@@ -0,0 +1,139 @@
+import re
+import zlib
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ACCEPT_ENCODING = re.compile(r'\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?\s*(?:,|$)')
+
+# Only what the API renderers produce. HTML pages (admin, browsable API) carry CSRF
+# tokens next to reflected input, which compression would expose to BREACH.
+COMPRESSED_TYPES = {'application/json', 'application/msgpack', 'text/csv', 'application/x-ndjson'}
+
+
+def setting(name, default):
+    return getattr(settings, 'RESPONSE_COMPRESSION_' + name, default)
+
+
+class Gzip:
+    name = 'gzip'
+
+    @staticmethod
+    def compressor():
+        return zlib.compressobj(setting('GZIP_LEVEL', 6), zlib.DEFLATED, 31)
+
+    @staticmethod
+    def flush(compressor):
+        # ends the current deflate block so the chunk can be decoded right away
+        return compressor.flush(zlib.Z_SYNC_FLUSH)
+
+
+class Zstd:
+    name = 'zstd'
+
+    @staticmethod
+    def compressor():
+        return zstandard.ZstdCompressor(level=setting('ZSTD_LEVEL', 3)).compressobj()
+
+    @staticmethod
+    def flush(compressor):
+        return compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+
+CODECS = [Zstd, Gzip] if zstandard is not None else [Gzip]
+
+
+def choose_codec(accept_encoding):
+    """The first of CODECS the client accepts with a non-zero q-value, or None."""
+    accepted = {}
+    for name, q in ACCEPT_ENCODING.findall(accept_encoding.lower()):
+        try:
+            accepted[name] = float(q) if q else 1.0
+        except ValueError:
+            accepted[name] = 0.0
+    for codec in CODECS:
+        if accepted.get(codec.name, accepted.get('*', 0.0)) > 0:
+            return codec
+    return None
+
+
+def compress_stream(codec, chunks):
+    compressor = codec.compressor()
+    for chunk in chunks:
+        data = compressor.compress(chunk) + codec.flush(compressor)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+async def acompress_stream(codec, chunks):
+    compressor = codec.compressor()
+    async for chunk in chunks:
+        data = compressor.compress(chunk) + codec.flush(compressor)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+class CompressionMiddleware:
+    """
+    zstd (when zstandard is installed) or gzip, picked from Accept-Encoding,
+    for the COMPRESSED_TYPES of the API.
+
+    Whole responses are compressed from RESPONSE_COMPRESSION_MIN_SIZE bytes
+    up and only if that makes them smaller; streamed responses (the exports)
+    are compressed chunk by chunk, flushing after each one. Strong ETags are
+    weakened like django.middleware.gzip does.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.compress(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.compress(request, await self.get_response(request))
+
+    def compress(self, request, response):
+        media_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        if response.has_header('Content-Encoding') or media_type not in COMPRESSED_TYPES:
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        codec = choose_codec(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if codec is None:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = acompress_stream(codec, response.streaming_content)
+            else:
+                response.streaming_content = compress_stream(codec, response.streaming_content)
+            del response['Content-Length']
+        else:
+            if len(response.content) < setting('MIN_SIZE', 1024):
+                return response
+            compressor = codec.compressor()
+            compressed = compressor.compress(response.content) + compressor.flush()
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = codec.name
+        return response
@@ -0,0 +1,244 @@
+import asyncio
+import logging
+
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from .models import Event
+from .renderers import FastJSONRenderer
+
+logger = logging.getLogger(__name__)
+
+# queued in place of an event: write a comment line so proxies keep the connection open
+KEEPALIVE = None
+
+# events are passed around as (id, user_id, type, data)
+COLUMNS = ('id', 'user_id', 'type', 'data')
+
+_backend = None
+
+
+def backend():
+    """The EVENT_FANOUT_BACKEND instance of this process."""
+    global _backend
+    if _backend is None:
+        _backend = import_string(settings.EVENT_FANOUT_BACKEND)()
+    return _backend
+
+
+def publish(user_ids, type, data):
+    """Store a `type` event for each of `user_ids` and fan it out once the transaction commits."""
+    events = Event.objects.bulk_create([
+        Event(user_id=user_id, type=type, data=data) for user_id in dict.fromkeys(user_ids) if user_id is not None
+    ])
+    if events:
+        messages = [(event.id, event.user_id, event.type, event.data) for event in events]
+        transaction.on_commit(lambda: backend().published(messages))
+
+
+def publish_advertisement(ad, type):
+    """Tell the owner and the assigned contractor about a lifecycle step of `ad`."""
+    publish([ad.owner_id, ad.assigned_contractor_id], type, {
+        'advertisement': ad.pk,
+        'status': ad.status,
+        'assigned_contractor': ad.assigned_contractor_id,
+        'contractor_done': ad.contractor_done,
+    })
+
+
+class Subscriber:
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.queue = asyncio.Queue(settings.EVENT_STREAM_BUFFER)
+        self.overflowed = False
+
+
+class Hub:
+    """
+    The open streams of this process, by user, on the event loop of the ASGI
+    server. An idle stream is a coroutine waiting on its queue: one timer for
+    the keep-alives serves every subscriber, so it costs no CPU of its own.
+
+    A subscriber whose buffer of EVENT_STREAM_BUFFER events fills up is
+    dropped instead of buffering without bound; its stream ends once the
+    buffer is drained and the client resumes from Last-Event-ID.
+    """
+
+    def __init__(self):
+        self.loop = None
+        self.subscribers = {}
+        self.fanout = None
+        self.started = None
+        self.keepalive = None
+
+    async def subscribe(self, user_id):
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            self.loop, self.subscribers, self.fanout = loop, {}, None
+        subscriber = Subscriber(user_id)
+        self.subscribers.setdefault(user_id, set()).add(subscriber)
+        if self.fanout is None:
+            self.fanout = backend()
+            self.started = loop.create_task(self.fanout.start(self))
+            self.keepalive = loop.create_task(self.send_keepalives())
+        try:
+            # the fanout knows where the live events start before anyone replays
+            await asyncio.shield(self.started)
+        except BaseException:
+            self.unsubscribe(subscriber)
+            raise
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        subscribers = self.subscribers.get(subscriber.user_id)
+        if subscribers is None:
+            return
+        subscribers.discard(subscriber)
+        if not subscribers:
+            del self.subscribers[subscriber.user_id]
+        if not self.subscribers and self.fanout is not None:
+            self.started.cancel()
+            self.keepalive.cancel()
+            self.fanout.stop()
+            self.fanout = self.started = self.keepalive = None
+
+    def deliver(self, messages):
+        for message in messages:
+            for subscriber in list(self.subscribers.get(message[1], ())):
+                try:
+                    subscriber.queue.put_nowait(message)
+                except asyncio.QueueFull:
+                    subscriber.overflowed = True
+                    self.unsubscribe(subscriber)
+
+    def deliver_threadsafe(self, messages):
+        loop = self.loop
+        if loop is None or loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is loop:
+            self.deliver(messages)
+        else:
+            loop.call_soon_threadsafe(self.deliver, messages)
+
+    async def send_keepalives(self):
+        while True:
+            await asyncio.sleep(settings.EVENT_HEARTBEAT)
+            for subscribers in list(self.subscribers.values()):
+                for subscriber in subscribers:
+                    if subscriber.queue.empty():
+                        subscriber.queue.put_nowait(KEEPALIVE)
+
+
+hub = Hub()
+
+
+class LocalFanout:
+    """Events reach the streams of the publishing process only; enough for one ASGI worker."""
+
+    async def start(self, hub):
+        pass
+
+    def stop(self):
+        pass
+
+    def published(self, messages):
+        hub.deliver_threadsafe(messages)
+
+
+class DatabaseFanout:
+    """
+    Events reach the streams of every process: while a worker has subscribers
+    it reads new Event rows with one primary key range query per
+    EVENT_POLL_INTERVAL, however many streams are open. Publishers need no
+    connection to the workers, so sync views under WSGI work too.
+    """
+
+    def __init__(self):
+        self.task = None
+
+    async def start(self, hub):
+        position = (await Event.objects.aaggregate(last=Max('id')))['last'] or 0
+        self.task = asyncio.get_running_loop().create_task(self.poll(hub, position))
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    def published(self, messages):
+        pass
+
+    async def poll(self, hub, position):
+        while True:
+            await asyncio.sleep(settings.EVENT_POLL_INTERVAL)
+            try:
+                messages = [row async for row in Event.objects.filter(id__gt=position)
+                            .order_by('id').values_list(*COLUMNS)[:1000]]
+            except DatabaseError:
+                # e.g. the database is locked by a long write; the next poll catches up
+                logger.warning('Polling events failed', exc_info=True)
+                continue
+            if messages:
+                position = messages[-1][0]
+                hub.deliver(messages)
+
+
+def encode(message):
+    event_id, _, type, data = message
+    return b'id: %d\nevent: %s\ndata: %s\n\n' % (event_id, type.encode(), FastJSONRenderer().render(data))
+
+
+async def replay(user_id, position):
+    """Stored events of `user_id` after `position`; a `reset` first if older ones may have been pruned."""
+    first = (await Event.objects.aaggregate(first=Min('id')))['first']
+    if first is not None and position + 1 < first:
+        yield b'event: reset\ndata: {}\n\n', position
+    while True:
+        messages = [row async for row in Event.objects.filter(user_id=user_id, id__gt=position)
+                    .order_by('id').values_list(*COLUMNS)[:500]]
+        if not messages:
+            return
+        for message in messages:
+            position = message[0]
+            yield encode(message), position
+
+
+async def stream(user_id, last_event_id=None):
+    """
+    The text/event-stream body for `user_id`: events after `last_event_id`
+    from the table, then live ones from the hub. The subscription comes first
+    so nothing published during the replay is lost; duplicates are skipped by id.
+    """
+    subscriber = await hub.subscribe(user_id)
+    try:
+        yield b'retry: %d\n\n' % settings.EVENT_RETRY_MS
+        position = last_event_id
+        if position is not None:
+            async for chunk, position in replay(user_id, position):
+                yield chunk
+        while not (subscriber.overflowed and subscriber.queue.empty()):
+            message = await subscriber.queue.get()
+            if message is KEEPALIVE:
+                yield b': keep-alive\n\n'
+            elif position is None or message[0] > position:
+                position = message[0]
+                yield encode(message)
+    finally:
+        hub.unsubscribe(subscriber)
+
+
+def prune(batch_size=1000):
+    """Delete events older than EVENT_RETENTION in batches; returns how many went."""
+    cutoff = timezone.now() - settings.EVENT_RETENTION
+    deleted = 0
+    while True:
+        ids = list(Event.objects.filter(created_at__lt=cutoff).order_by('created_at').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += Event.objects.filter(id__in=ids).delete()[0]
@@ -0,0 +1,123 @@
+import csv
+import datetime
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework import filters, generics, permissions
+from .filters import CommentFilter, AdvertisementSearchFilter
+from .models import Advertisement, Comment, Ticket
+from .pagination import KeysetPagination
+from .permissions import IsSupportOrAdmin
+from .renderers import CSVRenderer, NDJSONRenderer
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+class ExportView(generics.GenericAPIView):
+    """
+    Stream every row matching the list endpoint's filters as CSV or NDJSON.
+
+    Rows are read with values_list() in keyset batches of `chunk_size`, like
+    KeysetPagination: each batch is one short query that has finished before
+    its rows are sent. A slow download therefore holds no read open on SQLite
+    and writers are never locked out. Foreign keys are resolved by the same
+    query's joins, no model instances are built and memory stays flat whatever
+    the table size.
+    """
+    permission_classes = [permissions.IsAuthenticated, IsSupportOrAdmin]
+    renderer_classes = [NDJSONRenderer, CSVRenderer]
+    pagination_class = None
+    chunk_size = 2000
+    export_fields = ()
+    ordering = ['-created_at']
+
+    def get(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        names = [name for name, _ in self.export_fields]
+        rows = self.batches(queryset)
+
+        if request.accepted_renderer.format == 'csv':
+            body = self.csv_stream(names, rows)
+        else:
+            body = self.ndjson_stream(names, rows)
+        response = StreamingHttpResponse(body, content_type=request.accepted_renderer.media_type)
+        response['Content-Disposition'] = f'attachment; filename="{self.export_name}.{request.accepted_renderer.format}"'
+        return response
+
+    def batches(self, queryset):
+        ordering = KeysetPagination().get_ordering(queryset, self)
+        paths = [path for _, path in self.export_fields]
+        # the ordering columns that are not exported already are fetched after the exported ones
+        keys = [name.lstrip('-') for name in ordering]
+        extra = [key for key in keys if key not in paths]
+        columns = paths + extra
+        key_index = [columns.index(key) for key in keys]
+
+        queryset = queryset.order_by(*ordering)
+        position = None
+        while True:
+            batch = queryset
+            if position is not None:
+                batch = batch.filter(KeysetPagination._keyset_filter(ordering, position))
+            rows = list(batch.values_list(*columns)[:self.chunk_size])
+            for row in rows:
+                yield row[:len(paths)]
+            if len(rows) < self.chunk_size:
+                return
+            position = [rows[-1][index] for index in key_index]
+
+    @staticmethod
+    def csv_stream(names, rows):
+        writer = csv.writer(Echo())
+        # dates and times are written the way the NDJSON export writes them
+        encoder = DjangoJSONEncoder()
+        temporal = (datetime.date, datetime.time, datetime.timedelta)
+        yield writer.writerow(names)
+        for row in rows:
+            yield writer.writerow([encoder.default(value) if isinstance(value, temporal) else value for value in row])
+
+    @staticmethod
+    def ndjson_stream(names, rows):
+        encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(',', ':'))
+        for row in rows:
+            yield encoder.encode(dict(zip(names, row))) + '\n'
+
+
+class AdvertisementExportView(ExportView):
+    queryset = Advertisement.objects.all()
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, AdvertisementSearchFilter]
+    ordering_fields = ['created_at']
+    export_name = 'advertisements'
+    export_fields = (
+        ('id', 'id'), ('title', 'title'), ('description', 'description'), ('category', 'category'),
+        ('status', 'status'), ('owner', 'owner__username'), ('assigned_contractor', 'assigned_contractor__username'),
+        ('execution_time', 'execution_time'), ('location', 'location'), ('contractor_done', 'contractor_done'),
+        ('customer_confirmed', 'customer_confirmed'), ('created_at', 'created_at'), ('updated_at', 'updated_at'),
+    )
+
+
+class CommentExportView(ExportView):
+    queryset = Comment.objects.all()
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_class = CommentFilter
+    ordering_fields = ['score', 'created_at']
+    export_name = 'comments'
+    export_fields = (
+        ('id', 'id'), ('text', 'text'), ('score', 'score'), ('author', 'author__username'),
+        ('advertisement', 'advertisement_id'), ('contractor', 'contractor__username'), ('created_at', 'created_at'),
+        ('updated_at', 'updated_at'),
+    )
+
+
+class TicketExportView(ExportView):
+    queryset = Ticket.objects.all()
+    ordering_fields = ['created_at']
+    export_name = 'tickets'
+    export_fields = (
+        ('id', 'id'), ('title', 'title'), ('message', 'message'), ('response', 'response'), ('status', 'status'),
+        ('author', 'author__username'), ('related_advertisement', 'related_advertisement_id'),
+        ('created_at', 'created_at'), ('updated_at', 'updated_at'),
+    )
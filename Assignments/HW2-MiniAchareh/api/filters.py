@@ -1,6 +1,7 @@
 from django_filters import rest_framework as filters
-from django.db.models import Avg, Count
+from rest_framework.filters import BaseFilterBackend
 from .models import User, Comment
+from .search import search_advertisements
 
 
 class ContractorFilter(filters.FilterSet):
@@ -14,14 +15,12 @@ class ContractorFilter(filters.FilterSet):
         fields = ['min_score', 'min_comments']
 
     def filter_min_score(self, queryset, name, value):
-        return queryset.annotate(
-            avg_score=Avg('comments_received__score')
-        ).filter(avg_score__gte=value)
+        return queryset.filter(stats__avg_score__gte=value)
 
     def filter_min_comments(self, queryset, name, value):
-        return queryset.annotate(
-            comment_count=Count('comments_received')
-        ).filter(comment_count__gte=value)
+        if value <= 0:
+            return queryset
+        return queryset.filter(stats__comment_count__gte=value)
 
 
 class CommentFilter(filters.FilterSet):
@@ -35,3 +34,26 @@ class CommentFilter(filters.FilterSet):
     class Meta:
         model = Comment
         fields = ['contractor_id', 'min_score', 'max_score']
+
+
+class AdvertisementSearchFilter(BaseFilterBackend):
+    """Full-text `?q=` search ranked by bm25, unless the client asked for an explicit ordering."""
+    search_param = 'q'
+
+    def filter_queryset(self, request, queryset, view):
+        text = request.query_params.get(self.search_param, '').strip()
+        if not text:
+            return queryset
+        queryset = search_advertisements(queryset, text)
+        if 'ordering' not in request.query_params and 'rank' in queryset.query.annotations:
+            queryset = queryset.order_by('rank')
+        return queryset
+
+    def get_schema_operation_parameters(self, view):
+        return [{
+            'name': self.search_param,
+            'required': False,
+            'in': 'query',
+            'description': 'Full-text search over title, description, category and location',
+            'schema': {'type': 'string'},
+        }]
@@ -0,0 +1,178 @@
+import logging
+import os
+import random
+import socket
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+# a claim loses only when another worker took the same job in between
+CLAIM_ATTEMPTS = 5
+
+# name -> (function, default priority); filled by @task in api.tasks
+TASKS = {}
+
+
+def task(name, priority=0):
+    """Register a function as the job `name`; its keyword arguments must be JSON-serializable."""
+    def register(func):
+        TASKS[name] = (func, priority)
+        return func
+    return register
+
+
+def enqueue(name, key=None, priority=None, delay=None, **kwargs):
+    """
+    Queue the job `name` with `kwargs`.
+
+    The row is written in the caller's transaction, so workers see the job
+    exactly when that transaction commits and never if it rolls back. While a
+    job with the same `key` is still queued (not yet running) this is a no-op.
+    """
+    if name not in TASKS:
+        raise LookupError(f'No job registered as {name!r}')
+    job = Job(
+        name=name, args=kwargs, key=key,
+        priority=TASKS[name][1] if priority is None else priority,
+        run_at=timezone.now() + (delay or timedelta()),
+        max_attempts=settings.JOB_MAX_ATTEMPTS,
+    )
+    Job.objects.bulk_create([job], ignore_conflicts=key is not None)
+
+
+def backoff(attempts):
+    """Delay before retry number `attempts`: doubling from JOB_RETRY_DELAY up to JOB_RETRY_MAX_DELAY, with jitter."""
+    delay = min(settings.JOB_RETRY_DELAY * 2 ** (attempts - 1), settings.JOB_RETRY_MAX_DELAY)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def claimable(now):
+    return (Q(status=Job.Status.QUEUED, run_at__lte=now)
+            | Q(status=Job.Status.RUNNING, locked_until__lt=now))
+
+
+def next_candidate(now):
+    # jobs of a worker that died mid-run first, then by priority and due time
+    expired = (Job.objects.filter(status=Job.Status.RUNNING, locked_until__lt=now)
+               .order_by('locked_until').values_list('pk', flat=True).first())
+    if expired is not None:
+        return expired
+    return (Job.objects.filter(status=Job.Status.QUEUED, run_at__lte=now)
+            .order_by('-priority', 'run_at', 'id').values_list('pk', flat=True).first())
+
+
+def claim(worker):
+    """
+    Lease the next due job to `worker` for JOB_LEASE with a conditional
+    UPDATE, like api.ticket_queue.claim_next(). Returns None when nothing is due.
+    """
+    for _ in range(CLAIM_ATTEMPTS):
+        now = timezone.now()
+        pk = next_candidate(now)
+        if pk is None:
+            return None
+        claimed = Job.objects.filter(claimable(now), pk=pk).update(
+            status=Job.Status.RUNNING, locked_by=worker, locked_until=now + settings.JOB_LEASE,
+            attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return Job.objects.get(pk=pk)
+    return None
+
+
+def finish(job, worker, **changes):
+    # only while this worker still holds the lease
+    return Job.objects.filter(pk=job.pk, status=Job.Status.RUNNING, locked_by=worker).update(
+        locked_by=None, locked_until=None, **changes,
+    )
+
+
+def run(job, worker):
+    """Run a claimed job; failures are retried with backoff until max_attempts, then the job is FAILED."""
+    try:
+        if job.attempts > job.max_attempts:
+            raise RuntimeError('Lease expired on every attempt; the job may be killing its worker.')
+        func, _ = TASKS[job.name]
+        func(**job.args)
+    except Exception:
+        logger.warning('Job %s (%s) failed on attempt %s', job.pk, job.name, job.attempts, exc_info=True)
+        error = traceback.format_exc()
+        now = timezone.now()
+        if job.attempts >= job.max_attempts:
+            finish(job, worker, status=Job.Status.FAILED, last_error=error, finished_at=now)
+            return False
+        try:
+            with transaction.atomic():
+                finish(job, worker, status=Job.Status.QUEUED, last_error=error,
+                       run_at=now + timedelta(seconds=backoff(job.attempts)))
+        except IntegrityError:
+            # a newer job with the same key is queued and does the same work
+            finish(job, worker, status=Job.Status.DONE, last_error=error, finished_at=now)
+        return False
+    finish(job, worker, status=Job.Status.DONE, finished_at=timezone.now())
+    return True
+
+
+def prune():
+    """Delete DONE and FAILED jobs that finished more than JOB_RETENTION ago."""
+    cutoff = timezone.now() - settings.JOB_RETENTION
+    return Job.objects.filter(status__in=[Job.Status.DONE, Job.Status.FAILED], finished_at__lt=cutoff).delete()[0]
+
+
+def work(worker=None, burst=False, stop=lambda: False):
+    """
+    Claim and run jobs until `stop()` is true, sleeping JOB_POLL_INTERVAL
+    while the queue is empty; with `burst`, return as soon as it is. Old
+    finished jobs are pruned at most once a minute while idle. Returns the
+    number of jobs run.
+    """
+    worker = worker or f'{socket.gethostname()}:{os.getpid()}'
+    processed = 0
+    pruned_at = 0.0
+    while not stop():
+        close_old_connections()
+        job = claim(worker)
+        if job is not None:
+            run(job, worker)
+            processed += 1
+            continue
+        if time.monotonic() - pruned_at > 60:
+            prune()
+            pruned_at = time.monotonic()
+        if burst:
+            break
+        time.sleep(settings.JOB_POLL_INTERVAL)
+    return processed
+
+
+def queue_stats():
+    """Queue depth per job name and status, the age of the oldest due job and recent throughput."""
+    now = timezone.now()
+    pending = [Job.Status.QUEUED.value, Job.Status.RUNNING.value, Job.Status.FAILED.value]
+    depth = {}
+    for row in Job.objects.filter(status__in=pending).values('name', 'status').annotate(n=Count('id')).order_by('name'):
+        depth.setdefault(row['name'], {status: 0 for status in pending})[row['status']] = row['n']
+
+    oldest = Job.objects.filter(status=Job.Status.QUEUED, run_at__lte=now).aggregate(oldest=Min('run_at'))['oldest']
+    finished = Job.objects.filter(status__in=[Job.Status.DONE, Job.Status.FAILED], finished_at__gte=now - timedelta(hours=1))
+    throughput = {
+        'done_last_minute': finished.filter(status=Job.Status.DONE, finished_at__gte=now - timedelta(minutes=1)).count(),
+        'done_last_hour': finished.filter(status=Job.Status.DONE).count(),
+        'failed_last_hour': finished.filter(status=Job.Status.FAILED).count(),
+    }
+    return {
+        'queued': sum(counts[Job.Status.QUEUED] for counts in depth.values()),
+        'running': sum(counts[Job.Status.RUNNING] for counts in depth.values()),
+        'failed': sum(counts[Job.Status.FAILED] for counts in depth.values()),
+        'oldest_due_seconds': round((now - oldest).total_seconds(), 1) if oldest else 0,
+        **throughput,
+        'by_name': depth,
+    }
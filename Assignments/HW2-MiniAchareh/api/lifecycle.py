@@ -0,0 +1,102 @@
+from django.db import transaction
+from django.utils import timezone
+from django.db.models import Exists, OuterRef
+from .changes import record as record_change
+from .events import publish_advertisement
+from .models import Advertisement, Bid
+from .scheduling import conflict_q
+from .stats import record_job
+
+# every transition is guarded by these columns as they were read
+GUARDED_FIELDS = ('status', 'assigned_contractor_id', 'contractor_done')
+
+# status -> statuses an ad may move to
+TRANSITIONS = {
+    Advertisement.Status.OPEN: {Advertisement.Status.ASSIGNED, Advertisement.Status.CANCELLED},
+    Advertisement.Status.ASSIGNED: {Advertisement.Status.DONE, Advertisement.Status.CANCELLED},
+    Advertisement.Status.DONE: set(),
+    Advertisement.Status.CANCELLED: set(),
+}
+
+
+def transition(ad, *conditions, event, **changes):
+    """
+    Apply `changes` to `ad` with one conditional UPDATE of just those columns
+    and notify the owner and contractor with an `event`.
+
+    The UPDATE only matches while the row still has the status, contractor and
+    done flag `ad` was read with (plus any extra `conditions`), so concurrent
+    requests cannot both win; the caller answers 409 when this returns False.
+    Contractor counters, the change log and the event are written in the same
+    transaction since update() sends no post_save.
+    """
+    if 'status' in changes and changes['status'] not in TRANSITIONS[ad.status]:
+        return False
+
+    guard = {name: getattr(ad, name) for name in GUARDED_FIELDS}
+    # update() skips auto_now, and the conditional GETs key on updated_at
+    changes['updated_at'] = timezone.now()
+    with transaction.atomic():
+        if not Advertisement.objects.filter(*conditions, pk=ad.pk, **guard).update(**changes):
+            return False
+        old = ad.tracked_state()
+        for name, value in changes.items():
+            setattr(ad, name, value)
+        record_job(old, ad.tracked_state())
+        record_change(Advertisement, [ad])
+        publish_advertisement(ad, event)
+    ad._loaded_state = ad.tracked_state()
+    return True
+
+
+def update(ad, values):
+    """
+    Write the validated `values` of an edit (and updated_at) to `ad`.
+
+    Only those columns are written, and only while the row still has the
+    status, contractor and done flag `ad` was read with, so an edit racing a
+    transition neither puts the old lifecycle columns back nor lands on an ad
+    that has moved on; the caller answers 409 when this returns False.
+    """
+    guard = {name: getattr(ad, name) for name in GUARDED_FIELDS}
+    with transaction.atomic():
+        # the guarded UPDATE takes the row's write lock until the save below commits
+        if not Advertisement.objects.filter(pk=ad.pk, **guard).update(updated_at=timezone.now()):
+            return False
+        for name, value in values.items():
+            setattr(ad, name, value)
+        ad.save(update_fields=[*values, 'updated_at'])
+    return True
+
+
+def assign(ad, contractor_id):
+    """OPEN -> ASSIGNED, only while the contractor still has a bid on the ad and no conflicting job."""
+    if ad.status != Advertisement.Status.OPEN or ad.assigned_contractor_id is not None:
+        return False
+    conditions = [Exists(Bid.objects.filter(advertisement_id=OuterRef('pk'), contractor_id=contractor_id))]
+    if ad.execution_time:
+        conditions.append(~Exists(
+            Advertisement.objects.filter(conflict_q(contractor_id, ad.execution_time, ad.category)).exclude(pk=ad.pk)
+        ))
+    return transition(ad, *conditions, event='advertisement.assigned',
+                      status=Advertisement.Status.ASSIGNED, assigned_contractor_id=contractor_id)
+
+
+def mark_done(ad):
+    if ad.status != Advertisement.Status.ASSIGNED or ad.contractor_done:
+        return False
+    return transition(ad, event='advertisement.marked_done', contractor_done=True)
+
+
+def confirm_done(ad):
+    if ad.status != Advertisement.Status.ASSIGNED or not ad.contractor_done:
+        return False
+    return transition(ad, event='advertisement.confirmed_done', status=Advertisement.Status.DONE, customer_confirmed=True)
+
+
+def cancel(ad):
+    return transition(ad, event='advertisement.cancelled', status=Advertisement.Status.CANCELLED)
+
+
+def current_status(ad):
+    return Advertisement.objects.filter(pk=ad.pk).values_list('status', flat=True).first()
@@ -0,0 +1,108 @@
+import asyncio
+import statistics
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+from api import tokens
+from api.models import User
+
+
+def summary(latencies, errors, elapsed):
+    cuts = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+    return {
+        'rps': len(latencies) / elapsed,
+        'p50': cuts[49] * 1000,
+        'p99': cuts[98] * 1000,
+        'errors': errors,
+    }
+
+
+async def fetch(host, port, request):
+    # one connection per request (Connection: close), so keep-alive support does not favour either server
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(request)
+        await writer.drain()
+        status_line = await reader.readline()
+        await reader.read()
+    finally:
+        writer.close()
+    return int(status_line.split()[1])
+
+
+class Command(BaseCommand):
+    help = (
+        'Send the same GET to a running WSGI server and a running ASGI server of this project, '
+        'at several concurrency levels, and compare throughput and latency. Start them first, e.g. '
+        '`gunicorn mini_achareh.wsgi -w 4 -b 127.0.0.1:8000` and '
+        '`uvicorn mini_achareh.asgi:application --workers 4 --port 8001`.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--wsgi', default='http://127.0.0.1:8000', help='Base URL of the WSGI server.')
+        parser.add_argument('--asgi', default='http://127.0.0.1:8001', help='Base URL of the ASGI server.')
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[10, 50, 200])
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per run.')
+        parser.add_argument('--path', default='advertisements/',
+                            help='Endpoint path below /api/, sent to both servers, e.g. async/advertisements/.')
+        parser.add_argument('--username', help='User to authenticate as (default: the first active user).')
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(is_active=True)
+        if options['username']:
+            users = users.filter(username=options['username'])
+        user = users.order_by('id').first()
+        if user is None:
+            raise CommandError('No user to authenticate as; run createsuperuser or generate some data first.')
+        token = tokens.issue(user, tokens.ACCESS)
+        path = options['path'].lstrip('/')
+        servers = [(name, self.target(options[name], path, token)) for name in ('wsgi', 'asgi')]
+
+        for name, (host, port, request) in servers:
+            try:
+                code = asyncio.run(fetch(host, port, request))
+            except OSError as exc:
+                raise CommandError(f'{name} server at {options[name]} is not reachable: {exc}')
+            if code != 200:
+                raise CommandError(f'{name} server at {options[name]} answered {code} for /api/{path}.')
+
+        self.stdout.write(f'GET /api/{path}, {options["requests"]} requests per run as {user.username}')
+        for concurrency in options['concurrency']:
+            for name, target in servers:
+                result = asyncio.run(self.run(*target, options['requests'], concurrency))
+                self.stdout.write(
+                    f'{name} c={concurrency:<5} {result["rps"]:8.1f} req/s  '
+                    f'p50 {result["p50"]:7.1f} ms  p99 {result["p99"]:7.1f} ms  errors {result["errors"]}'
+                )
+
+    def target(self, url, path, token):
+        parts = urlsplit(url)
+        if parts.scheme != 'http' or not parts.hostname:
+            raise CommandError(f'Expected a plain http:// base URL, got {url!r}.')
+        request = (
+            f'GET {parts.path.rstrip("/")}/api/{path} HTTP/1.1\r\n'
+            f'Host: {parts.netloc}\r\n'
+            f'Authorization: Bearer {token}\r\n'
+            'Connection: close\r\n\r\n'
+        ).encode()
+        return parts.hostname, parts.port or 80, request
+
+    async def run(self, host, port, request, total, concurrency):
+        # `concurrency` client coroutines on one event loop share the requests between them
+        pending = iter(range(total))
+        results = []
+
+        async def client():
+            for _ in pending:
+                start = time.perf_counter()
+                try:
+                    code = await fetch(host, port, request)
+                except OSError:
+                    code = None
+                results.append((time.perf_counter() - start, code))
+
+        start = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+        return summary([latency for latency, _ in results], sum(code != 200 for _, code in results), elapsed)
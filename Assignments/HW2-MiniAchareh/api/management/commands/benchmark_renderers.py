@@ -0,0 +1,77 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from rest_framework.renderers import JSONRenderer
+from api import tokens
+from api.compression import CODECS
+from api.models import User, ContractorStats
+from api.renderers import FastJSONRenderer, MessagePackRenderer, msgpack, orjson
+
+
+def renderers():
+    found = [('json', JSONRenderer())]
+    if orjson is not None:
+        found.append(('json (orjson)', FastJSONRenderer()))
+    if msgpack is not None:
+        found.append(('msgpack', MessagePackRenderer()))
+    return found
+
+
+def encoders(renderer):
+    yield 'identity', renderer.render
+    for codec in CODECS:
+        def encode(data, codec=codec):
+            compressor = codec.compressor()
+            return compressor.compress(renderer.render(data)) + compressor.flush()
+        yield codec.name, encode
+
+
+class Command(BaseCommand):
+    help = (
+        'Encode the advertisement list, comment list and contractor profile payloads with every '
+        'available renderer and content coding, and report encode time and bytes on the wire.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=20, help='Timing runs; the best one is reported.')
+
+    def handle(self, *args, **options):
+        admin = User.objects.filter(role=User.Role.ADMIN, is_active=True).order_by('id').first()
+        contractor = ContractorStats.objects.order_by('-comment_count').values_list('contractor_id', flat=True).first()
+        if admin is None or contractor is None:
+            raise CommandError('Need an admin and a contractor with comments; run generate_data first.')
+
+        client = Client()
+        headers = {'Authorization': f'Bearer {tokens.issue(admin, tokens.ACCESS)}'}
+        size = options['page_size']
+        payloads = {}
+        for name, path in (('advertisements', f'/api/advertisements/?page_size={size}'),
+                           ('comments', f'/api/comments/?page_size={size}'),
+                           ('profile', f'/api/users/{contractor}/profile/?page_size={size}')):
+            response = client.get(path, headers=headers)
+            if response.status_code != 200:
+                raise CommandError(f'{path} answered {response.status_code}')
+            payloads[name] = response.data
+
+        missing = [name for name, module in (('orjson', orjson), ('msgpack', msgpack)) if module is None]
+        if len(CODECS) == 1:
+            missing.append('zstandard')
+        if missing:
+            self.stdout.write(self.style.WARNING(f'Not installed, skipped: {", ".join(missing)}'))
+
+        self.stdout.write(f'{"payload":<16}{"format":<16}{"coding":<10}{"encode ms":>10}{"bytes":>10}{"vs json":>9}')
+        for payload, data in payloads.items():
+            baseline = None
+            for format_name, renderer in renderers():
+                for coding, encode in encoders(renderer):
+                    timings = []
+                    for _ in range(options['repeat']):
+                        started = time.perf_counter()
+                        body = encode(data)
+                        timings.append(time.perf_counter() - started)
+                    baseline = baseline or len(body)
+                    self.stdout.write(
+                        f'{payload:<16}{format_name:<16}{coding:<10}{min(timings) * 1000:>10.2f}'
+                        f'{len(body):>10}{len(body) / baseline * 100:>8.0f}%'
+                    )
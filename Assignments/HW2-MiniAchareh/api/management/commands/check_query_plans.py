@@ -0,0 +1,97 @@
+import re
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from api.changes import audiences
+from api.models import User, Advertisement, Bid, Change, Comment, Event, Job, Ticket
+from api.policies import ADVERTISEMENTS
+from api.scheduling import BLOCKING_STATUSES, conflict_buffer, contractor_schedule
+from api.search import search_advertisements
+from api.ticket_queue import expired_leases, unclaimed
+
+# a MATCH on the FTS5 table shows up as a SCAN of the virtual table but is an index lookup
+FULL_SCAN = re.compile(r'\bSCAN (\w+)\b(?! USING (?:COVERING )?INDEX| VIRTUAL TABLE)')
+COVERING = re.compile(r'\bUSING COVERING INDEX\b')
+# search_advertisements() computes bm25 once and looks each rank up, instead of a MATCH per row
+RANKED_ONCE = re.compile(r'\bSEARCH ranked USING AUTOMATIC COVERING INDEX\b')
+SEARCH = 'advertisement search'
+
+
+def version_queries():
+    # same rows and columns as the max(updated_at)/count() of api.conditional; these must not touch the tables
+    return {
+        'ad list version': Advertisement.objects.values_list('updated_at', 'pk'),
+        'customer ad list version': Advertisement.objects.filter(owner_id=1).values_list('updated_at', 'pk'),
+        'ticket list version': Ticket.objects.values_list('updated_at', 'pk'),
+        'customer ticket list version': Ticket.objects.filter(author_id=1).values_list('updated_at', 'pk'),
+        'contractor profile version': Comment.objects.filter(contractor_id=1).values_list('updated_at', 'pk'),
+    }
+
+
+def hot_queries():
+    now = timezone.now()
+    page = slice(0, 21)
+    return {
+        'conflict check': Advertisement.objects.filter(
+            assigned_contractor_id__in=[1, 2, 3],
+            status__in=BLOCKING_STATUSES,
+            execution_time__range=(now - conflict_buffer(), now + conflict_buffer()),
+        ),
+        'schedule': contractor_schedule(1),
+        'schedule by date': contractor_schedule(1, date.today()),
+        'advertisement list': Advertisement.objects.order_by('-created_at', '-id')[page],
+        SEARCH: search_advertisements(Advertisement.objects.all(), 'sink rep').order_by('rank')[page],
+        'contractor advertisement list': ADVERTISEMENTS.scope(
+            Advertisement.objects.all(), User(pk=1, role=User.Role.CONTRACTOR)
+        ).order_by('-created_at', '-id')[page],
+        'customer profile ads': Advertisement.objects.filter(owner_id=1).order_by('-created_at', '-id')[page],
+        'contractor profile comments': Comment.objects.filter(contractor_id=1).order_by('-created_at', '-id')[page],
+        'contractor bids': Bid.objects.filter(contractor_id=1).order_by('-created_at', '-id')[page],
+        'customer bids': Bid.objects.filter(advertisement__owner_id=1).order_by('-created_at', '-id')[page],
+        'tickets by author': Ticket.objects.filter(author_id=1).order_by('-created_at', '-id')[page],
+        'tickets by status': Ticket.objects.filter(status=Ticket.Status.OPEN).order_by('-created_at', '-id')[page],
+        'ticket queue expired': expired_leases(now).order_by('lease_expiry')[:1],
+        'ticket queue open': unclaimed().order_by('created_at', 'id')[:1],
+        'change feed': Change.objects.filter(
+            audience__in=audiences(User(pk=1, role=User.Role.CUSTOMER)), id__gt=1,
+        ).order_by('id')[:101],
+        'change retention': Change.objects.filter(at__lt=now).order_by('at')[:1000],
+        'superseded changes': Change.objects.filter(kind='ticket', object_id=1, audience='user:1', id__gt=1),
+        'event replay': Event.objects.filter(user_id=1, id__gt=1).order_by('id')[:500],
+        'event poll': Event.objects.filter(id__gt=1).order_by('id')[:1000],
+        'event retention': Event.objects.filter(created_at__lt=now).order_by('created_at')[:1000],
+        'job queue due': Job.objects.filter(status=Job.Status.QUEUED, run_at__lte=now).order_by('-priority', 'run_at', 'id')[:1],
+        'job queue expired': Job.objects.filter(status=Job.Status.RUNNING, locked_until__lt=now).order_by('locked_until')[:1],
+        'job retention': Job.objects.filter(status__in=[Job.Status.DONE, Job.Status.FAILED], finished_at__lt=now),
+    }
+
+
+class Command(BaseCommand):
+    help = 'Run EXPLAIN QUERY PLAN on the hot API queries and fail if any of them scans a whole table.'
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Query plan checks are written for SQLite.')
+
+        failures = []
+        versions = version_queries()
+        for name, queryset in (hot_queries() | versions).items():
+            plan = queryset.explain()
+            scans = FULL_SCAN.findall(plan)
+            if scans:
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(f'{name}: full scan of {", ".join(scans)}'))
+            elif name in versions and not COVERING.search(plan):
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(f'{name}: reads the table, not only an index'))
+            elif name == SEARCH and not RANKED_ONCE.search(plan):
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(f'{name}: runs the full-text match once per row'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'{name}: ok'))
+            if options['verbosity'] > 1:
+                self.stdout.write(plan)
+
+        if failures:
+            raise CommandError(f'{len(failures)} hot queries scan whole tables or miss their covering index.')
@@ -0,0 +1,55 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+from api.readers import values_reader
+from api.views import AdvertisementViewSet, BidViewSet, CommentViewSet, TicketViewSet
+
+VIEWSETS = (AdvertisementViewSet, BidViewSet, CommentViewSet, TicketViewSet)
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = func()
+        timings.append(time.perf_counter() - started)
+    return min(timings), body
+
+
+class Command(BaseCommand):
+    help = (
+        'Render the newest rows of every ValuesReadMixin endpoint with the DRF serializer and with '
+        'its values() reader, fail unless the JSON is byte-identical, and report the speed-up.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000, help='Rows per endpoint.')
+        parser.add_argument('--repeat', type=int, default=5, help='Timing runs; the best one is reported.')
+
+    def handle(self, *args, **options):
+        renderer = JSONRenderer()
+        failures = []
+        self.stdout.write(f'{"serializer":<26}{"rows":>7}{"drf ms":>10}{"values ms":>11}{"speed-up":>10}')
+        for viewset in VIEWSETS:
+            serializer_class = viewset.serializer_class
+            reader = values_reader(serializer_class)
+            name = serializer_class.__name__
+            if reader is None:
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(f'{name:<26}has fields the values() reader cannot compile'))
+                continue
+
+            queryset = viewset.queryset.order_by('-created_at', '-id')[:options['rows']]
+            slow, expected = best_of(options['repeat'], lambda: renderer.render(serializer_class(queryset.all(), many=True).data))
+            fast, actual = best_of(options['repeat'], lambda: renderer.render(reader.represent(reader.values(queryset.all()))))
+
+            rows = len(reader.values(queryset.all()))
+            line = f'{name:<26}{rows:>7}{slow * 1000:>10.1f}{fast * 1000:>11.1f}{slow / fast:>9.1f}x'
+            if actual != expected:
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(f'{line}  JSON differs'))
+            else:
+                self.stdout.write(self.style.SUCCESS(line))
+
+        if failures:
+            raise CommandError(f'No byte-identical values() reader for: {", ".join(failures)}')
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from api.events import prune
+
+
+class Command(BaseCommand):
+    help = 'Delete notification events older than EVENT_RETENTION; streams resuming from before that get a reset event.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        deleted = prune(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} old events.'))
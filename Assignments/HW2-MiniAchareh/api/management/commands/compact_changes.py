@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from api.changes import compact
+
+
+class Command(BaseCommand):
+    help = (
+        'Trim the change log behind /api/changes/: delete entries older than CHANGE_LOG_RETENTION '
+        'and entries superseded by a later change of the same row, in small batches.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--sleep', type=float, default=0.0, help='Seconds to pause between batches.')
+
+    def handle(self, *args, **options):
+        deleted = compact(options['batch_size'], options['sleep'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} change log entries.'))
@@ -0,0 +1,264 @@
+import random
+import time
+from array import array
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from api.cache import invalidate_leaderboard
+from api.models import User, Advertisement, Bid, Comment, Ticket
+from api.search import rebuild_search_index
+from api.stats import rebuild_contractor_stats
+
+CATEGORIES = {
+    'Plumbing': ['Fix leaking pipe', 'Unclog drain', 'Replace water heater', 'Install sink'],
+    'Painting': ['Paint living room', 'Paint building facade', 'Repaint kitchen cabinets'],
+    'Repairs': ['Repair AC', 'Fix washing machine', 'Repair door lock', 'Fix electrical socket'],
+    'Cleaning': ['Clean house', 'Deep clean kitchen', 'Wash carpets', 'Clean office'],
+    'Moving': ['Move furniture', 'Move apartment', 'Carry piano upstairs'],
+}
+DESCRIPTIONS = ['Urgent help needed', 'Need professional service', 'Looking for best price', 'Small job', 'Full day work']
+LOCATIONS = ['Tehran, Valiasr St.', 'Tehran, Azadi Sq.', 'Tehran, Tajrish', 'Tehran, Narmak', 'Karaj, Gohardasht',
+             'Isfahan, Chaharbagh', 'Shiraz, Zand Blvd.', 'Mashhad, Ahmadabad']
+COMMENTS = ['Great job! Very professional.', 'On time and tidy.', 'Good work, a bit expensive.',
+            'Came late but did the job.', 'Would not hire again.']
+TICKET_TITLES = ['Login issue', 'Payment problem', 'Contractor did not show up', 'Wrong invoice', 'Cannot edit my ad']
+
+# (status, weight) for generated advertisements
+AD_STATUSES = [
+    (Advertisement.Status.OPEN, 25),
+    (Advertisement.Status.ASSIGNED, 15),
+    (Advertisement.Status.DONE, 50),
+    (Advertisement.Status.CANCELLED, 10),
+]
+# most customers are happy: 5 and 4 dominate
+SCORE_WEIGHTS = [3, 5, 12, 35, 45]
+# jobs are booked in working hours, mostly mornings and late afternoons
+JOB_HOURS = [8, 9, 10, 11, 12, 14, 15, 16, 17, 18, 19]
+JOB_HOUR_WEIGHTS = [4, 10, 12, 10, 5, 6, 9, 10, 9, 6, 3]
+
+
+@contextmanager
+def explicit_timestamps(*fields):
+    """bulk_create() would stamp auto_now/auto_now_add fields with now(); keep the generated times instead."""
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = (
+        'Bulk-insert a large, reproducible synthetic dataset (users, advertisements, bids, '
+        'comments, tickets) for load testing.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--ads', type=int, default=5000)
+        parser.add_argument('--bids', type=int, default=20000)
+        parser.add_argument('--comments', type=int, default=2000)
+        parser.add_argument('--tickets', type=int, default=500)
+        parser.add_argument('--contractor-ratio', type=float, default=0.1,
+                            help='Share of generated users that are contractors.')
+        parser.add_argument('--zipf', type=float, default=1.1,
+                            help='Exponent of the contractor popularity distribution.')
+        parser.add_argument('--days', type=int, default=365, help='Spread created_at over this many past days.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--prefix', default='load', help='Username prefix of the generated users.')
+        parser.add_argument('--password', default='pass1234', help='Password of every generated user.')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.verbosity = options['verbosity']
+        self.batch_size = options['batch_size']
+        self.prefix = options['prefix']
+        if options['users'] < 2:
+            raise CommandError('Need at least two users (a customer and a contractor).')
+        if User.objects.filter(username__startswith=self.prefix).exists():
+            raise CommandError(f'Users named {self.prefix}* already exist; pick another --prefix.')
+
+        self.now = timezone.now()
+        self.start = self.now - timedelta(days=options['days'])
+        self.span = self.now - self.start
+
+        with explicit_timestamps(
+            Advertisement._meta.get_field('created_at'),
+            Advertisement._meta.get_field('updated_at'),
+            Bid._meta.get_field('created_at'),
+            Comment._meta.get_field('created_at'),
+            Comment._meta.get_field('updated_at'),
+            Ticket._meta.get_field('created_at'),
+            Ticket._meta.get_field('updated_at'),
+        ):
+            self.timed('users', self.create_users, options['users'], options['contractor_ratio'], options['password'])
+            self.popularity(options['zipf'])
+            self.timed('advertisements, bids, comments', self.create_ads,
+                       options['ads'], options['bids'], options['comments'])
+            self.timed('tickets', self.create_tickets, options['tickets'])
+
+        self.timed('contractor stats', rebuild_contractor_stats)
+        # bulk_create() sends no signals, so no search.index jobs were queued
+        self.timed('search index', rebuild_search_index)
+        invalidate_leaderboard()
+
+    def timed(self, label, func, *args):
+        started = time.perf_counter()
+        result = func(*args)
+        elapsed = time.perf_counter() - started
+        if isinstance(result, dict):
+            for name, rows in result.items():
+                self.stdout.write(f'{name}: {rows:,} rows')
+            total = sum(result.values())
+        else:
+            total = result or 0
+        self.stdout.write(self.style.SUCCESS(
+            f'{label}: {total:,} rows in {elapsed:.1f}s ({total / elapsed if elapsed else 0:,.0f} rows/s)'
+        ))
+
+    def spread(self, index, total):
+        """created_at grows with the row index, like it does in production, with a little jitter."""
+        offset = self.span * (index / max(total, 1))
+        return self.start + offset + timedelta(seconds=self.rng.randint(0, 600))
+
+    def insert(self, model, objs):
+        with transaction.atomic():
+            return model.objects.bulk_create(objs, batch_size=self.batch_size)
+
+    def create_users(self, total, contractor_ratio, password):
+        # hashing is the slow part of creating users; every generated user shares one hash
+        hashed = make_password(password)
+        contractors = max(1, int(total * contractor_ratio))
+        supports = max(1, total // 500)
+        self.customer_ids, self.contractor_ids, self.support_ids = array('q'), array('q'), array('q')
+        ids_by_role = {
+            User.Role.CONTRACTOR: self.contractor_ids,
+            User.Role.SUPPORT: self.support_ids,
+            User.Role.CUSTOMER: self.customer_ids,
+        }
+
+        for first in range(0, total, self.batch_size):
+            batch = []
+            for index in range(first, min(first + self.batch_size, total)):
+                if index < contractors:
+                    role = User.Role.CONTRACTOR
+                elif index < contractors + supports:
+                    role = User.Role.SUPPORT
+                else:
+                    role = User.Role.CUSTOMER
+                username = f'{self.prefix}{index:07d}'
+                batch.append(User(
+                    username=username, email=f'{username}@example.com', password=hashed,
+                    role=role, date_joined=self.spread(index, total),
+                ))
+            for user in self.insert(User, batch):
+                ids_by_role[user.role].append(user.pk)
+        if not self.customer_ids:
+            raise CommandError('Every generated user is a contractor or support; lower --contractor-ratio.')
+        return total
+
+    def popularity(self, exponent):
+        # Zipf: the k-th most popular contractor is picked ~1/k^s as often; ranks are shuffled
+        ranked = list(self.contractor_ids)
+        self.rng.shuffle(ranked)
+        self.ranked_contractors = ranked
+        self.contractor_weights = list(accumulate(1 / rank ** exponent for rank in range(1, len(ranked) + 1)))
+
+    def pick_contractors(self, count):
+        count = min(count, len(self.ranked_contractors))
+        chosen = set()
+        while len(chosen) < count:
+            chosen.update(self.rng.choices(self.ranked_contractors, cum_weights=self.contractor_weights,
+                                           k=count - len(chosen)))
+        return chosen
+
+    def job_time(self, created_at):
+        day = timezone.localtime(created_at + timedelta(days=self.rng.randint(1, 21)))
+        hour = self.rng.choices(JOB_HOURS, weights=JOB_HOUR_WEIGHTS)[0]
+        return day.replace(hour=hour, minute=self.rng.choice((0, 30)), second=0, microsecond=0)
+
+    def create_ads(self, total, bid_target, comment_target):
+        statuses = [status for status, _ in AD_STATUSES]
+        status_cum = list(accumulate(weight for _, weight in AD_STATUSES))
+        done_share = dict(AD_STATUSES)[Advertisement.Status.DONE] / status_cum[-1]
+        comment_chance = min(1.0, comment_target / max(total * done_share, 1))
+        categories = list(CATEGORIES)
+        self.ad_ids = array('q')
+        counts = {'advertisements': 0, 'bids': 0, 'comments': 0}
+
+        for first in range(0, total, self.batch_size):
+            ads = []
+            for index in range(first, min(first + self.batch_size, total)):
+                category = self.rng.choice(categories)
+                status = self.rng.choices(statuses, cum_weights=status_cum)[0]
+                created_at = self.spread(index, total)
+                ad = Advertisement(
+                    title=self.rng.choice(CATEGORIES[category]), description=self.rng.choice(DESCRIPTIONS),
+                    category=category, status=status, created_at=created_at, updated_at=created_at,
+                    owner_id=self.rng.choice(self.customer_ids), location=self.rng.choice(LOCATIONS),
+                )
+                if status in (Advertisement.Status.ASSIGNED, Advertisement.Status.DONE):
+                    ad.assigned_contractor_id = self.pick_contractors(1).pop()
+                    ad.execution_time = self.job_time(created_at)
+                    ad.contractor_done = ad.customer_confirmed = status == Advertisement.Status.DONE
+                elif status == Advertisement.Status.OPEN and self.rng.random() < 0.5:
+                    ad.execution_time = self.job_time(created_at)
+                ads.append(ad)
+            ads = self.insert(Advertisement, ads)
+            self.ad_ids.extend(ad.pk for ad in ads)
+            counts['advertisements'] += len(ads)
+
+            bids, comments = [], []
+            for position, ad in enumerate(ads):
+                # spread the remaining bids evenly over the remaining ads, exponentially around that mean
+                remaining_ads = total - (counts['advertisements'] - len(ads) + position)
+                mean = max(bid_target - counts['bids'] - len(bids), 0) / remaining_ads
+                bidders = self.pick_contractors(round(self.rng.expovariate(1 / mean)) if mean else 0)
+                if ad.assigned_contractor_id:
+                    bidders.add(ad.assigned_contractor_id)
+                bids.extend(
+                    Bid(advertisement_id=ad.pk, contractor_id=contractor_id,
+                        created_at=ad.created_at + timedelta(minutes=self.rng.randint(1, 2880)))
+                    for contractor_id in bidders
+                )
+                if (ad.status == Advertisement.Status.DONE and counts['comments'] + len(comments) < comment_target
+                        and self.rng.random() < comment_chance):
+                    commented_at = ad.execution_time + timedelta(hours=self.rng.randint(2, 72))
+                    comments.append(Comment(
+                        text=self.rng.choice(COMMENTS), score=self.rng.choices(range(1, 6), weights=SCORE_WEIGHTS)[0],
+                        author_id=ad.owner_id, advertisement_id=ad.pk, contractor_id=ad.assigned_contractor_id,
+                        created_at=commented_at, updated_at=commented_at,
+                    ))
+            counts['bids'] += len(self.insert(Bid, bids))
+            counts['comments'] += len(self.insert(Comment, comments))
+            if self.verbosity > 1:
+                self.stdout.write(f'  {counts["advertisements"]:,}/{total:,} advertisements')
+        return counts
+
+    def create_tickets(self, total):
+        authors = self.customer_ids
+        handled = [status for status in Ticket.Status if status != Ticket.Status.OPEN]
+        for first in range(0, total, self.batch_size):
+            tickets = []
+            for index in range(first, min(first + self.batch_size, total)):
+                created_at = self.spread(index, total)
+                # the newest tickets are still open, older ones have mostly been handled
+                status = Ticket.Status.OPEN if index > total * 0.9 or self.rng.random() < 0.1 else self.rng.choice(handled)
+                tickets.append(Ticket(
+                    title=self.rng.choice(TICKET_TITLES), message=self.rng.choice(DESCRIPTIONS),
+                    response=None if status == Ticket.Status.OPEN else 'We are checking it.',
+                    status=status, author_id=self.rng.choice(authors),
+                    related_advertisement_id=self.rng.choice(self.ad_ids) if self.ad_ids and self.rng.random() < 0.6 else None,
+                    created_at=created_at, updated_at=created_at + timedelta(hours=self.rng.randint(0, 48)),
+                ))
+            self.insert(Ticket, tickets)
+        return total
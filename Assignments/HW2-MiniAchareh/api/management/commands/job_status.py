@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from api.jobs import prune, queue_stats
+
+
+class Command(BaseCommand):
+    help = 'Print the background job queue depth per job name and the jobs finished recently.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prune', action='store_true', help='First delete jobs finished more than JOB_RETENTION ago.')
+
+    def handle(self, *args, **options):
+        if options['prune']:
+            self.stdout.write(f'Pruned {prune()} finished jobs.')
+        stats = queue_stats()
+        self.stdout.write(
+            f'queued {stats["queued"]}  running {stats["running"]}  failed {stats["failed"]}  '
+            f'oldest due {stats["oldest_due_seconds"]}s'
+        )
+        self.stdout.write(
+            f'done: {stats["done_last_minute"]} last minute, {stats["done_last_hour"]} last hour; '
+            f'failed last hour: {stats["failed_last_hour"]}'
+        )
+        if stats['by_name']:
+            self.stdout.write(f'{"job":<20}{"queued":>8}{"running":>9}{"failed":>8}')
+            for name, counts in stats['by_name'].items():
+                self.stdout.write(f'{name:<20}{counts["queued"]:>8}{counts["running"]:>9}{counts["failed"]:>8}')
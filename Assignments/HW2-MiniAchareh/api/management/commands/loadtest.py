@@ -0,0 +1,287 @@
+import json
+import logging
+import random
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Max, Min
+from django.test import Client
+from django.utils import timezone
+from api import tokens
+from api.models import User, Advertisement, Bid
+
+# each scenario is a VirtualUser method of the same name
+SCENARIOS = ('browse', 'profile', 'leaderboard', 'bid', 'assign', 'tickets')
+DEFAULT_MIX = 'browse=50,profile=15,leaderboard=15,bid=10,assign=5,tickets=5'
+LEADERBOARD_ORDERINGS = ['score', 'comments', '']
+SAMPLE_SIZE = 500
+
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name not in SCENARIOS:
+            raise CommandError(f'Unknown scenario {name!r}; choose from {", ".join(SCENARIOS)}.')
+        try:
+            mix[name] = float(weight or 1)
+        except ValueError:
+            raise CommandError(f'Bad weight for {name}: {weight!r}')
+    return mix
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class Dataset:
+    """Ids and tokens the scenarios draw from, sampled once from the existing data."""
+
+    def __init__(self, rng):
+        self.rng = rng
+        self.lock = threading.Lock()
+        self.customers = self.sample_users(User.Role.CUSTOMER)
+        self.contractors = self.sample_users(User.Role.CONTRACTOR)
+        if not self.customers or not self.contractors:
+            raise CommandError('Need customers and contractors in the database; run generate_data first.')
+
+        bounds = Advertisement.objects.aggregate(low=Min('id'), high=Max('id'))
+        if bounds['low'] is None:
+            raise CommandError('No advertisements in the database; run generate_data first.')
+        self.ad_ids = list(Advertisement.objects.filter(
+            id__in=[rng.randint(bounds['low'], bounds['high']) for _ in range(SAMPLE_SIZE)]
+        ).values_list('id', flat=True))
+        start = rng.randint(bounds['low'], bounds['high'])
+        self.open_ad_ids = list(Advertisement.objects.filter(
+            status=Advertisement.Status.OPEN, id__gte=start
+        ).values_list('id', flat=True)[:SAMPLE_SIZE])
+        # (owner, ad, bidder) triples; each one is assigned at most once per run
+        assignable = {}
+        for ad_id, owner_id, contractor_id in Bid.objects.filter(
+            advertisement__status=Advertisement.Status.OPEN, advertisement_id__gte=start
+        ).values_list('advertisement_id', 'advertisement__owner_id', 'contractor_id')[:SAMPLE_SIZE]:
+            assignable.setdefault(ad_id, (owner_id, ad_id, contractor_id))
+        self.assignable = list(assignable.values())
+
+        self.words = sorted({word for title in Advertisement.objects.filter(id__in=self.ad_ids).values_list('title', flat=True)
+                             for word in title.split() if len(word) > 3}) or ['repair']
+        self.headers = {}
+        owners = User.objects.filter(id__in={owner_id for owner_id, _, _ in self.assignable})
+        for user in list(owners) + self.customers + self.contractors:
+            self.headers[user.id] = {'Authorization': f'Bearer {tokens.issue(user, tokens.ACCESS)}'}
+
+    def sample_users(self, role):
+        ids = list(User.objects.filter(role=role, is_active=True).values_list('id', flat=True)[:SAMPLE_SIZE * 20])
+        return list(User.objects.filter(id__in=self.rng.sample(ids, min(len(ids), SAMPLE_SIZE))))
+
+    def take_assignable(self):
+        with self.lock:
+            return self.assignable.pop() if self.assignable else None
+
+
+class VirtualUser:
+    def __init__(self, dataset, seed):
+        self.data = dataset
+        self.rng = random.Random(seed)
+        self.client = Client(raise_request_exception=False)
+        self.samples = defaultdict(list)
+
+    def call(self, name, method, path, user_id, payload=None):
+        counter = QueryCounter()
+        kwargs = {'headers': self.data.headers[user_id]}
+        if payload is not None:
+            kwargs.update(data=payload, content_type='application/json')
+        with connection.execute_wrapper(counter):
+            started = time.perf_counter()
+            response = getattr(self.client, method)(path, **kwargs)
+            elapsed = time.perf_counter() - started
+        self.samples[name].append((elapsed, counter.count, response.status_code))
+        return response
+
+    def browse(self):
+        # contractors are the ones browsing the open ads (see api.policies.ADVERTISEMENTS)
+        contractor = self.rng.choice(self.data.contractors).id
+        response = self.call('ads.list', 'get', '/api/advertisements/', contractor)
+        if response.status_code == 200 and response.json().get('next'):
+            self.call('ads.next', 'get', response.json()['next'], contractor)
+        self.call('ads.detail', 'get', f'/api/advertisements/{self.rng.choice(self.data.open_ad_ids or self.data.ad_ids)}/',
+                  contractor)
+        self.call('ads.search', 'get', f'/api/advertisements/?q={self.rng.choice(self.data.words)}', contractor)
+
+    def profile(self):
+        contractor = self.rng.choice(self.data.contractors).id
+        self.call('users.profile', 'get', f'/api/users/{contractor}/profile/', self.rng.choice(self.data.customers).id)
+
+    def leaderboard(self):
+        ordering = self.rng.choice(LEADERBOARD_ORDERINGS)
+        self.call('users.contractors', 'get', f'/api/users/contractors/?ordering={ordering}',
+                  self.rng.choice(self.data.customers).id)
+
+    def bid(self):
+        contractor = self.rng.choice(self.data.contractors).id
+        if self.data.open_ad_ids:
+            self.call('bids.create', 'post', '/api/bids/', contractor,
+                      {'advertisement': self.rng.choice(self.data.open_ad_ids)})
+        self.call('bids.list', 'get', '/api/bids/', contractor)
+
+    def assign(self):
+        job = self.data.take_assignable()
+        if job is None:
+            return self.browse()
+        owner_id, ad_id, contractor_id = job
+        self.call('ads.available_bidders', 'get', f'/api/advertisements/{ad_id}/available_bidders/', owner_id)
+        self.call('ads.assign', 'post', f'/api/advertisements/{ad_id}/assign/', owner_id, {'contractor_id': contractor_id})
+
+    def tickets(self):
+        customer = self.rng.choice(self.data.customers).id
+        self.call('tickets.create', 'post', '/api/tickets/', customer,
+                  {'title': 'Load test', 'message': 'Generated by the loadtest command.'})
+        self.call('tickets.list', 'get', '/api/tickets/', customer)
+
+    def run(self, mix, deadline):
+        names, weights = list(mix), list(mix.values())
+        try:
+            while time.perf_counter() < deadline:
+                getattr(self, self.rng.choices(names, weights=weights)[0])()
+        finally:
+            connection.close()
+
+
+def summarize(samples, elapsed):
+    latencies = sorted(latency for latency, _, _ in samples)
+    statuses = defaultdict(int)
+    for _, _, code in samples:
+        statuses[str(code)] += 1
+    return {
+        'count': len(samples),
+        'rps': len(samples) / elapsed,
+        'mean_ms': sum(latencies) / len(latencies) * 1000,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+        'queries': sum(queries for _, queries, _ in samples) / len(samples),
+        'max_queries': max(queries for _, queries, _ in samples),
+        'errors': sum(code >= 500 for _, _, code in samples),
+        'statuses': dict(statuses),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Run concurrent virtual users through the real API URLconf in-process and report '
+        'latency percentiles, throughput and SQL queries per endpoint.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10, help='Concurrent virtual users (threads).')
+        parser.add_argument('--duration', type=float, default=30, help='Seconds to run.')
+        parser.add_argument('--mix', default=DEFAULT_MIX, help=f'Scenario weights, default {DEFAULT_MIX}.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Write the results to this JSON file.')
+        parser.add_argument('--baseline', help='Compare against a JSON file written by an earlier run.')
+        parser.add_argument('--max-regression', type=float,
+                            help='Fail if any endpoint p95 grows by more than this many percent over the baseline, '
+                                 'or needs more queries.')
+
+    def handle(self, *args, **options):
+        mix = parse_mix(options['mix'])
+        if settings.DEBUG:
+            self.stdout.write(self.style.WARNING('DEBUG is on: every query is also logged, so timings are pessimistic.'))
+
+        rng = random.Random(options['seed'])
+        dataset = Dataset(rng)
+        users = [VirtualUser(dataset, rng.random()) for _ in range(options['users'])]
+
+        started = time.perf_counter()
+        deadline = started + options['duration']
+        threads = [threading.Thread(target=user.run, args=(mix, deadline)) for user in users]
+        # rejected duplicate bids, lock timeouts, ... are counted per status below instead of logged
+        request_logger = logging.getLogger('django.request')
+        level = request_logger.level
+        request_logger.setLevel(logging.CRITICAL)
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            request_logger.setLevel(level)
+        elapsed = time.perf_counter() - started
+
+        merged = defaultdict(list)
+        for user in users:
+            for name, samples in user.samples.items():
+                merged[name].extend(samples)
+        if not merged:
+            raise CommandError('No requests were made; increase --duration.')
+
+        results = {
+            'meta': {
+                'started': timezone.now().isoformat(), 'users': options['users'], 'duration': elapsed,
+                'mix': mix, 'seed': options['seed'], 'debug': settings.DEBUG,
+            },
+            'total': summarize([sample for samples in merged.values() for sample in samples], elapsed),
+            'endpoints': {name: summarize(merged[name], elapsed) for name in sorted(merged)},
+        }
+        self.report(results)
+
+        if options['output']:
+            with open(options['output'], 'w') as fp:
+                json.dump(results, fp, indent=2)
+            self.stdout.write(f'Results written to {options["output"]}')
+        if options['baseline']:
+            self.compare(results, options['baseline'], options['max_regression'])
+
+    def report(self, results):
+        self.stdout.write(f'{"endpoint":<24}{"count":>8}{"req/s":>9}{"p50":>9}{"p95":>9}{"p99":>9}{"queries":>9}{"5xx":>6}')
+        rows = list(results['endpoints'].items()) + [('total', results['total'])]
+        for name, row in rows:
+            self.stdout.write(
+                f'{name:<24}{row["count"]:>8}{row["rps"]:>9.1f}{row["p50_ms"]:>9.1f}{row["p95_ms"]:>9.1f}'
+                f'{row["p99_ms"]:>9.1f}{row["queries"]:>9.1f}{row["errors"]:>6}'
+            )
+
+    def compare(self, results, path, max_regression):
+        try:
+            with open(path) as fp:
+                baseline = json.load(fp)
+        except (OSError, ValueError) as exc:
+            raise CommandError(f'Cannot read baseline {path}: {exc}')
+
+        def change(new, old):
+            return (new - old) / old * 100 if old else 0.0
+
+        regressions = []
+        self.stdout.write(f'\nAgainst {path}:')
+        self.stdout.write(f'{"endpoint":<24}{"p50 %":>9}{"p95 %":>9}{"p99 %":>9}{"req/s %":>9}{"queries":>9}')
+        for name, row in list(results['endpoints'].items()) + [('total', results['total'])]:
+            old = baseline['total'] if name == 'total' else baseline['endpoints'].get(name)
+            if old is None:
+                self.stdout.write(f'{name:<24}{"new":>9}')
+                continue
+            p95 = change(row['p95_ms'], old['p95_ms'])
+            queries = row['queries'] - old['queries']
+            line = (f'{name:<24}{change(row["p50_ms"], old["p50_ms"]):>+9.1f}{p95:>+9.1f}'
+                    f'{change(row["p99_ms"], old["p99_ms"]):>+9.1f}{change(row["rps"], old["rps"]):>+9.1f}{queries:>+9.1f}')
+            worse = max_regression is not None and name != 'total' and (p95 > max_regression or queries > 0.5)
+            if worse:
+                regressions.append(name)
+            self.stdout.write(self.style.ERROR(line) if worse else line)
+
+        if regressions:
+            raise CommandError(f'Regressed beyond {max_regression}%: {", ".join(regressions)}')
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from api.stats import rebuild_contractor_stats
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the denormalized contractor reputation and job counters from scratch.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('contractor_ids', nargs='*', type=int, help='Only rebuild these contractors.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        count = rebuild_contractor_stats(options['contractor_ids'] or None, batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt stats for {count} contractors.'))
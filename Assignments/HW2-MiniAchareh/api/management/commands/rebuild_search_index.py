@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand, CommandError
+from api.search import fts_available, rebuild_search_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the advertisement full-text search index from the advertisement table.'
+
+    def handle(self, *args, **options):
+        if not fts_available():
+            raise CommandError('Full-text search is only available on SQLite.')
+        indexed = rebuild_search_index()
+        self.stdout.write(self.style.SUCCESS(f'Search index rebuilt: {indexed:,} advertisements.'))
@@ -0,0 +1,56 @@
+import multiprocessing
+import signal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from api.jobs import work
+
+
+class Command(BaseCommand):
+    help = (
+        'Run background jobs from the database queue (no broker needed). With --processes N, '
+        'N forked workers claim jobs side by side; SIGINT/SIGTERM let running jobs finish first.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1)
+        parser.add_argument('--burst', action='store_true', help='Exit once no job is due.')
+
+    def handle(self, *args, **options):
+        if options['processes'] <= 1:
+            processed = self.work(options['burst'])
+            self.stdout.write(self.style.SUCCESS(f'Ran {processed} jobs.'))
+            return
+
+        if 'fork' not in multiprocessing.get_all_start_methods():
+            raise CommandError('--processes needs a platform with fork(); run several commands instead.')
+        # children must not share the parent's database connection
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        workers = [context.Process(target=self.work, args=(options['burst'],)) for _ in range(options['processes'])]
+        for worker in workers:
+            worker.start()
+
+        def forward(signum, frame):
+            for worker in workers:
+                if worker.is_alive():
+                    worker.terminate()
+        signal.signal(signal.SIGTERM, forward)
+        try:
+            for worker in workers:
+                worker.join()
+        except KeyboardInterrupt:
+            # the terminal sent SIGINT to the workers as well
+            for worker in workers:
+                worker.join()
+        self.stdout.write(self.style.SUCCESS(f'{len(workers)} workers stopped.'))
+
+    @staticmethod
+    def work(burst):
+        stopping = []
+
+        def stop(signum, frame):
+            stopping.append(signum)
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        return work(burst=burst, stop=lambda: bool(stopping))
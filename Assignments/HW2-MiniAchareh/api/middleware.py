@@ -0,0 +1,238 @@
+import heapq
+import json
+import logging
+import os
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger('api.slow_requests')
+
+# upper bounds in ms; the last bucket is open-ended
+BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+_current = ContextVar('request_timing', default=None)
+
+
+def setting(name, default):
+    return getattr(settings, 'REQUEST_TIMING_' + name, default)
+
+
+class RequestTiming:
+    __slots__ = ('started', 'view_started', 'queries', 'sql_time', 'slowest', 'keep', 'serializer_time', 'depth')
+
+    def __init__(self, keep):
+        self.started = time.perf_counter()
+        self.view_started = None
+        self.queries = 0
+        self.sql_time = 0.0
+        self.slowest = []
+        self.keep = keep
+        self.serializer_time = 0.0
+        self.depth = 0
+
+    def add_query(self, sql, duration):
+        self.queries += 1
+        self.sql_time += duration
+        if len(self.slowest) < self.keep:
+            heapq.heappush(self.slowest, (duration, sql))
+        elif self.keep and duration > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, (duration, sql))
+
+
+def record_query(execute, sql, params, many, context):
+    timing = _current.get()
+    if timing is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timing.add_query(sql, time.perf_counter() - started)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+@contextmanager
+def serializing():
+    """
+    Count the block as serializer time of the current request, less the SQL it
+    runs (that is already `db`). Nested blocks count once.
+    """
+    timing = _current.get()
+    if timing is None or timing.depth:
+        yield
+        return
+    timing.depth += 1
+    started, sql_time = time.perf_counter(), timing.sql_time
+    try:
+        yield
+    finally:
+        timing.depth -= 1
+        timing.serializer_time += time.perf_counter() - started - (timing.sql_time - sql_time)
+
+
+def serialize(serializer):
+    """`serializer.data`, timed as serialization."""
+    with serializing():
+        return serializer.data
+
+
+def mark_view_started():
+    timing = _current.get()
+    if timing is not None:
+        timing.view_started = time.perf_counter()
+
+
+class RouteHistograms:
+    """Latency histograms per `METHOD view-name`, kept in this worker process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.routes = {}
+
+    def add(self, route, total_ms, queries):
+        with self.lock:
+            entry = self.routes.get(route)
+            if entry is None:
+                entry = self.routes[route] = {'count': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'queries': 0,
+                                              'buckets': [0] * (len(BUCKETS) + 1)}
+            entry['count'] += 1
+            entry['total_ms'] += total_ms
+            entry['max_ms'] = max(entry['max_ms'], total_ms)
+            entry['queries'] += queries
+            entry['buckets'][bisect_left(BUCKETS, total_ms)] += 1
+
+    def snapshot(self):
+        with self.lock:
+            routes = {route: dict(entry, buckets=list(entry['buckets'])) for route, entry in self.routes.items()}
+        return {'process': os.getpid(), 'routes': {route: self.summary(entry) for route, entry in sorted(routes.items())}}
+
+    @staticmethod
+    def percentile(entry, fraction):
+        # upper bound of the bucket holding the percentile; the open bucket reports the max seen
+        rank = fraction * entry['count']
+        seen = 0
+        for bound, count in zip(BUCKETS, entry['buckets']):
+            seen += count
+            if seen >= rank:
+                return round(min(bound, entry['max_ms']), 2)
+        return round(entry['max_ms'], 2)
+
+    def summary(self, entry):
+        count = entry['count']
+        return {
+            'count': count,
+            'mean_ms': round(entry['total_ms'] / count, 2),
+            'p50_ms': self.percentile(entry, 0.50),
+            'p95_ms': self.percentile(entry, 0.95),
+            'p99_ms': self.percentile(entry, 0.99),
+            'max_ms': round(entry['max_ms'], 2),
+            'queries_mean': round(entry['queries'] / count, 2),
+            'buckets': {f'le_{bound}': n for bound, n in zip(BUCKETS, entry['buckets'])} | {'inf': entry['buckets'][-1]},
+        }
+
+    def reset(self):
+        with self.lock:
+            self.routes.clear()
+
+
+route_histograms = RouteHistograms()
+
+
+class RequestTimingMiddleware:
+    """
+    Per-request SQL count and time, slowest statements, serializer time and
+    view time. Serializer time is what the views and renderers report through
+    serializing(): building the response data and encoding it.
+
+    Reported in a `Server-Timing` header, in a sampled slow-request log
+    (logger `api.slow_requests`, one JSON object per line) and in per-route
+    histograms for `/api/` served by /api/metrics/routes/. Put it first in
+    MIDDLEWARE so `total` covers the other middleware too.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        connection_created.connect(install_query_recorder, dispatch_uid='api.request_timing')
+        for connection in connections.all(initialized_only=True):
+            install_query_recorder(None, connection)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+            # Django would run a sync process_view in a worker thread under ASGI
+            self.process_view = self.aprocess_view
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timing = RequestTiming(setting('SLOWEST_QUERIES', 3))
+        token = _current.set(timing)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, timing)
+
+    async def __acall__(self, request):
+        timing = RequestTiming(setting('SLOWEST_QUERIES', 3))
+        token = _current.set(timing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, timing)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        mark_view_started()
+
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        mark_view_started()
+
+    def finish(self, request, response, timing):
+        ended = time.perf_counter()
+        total_ms = (ended - timing.started) * 1000
+        view_ms = (ended - timing.view_started) * 1000 if timing.view_started else 0.0
+        sql_ms = timing.sql_time * 1000
+        serializer_ms = timing.serializer_time * 1000
+
+        if setting('HEADER', True):
+            response['Server-Timing'] = (
+                f'db;dur={sql_ms:.1f};desc="{timing.queries} queries", ser;dur={serializer_ms:.1f}, '
+                f'view;dur={view_ms:.1f}, total;dur={total_ms:.1f}'
+            )
+
+        match = getattr(request, 'resolver_match', None)
+        route = f'{request.method} {match.view_name}' if match else None
+        if route and request.path.startswith('/api/'):
+            route_histograms.add(route, total_ms, timing.queries)
+
+        slow = (total_ms >= setting('SLOW_MS', 500)
+                or timing.queries >= setting('SLOW_QUERIES', 50))
+        if slow and random.random() < setting('SAMPLE_RATE', 1.0):
+            logger.warning(json.dumps({
+                'method': request.method,
+                'path': request.path,
+                'route': route,
+                'status': response.status_code,
+                'total_ms': round(total_ms, 1),
+                'view_ms': round(view_ms, 1),
+                'sql_ms': round(sql_ms, 1),
+                'sql_count': timing.queries,
+                'serializer_ms': round(serializer_ms, 1),
+                'slowest': [{'ms': round(duration * 1000, 2), 'sql': sql[:500]}
+                            for duration, sql in sorted(timing.slowest, reverse=True)],
+            }))
+        return response
@@ -0,0 +1,30 @@
+# Generated by Django 6.0 on 2026-10-18 12:36
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContractorStats',
+            fields=[
+                ('contractor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('comment_count', models.PositiveIntegerField(default=0)),
+                ('score_sum', models.PositiveIntegerField(default=0)),
+                ('avg_score', models.FloatField(blank=True, null=True)),
+                ('done_count', models.PositiveIntegerField(default=0)),
+                ('assigned_count', models.PositiveIntegerField(default=0)),
+                ('not_done_count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['avg_score'], name='stats_avg_score_idx'), models.Index(fields=['comment_count'], name='stats_comment_count_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 6.0 on 2026-10-18 12:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_contractorstats'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='advertisement',
+            index=models.Index(fields=['owner', 'created_at', 'id'], name='ad_owner_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='advertisement',
+            index=models.Index(fields=['assigned_contractor', 'status', 'execution_time'], name='ad_contractor_status_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bid',
+            index=models.Index(fields=['contractor', 'created_at', 'id'], name='bid_contractor_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['contractor', 'created_at', 'id'], name='comment_contractor_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['author', 'created_at', 'id'], name='ticket_author_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['status', 'created_at', 'id'], name='ticket_status_created_idx'),
+        ),
+    ]
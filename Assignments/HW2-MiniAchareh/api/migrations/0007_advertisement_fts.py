@@ -0,0 +1,62 @@
+# Generated by Django 6.0 on 2026-10-18 12:50
+
+from django.db import migrations
+
+FTS_SQL = [
+    """
+    CREATE VIRTUAL TABLE api_advertisement_fts USING fts5(
+        title, description, category, location,
+        content='api_advertisement', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER api_advertisement_fts_ai AFTER INSERT ON api_advertisement BEGIN
+        INSERT INTO api_advertisement_fts(rowid, title, description, category, location)
+        VALUES (new.id, new.title, new.description, new.category, new.location);
+    END
+    """,
+    """
+    CREATE TRIGGER api_advertisement_fts_ad AFTER DELETE ON api_advertisement BEGIN
+        INSERT INTO api_advertisement_fts(api_advertisement_fts, rowid, title, description, category, location)
+        VALUES ('delete', old.id, old.title, old.description, old.category, old.location);
+    END
+    """,
+    """
+    CREATE TRIGGER api_advertisement_fts_au AFTER UPDATE OF title, description, category, location
+    ON api_advertisement BEGIN
+        INSERT INTO api_advertisement_fts(api_advertisement_fts, rowid, title, description, category, location)
+        VALUES ('delete', old.id, old.title, old.description, old.category, old.location);
+        INSERT INTO api_advertisement_fts(rowid, title, description, category, location)
+        VALUES (new.id, new.title, new.description, new.category, new.location);
+    END
+    """,
+    "INSERT INTO api_advertisement_fts(api_advertisement_fts) VALUES('rebuild')",
+]
+
+DROP_SQL = [
+    'DROP TRIGGER IF EXISTS api_advertisement_fts_au',
+    'DROP TRIGGER IF EXISTS api_advertisement_fts_ad',
+    'DROP TRIGGER IF EXISTS api_advertisement_fts_ai',
+    'DROP TABLE IF EXISTS api_advertisement_fts',
+]
+
+
+def run(statements):
+    def apply(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return apply
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(FTS_SQL), run(DROP_SQL)),
+    ]
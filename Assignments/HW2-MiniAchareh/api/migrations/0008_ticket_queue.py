@@ -0,0 +1,29 @@
+# Generated by Django 6.0 on 2026-10-18 12:59
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_advertisement_fts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ticket',
+            name='claimed_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='claimed_tickets', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='ticket',
+            name='lease_expiry',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['status', 'lease_expiry', 'created_at'], name='ticket_queue_idx'),
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 6.0 on 2026-10-18 13:20
+
+from importlib import import_module
+
+import django.utils.timezone
+from django.db import migrations, models
+
+fts = import_module('api.migrations.0007_advertisement_fts')
+# SQLite may add or drop the column by rebuilding api_advertisement, which loses the search index triggers
+FTS_TRIGGERS = fts.run(
+    [statement for statement in fts.DROP_SQL if 'TRIGGER' in statement]
+    + [statement for statement in fts.FTS_SQL if 'CREATE TRIGGER' in statement]
+)
+
+
+def backfill_updated_at(apps, schema_editor):
+    for model in ('Advertisement', 'Comment'):
+        apps.get_model('api', model).objects.update(updated_at=models.F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_ticket_queue'),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, FTS_TRIGGERS),
+        migrations.AddField(
+            model_name='advertisement',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(FTS_TRIGGERS, migrations.RunPython.noop),
+        migrations.AddField(
+            model_name='comment',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(backfill_updated_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='advertisement',
+            index=models.Index(fields=['updated_at'], name='ad_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='advertisement',
+            index=models.Index(fields=['owner', 'updated_at'], name='ad_owner_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='advertisement',
+            index=models.Index(fields=['status', 'updated_at'], name='ad_status_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['contractor', 'updated_at'], name='comment_contractor_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['updated_at'], name='ticket_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ticket',
+            index=models.Index(fields=['author', 'updated_at'], name='ticket_author_updated_idx'),
+        ),
+    ]
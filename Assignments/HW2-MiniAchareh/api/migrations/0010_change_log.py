@@ -0,0 +1,26 @@
+# Generated by Django 6.0 on 2026-10-18 13:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Change',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('advertisement', 'Advertisement'), ('bid', 'Bid'), ('comment', 'Comment'), ('ticket', 'Ticket')], max_length=20)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('action', models.CharField(choices=[('created', 'Created'), ('updated', 'Updated'), ('deleted', 'Deleted')], max_length=10)),
+                ('at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'object_id', 'id'], name='change_object_idx'), models.Index(fields=['at'], name='change_at_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 6.0 on 2026-10-18 15:12
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+fts = import_module('api.migrations.0007_advertisement_fts')
+
+# the index keeps its own copy of the text instead of reading api_advertisement,
+# so the search.index job can re-index a row by id after it changed or went away
+STANDALONE_FTS_SQL = fts.DROP_SQL + [
+    """
+    CREATE VIRTUAL TABLE api_advertisement_fts USING fts5(
+        title, description, category, location,
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    INSERT INTO api_advertisement_fts(rowid, title, description, category, location)
+    SELECT id, title, description, category, location FROM api_advertisement
+    """,
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_event'),
+    ]
+
+    operations = [
+        migrations.RunPython(fts.run(STANDALONE_FTS_SQL), fts.run(fts.DROP_SQL + fts.FTS_SQL)),
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('args', models.JSONField(default=dict)),
+                ('key', models.CharField(blank=True, max_length=200, null=True)),
+                ('priority', models.SmallIntegerField(default=0)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('max_attempts', models.PositiveSmallIntegerField(default=5)),
+                ('run_at', models.DateTimeField()),
+                ('locked_by', models.CharField(blank=True, max_length=100, null=True)),
+                ('locked_until', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', '-priority', 'run_at', 'id'], name='job_queue_idx'), models.Index(fields=['status', 'locked_until'], name='job_lease_idx'), models.Index(fields=['status', 'finished_at'], name='job_finished_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status', 'queued')), fields=('key',), name='job_queued_key_uniq')],
+            },
+        ),
+    ]
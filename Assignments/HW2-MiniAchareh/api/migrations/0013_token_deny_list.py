@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-18 16:05
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import migrations
+
+
+def create_deny_list_table(apps, schema_editor):
+    # the table of the DatabaseCache behind TOKEN_DENY_LIST_CACHE_ALIAS; a no-op when it exists
+    cache = settings.CACHES[settings.TOKEN_DENY_LIST_CACHE_ALIAS]
+    if cache['BACKEND'] == 'django.core.cache.backends.db.DatabaseCache':
+        call_command('createcachetable', cache['LOCATION'], database=schema_editor.connection.alias, verbosity=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_job_queue'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_deny_list_table, migrations.RunPython.noop),
+    ]
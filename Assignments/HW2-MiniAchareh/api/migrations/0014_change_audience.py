@@ -0,0 +1,37 @@
+# Generated by Django 6.0 on 2026-10-18 16:40
+
+from django.db import migrations, models
+
+
+def clear_log(apps, schema_editor):
+    # entries written before this migration have no audience and could reach anyone
+    apps.get_model('api', 'Change').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_token_deny_list'),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_log, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='change',
+            name='change_object_idx',
+        ),
+        migrations.AddField(
+            model_name='change',
+            name='audience',
+            field=models.CharField(default='', max_length=40),
+            preserve_default=False,
+        ),
+        migrations.AddIndex(
+            model_name='change',
+            index=models.Index(fields=['kind', 'object_id', 'audience', 'id'], name='change_object_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='change',
+            index=models.Index(fields=['audience', 'id'], name='change_audience_idx'),
+        ),
+    ]
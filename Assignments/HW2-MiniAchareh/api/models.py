@@ -1,7 +1,32 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import AbstractUser
 from django.utils.translation import gettext_lazy as _
 
+class TrackedFieldsMixin:
+    """
+    Remembers the values of `tracked_fields` as last loaded from / written to
+    the database, so post_save handlers can apply deltas instead of recounting.
+    Saves run in a transaction so those handlers commit together with the row.
+    """
+    tracked_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_state = instance.tracked_state()
+        return instance
+
+    def tracked_state(self):
+        return {name: self.__dict__.get(name) for name in self.tracked_fields}
+
+    def loaded_state(self):
+        return getattr(self, '_loaded_state', None)
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic(using=kwargs.get('using')):
+            super().save(*args, **kwargs)
+        self._loaded_state = self.tracked_state()
+
 class User(AbstractUser):
     class Role(models.TextChoices):
         CUSTOMER = 'customer', _('Customer')
@@ -21,18 +46,21 @@ class User(AbstractUser):
     def __str__(self):
         return self.username
 
-class Advertisement(models.Model):
+class Advertisement(TrackedFieldsMixin, models.Model):
     class Status(models.TextChoices):
         OPEN = 'open', _('Open')
         ASSIGNED = 'assigned', _('Assigned')
         DONE = 'done', _('Done')
         CANCELLED = 'cancelled', _('Cancelled')
 
+    tracked_fields = ('assigned_contractor_id', 'status')
+
     title = models.CharField(max_length=255)
     description = models.TextField()
     category = models.CharField(max_length=100)
     status = models.CharField(max_length=20, choices=Status.choices, default=Status.OPEN)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='advertisements')
     assigned_contractor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='assigned_jobs')
     
@@ -42,6 +70,17 @@ class Advertisement(models.Model):
     contractor_done = models.BooleanField(default=False)
     customer_confirmed = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='ad_created_id_idx'),
+            models.Index(fields=['owner', 'created_at', 'id'], name='ad_owner_created_idx'),
+            models.Index(fields=['assigned_contractor', 'status', 'execution_time'], name='ad_contractor_status_time_idx'),
+            # max(updated_at) and count() for the conditional GETs, read from the index alone
+            models.Index(fields=['updated_at'], name='ad_updated_idx'),
+            models.Index(fields=['owner', 'updated_at'], name='ad_owner_updated_idx'),
+            models.Index(fields=['status', 'updated_at'], name='ad_status_updated_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
@@ -52,21 +91,54 @@ class Bid(models.Model):
 
     class Meta:
         unique_together = ('advertisement', 'contractor')
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='bid_created_id_idx'),
+            models.Index(fields=['contractor', 'created_at', 'id'], name='bid_contractor_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.contractor} -> {self.advertisement}"
 
-class Comment(models.Model):
+class Comment(TrackedFieldsMixin, models.Model):
+    tracked_fields = ('contractor_id', 'score')
+
     text = models.TextField()
     score = models.IntegerField(choices=[(i, i) for i in range(1, 6)])
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='comments_written')
     advertisement = models.ForeignKey(Advertisement, on_delete=models.CASCADE, related_name='comments')
     contractor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='comments_received')
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='comment_created_id_idx'),
+            models.Index(fields=['score', 'id'], name='comment_score_id_idx'),
+            models.Index(fields=['contractor', 'created_at', 'id'], name='comment_contractor_created_idx'),
+            models.Index(fields=['contractor', 'updated_at'], name='comment_contractor_updated_idx'),
+        ]
 
     def __str__(self):
         return f"Comment by {self.author} on {self.contractor}"
 
+class ContractorStats(models.Model):
+    contractor = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    comment_count = models.PositiveIntegerField(default=0)
+    score_sum = models.PositiveIntegerField(default=0)
+    avg_score = models.FloatField(null=True, blank=True)
+    done_count = models.PositiveIntegerField(default=0)
+    assigned_count = models.PositiveIntegerField(default=0)
+    not_done_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['avg_score'], name='stats_avg_score_idx'),
+            models.Index(fields=['comment_count'], name='stats_comment_count_idx'),
+        ]
+
+    def __str__(self):
+        return f"Stats for {self.contractor_id}"
+
 class Ticket(models.Model):
     class Status(models.TextChoices):
         OPEN = 'open', _('Open')
@@ -82,6 +154,108 @@ class Ticket(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # set while a support agent holds the ticket from /api/tickets/next/
+    claimed_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='claimed_tickets')
+    lease_expiry = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='ticket_created_id_idx'),
+            models.Index(fields=['author', 'created_at', 'id'], name='ticket_author_created_idx'),
+            models.Index(fields=['status', 'created_at', 'id'], name='ticket_status_created_idx'),
+            models.Index(fields=['status', 'lease_expiry', 'created_at'], name='ticket_queue_idx'),
+            models.Index(fields=['updated_at'], name='ticket_updated_idx'),
+            models.Index(fields=['author', 'updated_at'], name='ticket_author_updated_idx'),
+        ]
+
     def __str__(self):
         return self.title
 
+
+class Change(models.Model):
+    """
+    Append-only log of writes to the models /api/changes/ syncs. The id is the
+    sync position; compaction deletes old and superseded entries.
+
+    A write is logged once per `audience` value (see api.changes.audience())
+    of the row before and after it, so each user's feed only reads entries of
+    rows they could see.
+    """
+    class Kind(models.TextChoices):
+        ADVERTISEMENT = 'advertisement', _('Advertisement')
+        BID = 'bid', _('Bid')
+        COMMENT = 'comment', _('Comment')
+        TICKET = 'ticket', _('Ticket')
+
+    class Action(models.TextChoices):
+        CREATED = 'created', _('Created')
+        UPDATED = 'updated', _('Updated')
+        DELETED = 'deleted', _('Deleted')
+
+    kind = models.CharField(max_length=20, choices=Kind.choices)
+    object_id = models.PositiveBigIntegerField()
+    action = models.CharField(max_length=10, choices=Action.choices)
+    audience = models.CharField(max_length=40)
+    at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['kind', 'object_id', 'audience', 'id'], name='change_object_idx'),
+            models.Index(fields=['audience', 'id'], name='change_audience_idx'),
+            models.Index(fields=['at'], name='change_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.action} {self.kind} {self.object_id}"
+
+class Event(models.Model):
+    """A notification for one user, streamed by /api/events/ and replayed from Last-Event-ID."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='events')
+    type = models.CharField(max_length=50)
+    data = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'id'], name='event_user_idx'),
+            models.Index(fields=['created_at'], name='event_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.type} for {self.user_id}"
+
+class Job(models.Model):
+    """A deferred task for `manage.py run_jobs`; see api.jobs."""
+    class Status(models.TextChoices):
+        QUEUED = 'queued', _('Queued')
+        RUNNING = 'running', _('Running')
+        DONE = 'done', _('Done')
+        FAILED = 'failed', _('Failed')
+
+    name = models.CharField(max_length=100)
+    args = models.JSONField(default=dict)
+    # at most one queued job per key; a key already queued makes enqueue() a no-op
+    key = models.CharField(max_length=200, null=True, blank=True)
+    priority = models.SmallIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_at = models.DateTimeField()
+    locked_by = models.CharField(max_length=100, null=True, blank=True)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', '-priority', 'run_at', 'id'], name='job_queue_idx'),
+            models.Index(fields=['status', 'locked_until'], name='job_lease_idx'),
+            models.Index(fields=['status', 'finished_at'], name='job_finished_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['key'], condition=models.Q(status='queued'), name='job_queued_key_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.status})"
@@ -0,0 +1,155 @@
+import base64
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Opaque-cursor keyset pagination.
+
+    Rows are ordered by the queryset ordering (or `ordering` below) with the
+    primary key appended as a tie-breaker, and each page is fetched with a
+    `WHERE (k1, k2) < (v1, v2)` style filter instead of an OFFSET, so a deep
+    page costs the same as the first one.
+    """
+    page_size = 20
+    max_page_size = 100
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    ordering = ('-created_at', '-id')
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        window = self.page_window(queryset, request, view)
+        return self.finish_page(list(window))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        window = self.page_window(queryset, request, view)
+        return self.finish_page([obj async for obj in window])
+
+    def page_window(self, queryset, request, view):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(queryset, view)
+        self.fields = [self._field(queryset, name.lstrip('-')) for name in self.ordering]
+
+        self.reverse, self.position = self.decode_cursor(request)
+        order = [self._flip(name) for name in self.ordering] if self.reverse else list(self.ordering)
+
+        queryset = queryset.order_by(*order)
+        if self.position is not None:
+            queryset = queryset.filter(self._keyset_filter(order, self.position))
+        return queryset[:self.page_size + 1]
+
+    def finish_page(self, results):
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if self.reverse:
+            results.reverse()
+
+        self.has_next = has_more if not self.reverse else self.position is not None
+        self.has_previous = self.position is not None if not self.reverse else has_more
+        self.page = results
+        return results
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def get_ordering(self, queryset, view):
+        ordering = list(queryset.query.order_by) or list(getattr(view, 'ordering', None) or self.ordering)
+        pk_name = queryset.model._meta.pk.name
+        if not any(name.lstrip('-') in (pk_name, 'pk') for name in ordering):
+            ordering.append('-pk' if ordering[-1].startswith('-') else 'pk')
+        return tuple(name.replace('pk', pk_name, 1) if name.lstrip('-') == 'pk' else name for name in ordering)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(False, self.page[-1])
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(True, self.page[0])
+
+    def encode_cursor(self, reverse, obj):
+        # obj is a model instance, or a .values() row from api.readers
+        values = [obj[name.lstrip('-')] if isinstance(obj, dict) else getattr(obj, name.lstrip('-'))
+                  for name in self.ordering]
+        payload = json.dumps([int(reverse), values], default=str, separators=(',', ':'))
+        token = base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+        return replace_query_param(self.base_url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return False, None
+        try:
+            payload = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+            reverse, values = json.loads(payload)
+            if len(values) != len(self.fields):
+                raise ValueError
+            position = [field.to_python(value) for field, value in zip(self.fields, values)]
+            # the list orderings never yield NULL (nullable ones go through Coalesce), and
+            # _keyset_filter() cannot compare with it, so a None here is a forged cursor
+            if None in position:
+                raise ValueError
+        except (TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return bool(reverse), position
+
+    @staticmethod
+    def _flip(name):
+        return name[1:] if name.startswith('-') else '-' + name
+
+    @staticmethod
+    def _field(queryset, name):
+        if name in queryset.query.annotations:
+            return queryset.query.annotations[name].output_field
+        return queryset.model._meta.get_field(name)
+
+    @staticmethod
+    def _keyset_filter(order, position):
+        # (a, b, c) after (x, y, z) == a > x OR (a = x AND b > y) OR (a = x AND b = y AND c > z)
+        condition = Q()
+        equal = Q()
+        for name, value in zip(order, position):
+            field = name.lstrip('-')
+            lookup = '__lt' if name.startswith('-') else '__gt'
+            condition |= equal & Q(**{field + lookup: value})
+            equal &= Q(**{field: value})
+        return condition
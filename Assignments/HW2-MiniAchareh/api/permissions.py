@@ -20,25 +20,25 @@ class IsOwnerOrReadOnly(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         if request.method in permissions.SAFE_METHODS:
             return True
-        if hasattr(obj, 'owner'):
-            return obj.owner == request.user
-        if hasattr(obj, 'author'):
-            return obj.author == request.user
+        if hasattr(obj, 'owner_id'):
+            return obj.owner_id == request.user.id
+        if hasattr(obj, 'author_id'):
+            return obj.author_id == request.user.id
         return False
 
 class IsOwnerOrAssignedContractor(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         if request.method in permissions.SAFE_METHODS:
             return True
-        if obj.owner == request.user:
-            return True
-        if obj.assigned_contractor == request.user:
-            return True
-        return False
+        return request.user.id in (obj.owner_id, obj.assigned_contractor_id)
 
 class IsSelfOrSupportOrAdmin(permissions.BasePermission):
     def has_object_permission(self, request, view, obj):
         if request.user.role in ['admin', 'support']:
             return True
-        return obj == request.user
+        return obj.pk == request.user.pk
 
+
+class IsSupportOrAdmin(permissions.BasePermission):
+    def has_permission(self, request, view):
+        return request.user.is_authenticated and request.user.role in ['support', 'admin']
@@ -0,0 +1,131 @@
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.http import Http404
+from rest_framework import exceptions, permissions
+from .models import User, Advertisement
+
+
+class Self:
+    def __repr__(self):
+        return 'SELF'
+
+
+# stands for the requesting user's id inside a rule
+SELF = Self()
+
+ALL = Q()
+NOTHING = Q(pk__in=[])
+
+
+def bind(rule, user):
+    """Copy of `rule` with every SELF replaced by `user.pk`."""
+    bound = Q(_connector=rule.connector, _negated=rule.negated)
+    for child in rule.children:
+        if isinstance(child, Q):
+            bound.children.append(bind(child, user))
+        else:
+            lookup, value = child
+            bound.children.append((lookup, user.pk if value is SELF else value))
+    return bound
+
+
+class Policy:
+    """
+    Rows each role may see, as Q filters on the model's own columns.
+
+    `read` scopes GET/HEAD/OPTIONS and `write` every other method (it defaults to
+    `read`); roles that are not listed get nothing.
+    """
+
+    def __init__(self, read, write=None):
+        self.read = read
+        self.write = read if write is None else write
+
+    def rule(self, user, write=False):
+        rule = (self.write if write else self.read).get(getattr(user, 'role', None))
+        return NOTHING if rule is None else bind(rule, user)
+
+    def scope(self, queryset, user, write=False):
+        return queryset.filter(self.rule(user, write))
+
+
+EVERYONE = {role: ALL for role in User.Role}
+OWN_TICKETS = Q(author_id=SELF)
+
+ADVERTISEMENTS = Policy(
+    read={
+        User.Role.ADMIN: ALL,
+        User.Role.SUPPORT: ALL,
+        User.Role.CUSTOMER: Q(owner_id=SELF),
+        User.Role.CONTRACTOR: Q(status=Advertisement.Status.OPEN) | Q(assigned_contractor_id=SELF),
+    },
+    write={
+        User.Role.CUSTOMER: Q(owner_id=SELF),
+        User.Role.CONTRACTOR: Q(assigned_contractor_id=SELF),
+    },
+)
+
+BIDS = Policy(read={
+    User.Role.CONTRACTOR: Q(contractor_id=SELF),
+    User.Role.CUSTOMER: Q(advertisement__owner_id=SELF),
+})
+
+COMMENTS = Policy(
+    read=EVERYONE,
+    write={
+        User.Role.ADMIN: ALL,
+        User.Role.SUPPORT: ALL,
+        User.Role.CUSTOMER: Q(author_id=SELF),
+    },
+)
+
+TICKETS = Policy(read={
+    User.Role.SUPPORT: ALL,
+    User.Role.ADMIN: OWN_TICKETS,
+    User.Role.CUSTOMER: OWN_TICKETS,
+    User.Role.CONTRACTOR: OWN_TICKETS,
+})
+
+USERS = Policy(
+    read={
+        User.Role.ADMIN: ALL,
+        User.Role.SUPPORT: ALL,
+        User.Role.CUSTOMER: Q(role=User.Role.CONTRACTOR) | Q(pk=SELF),
+        User.Role.CONTRACTOR: Q(role=User.Role.CONTRACTOR),
+    },
+    write={
+        User.Role.ADMIN: ALL,
+        User.Role.SUPPORT: ALL,
+        User.Role.CUSTOMER: Q(pk=SELF),
+        User.Role.CONTRACTOR: Q(pk=SELF),
+    },
+)
+
+
+class PolicyMixin:
+    """
+    Scope get_queryset() with `policy` so hidden rows never leave the database.
+
+    A detail request for a row that exists but is hidden answers 403 (with
+    `denied_messages[action]` if set) instead of 404; telling the two apart
+    costs one EXISTS query on that path only.
+    """
+    policy = None
+    denied_messages = {}
+
+    def get_queryset(self):
+        write = self.request.method not in permissions.SAFE_METHODS
+        return self.policy.scope(super().get_queryset(), self.request.user, write)
+
+    def get_object(self):
+        try:
+            return super().get_object()
+        except Http404:
+            lookup = {self.lookup_field: self.kwargs[self.lookup_url_kwarg or self.lookup_field]}
+            try:
+                hidden = self.queryset.model._default_manager.filter(**lookup).exists()
+            except (TypeError, ValueError, ValidationError):
+                hidden = False
+            if hidden:
+                raise exceptions.PermissionDenied(self.denied_messages.get(self.action))
+            raise
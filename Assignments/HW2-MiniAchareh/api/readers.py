@@ -0,0 +1,153 @@
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+from rest_framework import ISO_8601, fields, relations
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from .middleware import serializing
+
+# fields whose to_representation() returns database values of the column's type unchanged
+PASSTHROUGH = (fields.CharField, fields.IntegerField, fields.BooleanField, fields.FloatField)
+
+_readers = {}
+
+
+class Unsupported(Exception):
+    pass
+
+
+class Row(dict):
+    """A .values() row that object permissions can read like a model instance."""
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+def iso_datetime(tz):
+    # DateTimeField.to_representation() for aware values and the ISO 8601 format
+    def convert(value):
+        value = value.astimezone(tz).isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+    return convert
+
+
+class ValuesReader:
+    """
+    Read-only twin of a ModelSerializer built from .values() rows.
+
+    The serializer's readable fields are compiled once into (output name,
+    values() path, converter) columns, so a row costs one dict lookup per
+    field instead of an instance plus get_attribute()/to_representation().
+    Only flat fields are supported; anything else raises Unsupported.
+    """
+
+    def __init__(self, serializer_class):
+        self.serializer_class = serializer_class
+        serializer = serializer_class()
+        model = serializer.Meta.model
+        self.columns = [self.compile(model, field) for field in serializer._readable_fields]
+        # the foreign keys come along so object permissions can check *_id columns
+        self.paths = list(dict.fromkeys(
+            [path for _, path, _ in self.columns]
+            + [field.attname for field in model._meta.concrete_fields if field.is_relation]
+        ))
+
+    @staticmethod
+    def compile(model, field):
+        if field.source == '*' or isinstance(field, (relations.ManyRelatedField, fields.SerializerMethodField)):
+            raise Unsupported(field.field_name)
+        if isinstance(field, relations.PrimaryKeyRelatedField):
+            if field.pk_field is not None:
+                raise Unsupported(field.field_name)
+            return field.field_name, model._meta.get_field(field.source).attname, None
+        if isinstance(field, relations.RelatedField) or hasattr(field, 'fields'):
+            raise Unsupported(field.field_name)
+
+        path = '__'.join(field.source_attrs)
+        if type(field) is fields.ReadOnlyField:
+            return field.field_name, path, None
+        if isinstance(field, fields.DateTimeField):
+            iso = (getattr(field, 'format', api_settings.DATETIME_FORMAT) or '').lower() == ISO_8601
+            if iso and settings.USE_TZ and not hasattr(field, 'timezone'):
+                return field.field_name, path, iso_datetime
+            return field.field_name, path, field.to_representation
+        if isinstance(field, fields.MultipleChoiceField):
+            raise Unsupported(field.field_name)
+        if isinstance(field, fields.ChoiceField):
+            if all(type(key) in (str, int) for key in field.choices):
+                return field.field_name, path, None
+            return field.field_name, path, field.to_representation
+        if isinstance(field, PASSTHROUGH):
+            return field.field_name, path, None
+        return field.field_name, path, field.to_representation
+
+    def values(self, queryset, extra=()):
+        return queryset.values(*dict.fromkeys(self.paths + list(extra)))
+
+    def represent(self, rows):
+        tz = timezone.get_current_timezone()
+        columns = [(name, path, convert(tz) if convert is iso_datetime else convert)
+                   for name, path, convert in self.columns]
+        result = []
+        for row in rows:
+            item = {}
+            for name, path, convert in columns:
+                value = row[path]
+                item[name] = value if convert is None or value is None else convert(value)
+            result.append(item)
+        return result
+
+
+def values_reader(serializer_class):
+    """The cached ValuesReader for `serializer_class`, or None if it cannot have one."""
+    if serializer_class not in _readers:
+        try:
+            _readers[serializer_class] = ValuesReader(serializer_class)
+        except Unsupported:
+            _readers[serializer_class] = None
+    return _readers[serializer_class]
+
+
+class ValuesReadMixin:
+    """
+    list() and retrieve() from .values() rows through values_reader(); the JSON is
+    the same as the serializer's (ValuesReaderTests, and `manage.py
+    check_read_serializers` on real data). Writes and serializers the reader
+    cannot compile go through DRF as usual.
+    """
+
+    def list(self, request, *args, **kwargs):
+        reader = values_reader(self.get_serializer_class())
+        if reader is None:
+            with serializing():
+                return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        if self.paginator is None:
+            with serializing():
+                return Response(reader.represent(reader.values(queryset)))
+        # the cursor is built from the ordering columns of the last row
+        ordering = [name.lstrip('-') for name in self.paginator.get_ordering(queryset, self)]
+        page = self.paginate_queryset(reader.values(queryset, ordering))
+        with serializing():
+            return self.get_paginated_response(reader.represent(page))
+
+    def retrieve(self, request, *args, **kwargs):
+        reader = values_reader(self.get_serializer_class())
+        if reader is None:
+            with serializing():
+                return super().retrieve(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            row = reader.values(queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})).first()
+        except (TypeError, ValueError, ValidationError):
+            row = None
+        if row is None:
+            # the 404, or the policy's 403
+            return super().retrieve(request, *args, **kwargs)
+        self.check_object_permissions(request, Row(row))
+        with serializing():
+            return Response(reader.represent([row])[0])
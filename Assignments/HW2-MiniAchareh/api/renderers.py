@@ -0,0 +1,76 @@
+import json
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from .middleware import serializing
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class StreamRenderer(BaseRenderer):
+    """
+    Marker renderers for the export endpoints: the views stream the body
+    themselves, these only take part in content negotiation (Accept or ?format=).
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        # only reached for error responses raised before streaming starts
+        return json.dumps(data, ensure_ascii=False).encode(self.charset)
+
+
+class CSVRenderer(StreamRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class NDJSONRenderer(StreamRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer on orjson when it is installed.
+
+    Datetimes, decimals, lazy strings, ... go through DRF's encoder, so the
+    bytes match JSONRenderer's apart from the spelling of very large or small
+    floats. Indented output (`; indent=4`, the browsable API) uses the stdlib.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with serializing():
+            return self.encode(data, accepted_media_type, renderer_context)
+
+    def encode(self, data, accepted_media_type, renderer_context):
+        if orjson is None or self.ensure_ascii or not self.compact or data is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        ret = orjson.dumps(data, default=JSONEncoder().default,
+                           option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS)
+        # JSONRenderer escapes these to stay a JavaScript subset
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class MessagePackRenderer(BaseRenderer):
+    """`Accept: application/msgpack`; only registered when msgpack is installed."""
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        with serializing():
+            return msgpack.packb(data, default=JSONEncoder().default, use_bin_type=True)
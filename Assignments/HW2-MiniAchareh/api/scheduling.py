@@ -0,0 +1,132 @@
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from .models import Advertisement
+
+BLOCKING_STATUSES = [Advertisement.Status.ASSIGNED, Advertisement.Status.OPEN]
+# contractors per IN (...) list, well under SQLite's bound-parameter limit
+CONFLICT_BATCH_SIZE = 500
+
+
+def conflict_buffer(category=None):
+    hours = getattr(settings, 'CONFLICT_BUFFER_HOURS_BY_CATEGORY', {}).get(
+        category, getattr(settings, 'CONFLICT_BUFFER_HOURS', 2))
+    return timedelta(hours=hours)
+
+
+def max_conflict_buffer():
+    return max([conflict_buffer()] + [
+        timedelta(hours=hours)
+        for hours in getattr(settings, 'CONFLICT_BUFFER_HOURS_BY_CATEGORY', {}).values()
+    ])
+
+
+def find_time_conflicts(candidates, category=None, exclude_ad_id=None):
+    """
+    Check many (contractor_id, execution_time) pairs at once.
+
+    The contractors' blocking ads near each requested time are read with one
+    query per time (and per CONFLICT_BATCH_SIZE contractors) and matched in
+    memory; two jobs conflict when they are closer than the larger of their
+    categories' buffers. Returns a dict mapping each pair to the list of
+    conflicting ads (empty when the contractor is free).
+    """
+    candidates = [(contractor_id, when) for contractor_id, when in candidates]
+    result = {pair: [] for pair in candidates}
+    timed = [(contractor_id, when) for contractor_id, when in candidates if contractor_id and when]
+    if not timed:
+        return result
+
+    # an IN list per time instead of one OR'ed Q per pair: SQLite refuses
+    # expression trees deeper than 1000, i.e. 1000 candidates
+    contractors_at = defaultdict(set)
+    for contractor_id, when in timed:
+        contractors_at[when].add(contractor_id)
+    window = max_conflict_buffer()
+    found = {}
+    for when, contractor_ids in contractors_at.items():
+        contractor_ids = sorted(contractor_ids)
+        for start in range(0, len(contractor_ids), CONFLICT_BATCH_SIZE):
+            ads = Advertisement.objects.filter(
+                assigned_contractor_id__in=contractor_ids[start:start + CONFLICT_BATCH_SIZE],
+                execution_time__range=(when - window, when + window),
+                status__in=BLOCKING_STATUSES,
+            ).only('id', 'title', 'category', 'execution_time', 'assigned_contractor_id')
+            if exclude_ad_id:
+                ads = ads.exclude(id=exclude_ad_id)
+            found.update((ad.id, ad) for ad in ads)
+
+    schedule = defaultdict(list)
+    for ad in sorted(found.values(), key=lambda ad: ad.execution_time):
+        schedule[ad.assigned_contractor_id].append(ad)
+    times = {contractor_id: [ad.execution_time for ad in jobs] for contractor_id, jobs in schedule.items()}
+
+    buffer = conflict_buffer(category)
+    for contractor_id, when in timed:
+        jobs = schedule.get(contractor_id, [])
+        starts = times.get(contractor_id, [])
+        nearby = jobs[bisect_left(starts, when - window):bisect_right(starts, when + window)]
+        result[(contractor_id, when)] = [
+            ad for ad in nearby
+            if abs(ad.execution_time - when) <= max(buffer, conflict_buffer(ad.category))
+        ]
+    return result
+
+
+def conflict_q(contractor_id, when, category=None):
+    """
+    The contractor's blocking ads that conflict with a `category` job at `when`,
+    by the same rule as find_time_conflicts(), as a filter usable inside a
+    conditional UPDATE.
+    """
+    buffer = conflict_buffer(category)
+    by_category = getattr(settings, 'CONFLICT_BUFFER_HOURS_BY_CATEGORY', {})
+    near = Q(execution_time__range=(when - buffer, when + buffer))
+    # jobs whose own category needs a wider gap
+    if conflict_buffer() > buffer:
+        wider = conflict_buffer()
+        near |= ~Q(category__in=list(by_category)) & Q(execution_time__range=(when - wider, when + wider))
+    for other, hours in by_category.items():
+        wider = timedelta(hours=hours)
+        if wider > buffer:
+            near |= Q(category=other, execution_time__range=(when - wider, when + wider))
+    return Q(assigned_contractor_id=contractor_id, status__in=BLOCKING_STATUSES) & near
+
+
+def check_contractor_time_conflict(contractor, execution_time, exclude_ad_id=None, category=None):
+    if not execution_time:
+        return False, None
+    contractor_id = getattr(contractor, 'pk', contractor)
+    conflicts = find_time_conflicts([(contractor_id, execution_time)], category, exclude_ad_id)
+    conflicting = conflicts[(contractor_id, execution_time)]
+    return bool(conflicting), conflicting[0] if conflicting else None
+
+
+def parse_day(value):
+    """A YYYY-MM-DD query parameter as a date, or None when it is malformed or no such day exists (2024-02-30)."""
+    try:
+        return parse_date(value)
+    except ValueError:
+        return None
+
+
+def day_range(day):
+    """Half-open [start, end) bounds of a calendar day in the current timezone, so filters stay sargable."""
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+def contractor_schedule(contractor_id, day=None):
+    ads = Advertisement.objects.filter(
+        assigned_contractor_id=contractor_id,
+        status=Advertisement.Status.ASSIGNED,
+        execution_time__isnull=False
+    )
+    if day:
+        start, end = day_range(day)
+        ads = ads.filter(execution_time__gte=start, execution_time__lt=end)
+    return ads.order_by('execution_time')
@@ -0,0 +1,76 @@
+import re
+from django.db import connection, transaction
+from django.db.models import FloatField
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'api_advertisement_fts'
+# bm25 column weights for (title, description, category, location)
+FTS_WEIGHTS = (10.0, 1.0, 4.0, 2.0)
+# the rows the index holds a copy of
+INDEXED = 'SELECT id, title, description, category, location FROM api_advertisement'
+
+TOKEN = re.compile(r'\w+', re.UNICODE)
+
+
+def fts_available():
+    return connection.vendor == 'sqlite'
+
+
+def fts_query(text):
+    """Turn free user input into an FTS5 query: every word must match, the last one as a prefix."""
+    tokens = TOKEN.findall(text or '')
+    if not tokens:
+        return None
+    phrases = ['"%s"' % token for token in tokens]
+    phrases[-1] += '*'
+    return ' '.join(phrases)
+
+
+def matching_ids(query):
+    return RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [query])
+
+
+def search_advertisements(queryset, text):
+    """
+    Filter advertisements to those matching `text` in the FTS5 index and
+    annotate them with their bm25 `rank` (lower is better).
+    """
+    query = fts_query(text)
+    if query is None:
+        return queryset.none()
+    if not fts_available():
+        return queryset.filter(title__icontains=text)
+    table = queryset.model._meta.db_table
+    weights = ', '.join(str(weight) for weight in FTS_WEIGHTS)
+    # bm25() of all matches is computed once: LIMIT -1 stops SQLite from flattening the inner
+    # select into a MATCH per row, and the rank is looked up in it by an automatic index
+    rank = RawSQL(
+        f'SELECT ranked.rank FROM (SELECT rowid AS id, bm25({FTS_TABLE}, {weights}) AS rank '
+        f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s LIMIT -1) ranked WHERE ranked.id = {table}.id',
+        [query], output_field=FloatField(),
+    )
+    return queryset.filter(id__in=matching_ids(query)).annotate(rank=rank)
+
+
+def index_advertisements(ids):
+    """Bring the index entries of these advertisements up to date; ids that no longer exist are dropped."""
+    if not fts_available() or not ids:
+        return
+    placeholders = ', '.join(['%s'] * len(ids))
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})', ids)
+        cursor.execute(f'INSERT INTO {FTS_TABLE}(rowid, title, description, category, location) '
+                       f'{INDEXED} WHERE id IN ({placeholders})', ids)
+
+
+def rebuild_search_index():
+    """Re-index every advertisement; returns the number of rows indexed."""
+    if not fts_available():
+        return 0
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(f'INSERT INTO {FTS_TABLE}(rowid, title, description, category, location) {INDEXED}')
+        indexed = cursor.rowcount
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES('optimize')")
+    return indexed
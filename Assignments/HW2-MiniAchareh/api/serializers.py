@@ -5,6 +5,14 @@ class LoginSerializer(serializers.Serializer):
     username = serializers.CharField()
     password = serializers.CharField(write_only=True)
 
+class RefreshTokenSerializer(serializers.Serializer):
+    refresh = serializers.CharField()
+
+class TokenPairSerializer(serializers.Serializer):
+    access = serializers.CharField()
+    refresh = serializers.CharField()
+    expires_in = serializers.IntegerField()
+
 class ChangeRoleSerializer(serializers.Serializer):
     role = serializers.ChoiceField(choices=User.Role.choices)
 
@@ -21,6 +29,13 @@ class UserSerializer(serializers.ModelSerializer):
         user = User.objects.create_user(**validated_data)
         return user
 
+class ContractorSerializer(UserSerializer):
+    avg_score = serializers.FloatField(read_only=True)
+    comment_count = serializers.IntegerField(read_only=True)
+
+    class Meta(UserSerializer.Meta):
+        fields = UserSerializer.Meta.fields + ['avg_score', 'comment_count']
+
 class AdvertisementSerializer(serializers.ModelSerializer):
     owner = serializers.ReadOnlyField(source='owner.username')
     
@@ -51,4 +66,4 @@ class TicketSerializer(serializers.ModelSerializer):
     class Meta:
         model = Ticket
         fields = '__all__'
-        read_only_fields = ['created_at', 'updated_at', 'response', 'status']
+        read_only_fields = ['created_at', 'updated_at', 'response', 'status', 'claimed_by', 'lease_expiry']
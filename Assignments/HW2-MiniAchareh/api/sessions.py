@@ -0,0 +1,40 @@
+import time
+from django.conf import settings
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+
+
+class SessionStore(CachedDBStore):
+    """
+    Cache-first session engine with coalesced database writes.
+
+    Reads come from the cache and only fall back to the database on a miss.
+    Changes to the session data are written through at once, but a save that
+    only slides the expiry (SESSION_SAVE_EVERY_REQUEST) updates the cache and
+    reaches the database at most once per SESSION_DB_WRITE_INTERVAL seconds.
+    """
+    cache_key_prefix = 'api.sessions.'
+
+    @property
+    def sync_key(self):
+        return self.cache_key + ':synced'
+
+    def db_write_due(self):
+        synced = self._cache.get(self.sync_key)
+        return synced is None or time.time() - synced >= getattr(settings, 'SESSION_DB_WRITE_INTERVAL', 300)
+
+    def save(self, must_create=False):
+        if self._session_key is None:
+            # a new session: the parent creates the row, then comes back here with must_create.
+            # Reading cache_key first would invent a key whose row does not exist yet.
+            return super().save(must_create)
+        if must_create or self.modified or self.db_write_due():
+            super().save(must_create)
+            self._cache.set(self.sync_key, time.time(), self.get_expiry_age())
+            return
+        self._cache.set(self.cache_key, self._get_session(), self.get_expiry_age())
+
+    def delete(self, session_key=None):
+        key = session_key or self.session_key
+        super().delete(session_key)
+        if key:
+            self._cache.delete(self.cache_key_prefix + key + ':synced')
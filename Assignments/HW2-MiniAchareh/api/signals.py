@@ -0,0 +1,89 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+from . import changes, events, jobs, tokens
+from .cache import invalidate_leaderboard, invalidate_user
+from .models import User, Advertisement, Bid, Change, Comment, Ticket
+from .stats import record_comment, record_job
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    record_comment(None if created else instance.loaded_state(), instance.tracked_state())
+    transaction.on_commit(invalidate_leaderboard)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    # the contractor may be going away in the same cascade, never recreate its row here
+    record_comment(instance.loaded_state() or instance.tracked_state(), None, create_missing=False)
+    transaction.on_commit(invalidate_leaderboard)
+
+
+@receiver(post_save, sender=Advertisement)
+def advertisement_saved(sender, instance, created, **kwargs):
+    record_job(None if created else instance.loaded_state(), instance.tracked_state())
+    index_later(instance.pk)
+
+
+@receiver(post_delete, sender=Advertisement)
+def advertisement_deleted(sender, instance, **kwargs):
+    record_job(instance.loaded_state() or instance.tracked_state(), None, create_missing=False)
+    index_later(instance.pk)
+
+
+def index_later(advertisement_id):
+    # lifecycle transitions use update() and leave the indexed text alone
+    jobs.enqueue('search.index', key=f'search.index:{advertisement_id}', advertisement_id=advertisement_id)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    invalidate_user(instance.pk)
+    transaction.on_commit(lambda: invalidate_user(instance.pk))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_access_changed(sender, instance, signal, **kwargs):
+    # the version bump above already stops the user's requests; this also ends their refresh tokens
+    if signal is post_delete or not instance.is_active:
+        tokens.revoke_user(instance.pk)
+
+
+@receiver(post_save, sender=Advertisement)
+@receiver(post_save, sender=Bid)
+@receiver(post_save, sender=Comment)
+@receiver(post_save, sender=Ticket)
+def synced_saved(sender, instance, created, **kwargs):
+    changes.record(sender, [instance], Change.Action.CREATED if created else Change.Action.UPDATED)
+
+
+@receiver(post_save, sender=Bid)
+def bid_saved(sender, instance, created, **kwargs):
+    if created:
+        events.publish([instance.advertisement.owner_id], 'bid.created', {
+            'bid': instance.pk, 'advertisement': instance.advertisement_id, 'contractor': instance.contractor_id,
+        })
+
+
+@receiver(post_delete, sender=Advertisement)
+@receiver(post_delete, sender=Bid)
+@receiver(post_delete, sender=Comment)
+@receiver(post_delete, sender=Ticket)
+def synced_deleted(sender, instance, **kwargs):
+    changes.record(sender, [instance], Change.Action.DELETED)
+
+
+@receiver(pre_delete, sender=Advertisement)
+def advertisement_deleting(sender, instance, **kwargs):
+    # the deletion sets related_advertisement to NULL with a plain UPDATE
+    changes.record(Ticket, Ticket.objects.filter(related_advertisement=instance))
+
+
+@receiver(pre_delete, sender=User)
+def user_deleting(sender, instance, **kwargs):
+    # likewise for claimed_by and assigned_contractor; the user's own rows are deleted one by one
+    changes.record(Ticket, Ticket.objects.filter(claimed_by=instance))
+    changes.record(Advertisement, Advertisement.objects.filter(assigned_contractor=instance))
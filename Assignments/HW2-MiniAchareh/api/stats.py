@@ -0,0 +1,97 @@
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, Q, Sum, Value, When
+from django.db.models.functions import Cast
+from . import jobs
+from .models import User, Advertisement, Comment, ContractorStats
+
+
+def job_buckets(status):
+    return {
+        'done_count': int(status == Advertisement.Status.DONE),
+        'assigned_count': int(status == Advertisement.Status.ASSIGNED),
+        'not_done_count': int(status != Advertisement.Status.DONE),
+    }
+
+
+def _apply(contractor_id, create_missing, **deltas):
+    deltas = {name: delta for name, delta in deltas.items() if delta}
+    if contractor_id is None or not deltas:
+        return
+    updates = {name: F(name) + delta for name, delta in deltas.items()}
+    count_delta = deltas.get('comment_count', 0)
+    if 'comment_count' in deltas or 'score_sum' in deltas:
+        # every F() on the right-hand side of an UPDATE sees the old row
+        updates['avg_score'] = Case(
+            When(comment_count=-count_delta, then=Value(None)),
+            default=Cast(F('score_sum') + deltas.get('score_sum', 0), FloatField())
+            / (F('comment_count') + count_delta),
+            output_field=FloatField(),
+        )
+    updated = ContractorStats.objects.filter(pk=contractor_id).update(**updates)
+    if not updated and create_missing:
+        # first event for this contractor: count everything once the current row has committed
+        jobs.enqueue('stats.refresh', key=f'stats.refresh:{contractor_id}', contractor_id=contractor_id)
+
+
+def record_comment(old, new, create_missing=True):
+    """Apply a Comment change given its (contractor_id, score) state before and after."""
+    if old == new:
+        return
+    if old and old.get('contractor_id') is not None:
+        _apply(old['contractor_id'], create_missing, comment_count=-1, score_sum=-old['score'])
+    if new and new.get('contractor_id') is not None:
+        _apply(new['contractor_id'], create_missing, comment_count=1, score_sum=new['score'])
+
+
+def record_job(old, new, create_missing=True):
+    """Apply an Advertisement change given its (assigned_contractor_id, status) state before and after."""
+    if old == new:
+        return
+    if old and old.get('assigned_contractor_id') is not None:
+        removed = {name: -n for name, n in job_buckets(old['status']).items()}
+        _apply(old['assigned_contractor_id'], create_missing, **removed)
+    if new and new.get('assigned_contractor_id') is not None:
+        _apply(new['assigned_contractor_id'], create_missing, **job_buckets(new['status']))
+
+
+def rebuild_contractor_stats(contractor_ids=None, batch_size=1000):
+    """Recompute ContractorStats from scratch, for every contractor or only the given ids."""
+    comments = Comment.objects.all()
+    jobs = Advertisement.objects.filter(assigned_contractor__isnull=False)
+    contractors = User.objects.filter(role=User.Role.CONTRACTOR)
+    existing = ContractorStats.objects.all()
+    if contractor_ids is not None:
+        comments = comments.filter(contractor_id__in=contractor_ids)
+        jobs = jobs.filter(assigned_contractor_id__in=contractor_ids)
+        contractors = User.objects.filter(id__in=contractor_ids)
+        existing = existing.filter(contractor_id__in=contractor_ids)
+
+    stats = {
+        contractor_id: ContractorStats(contractor_id=contractor_id)
+        for contractor_id in contractors.values_list('id', flat=True)
+    }
+
+    def row(contractor_id):
+        return stats.setdefault(contractor_id, ContractorStats(contractor_id=contractor_id))
+
+    for item in comments.values('contractor_id').annotate(n=Count('id'), total=Sum('score')).order_by():
+        entry = row(item['contractor_id'])
+        entry.comment_count = item['n']
+        entry.score_sum = item['total']
+        entry.avg_score = item['total'] / item['n']
+
+    done = Q(status=Advertisement.Status.DONE)
+    for item in jobs.values('assigned_contractor_id').annotate(
+        done=Count('id', filter=done),
+        assigned=Count('id', filter=Q(status=Advertisement.Status.ASSIGNED)),
+        not_done=Count('id', filter=~done),
+    ).order_by():
+        entry = row(item['assigned_contractor_id'])
+        entry.done_count = item['done']
+        entry.assigned_count = item['assigned']
+        entry.not_done_count = item['not_done']
+
+    with transaction.atomic():
+        existing.delete()
+        ContractorStats.objects.bulk_create(stats.values(), batch_size=batch_size)
+    return len(stats)
@@ -0,0 +1,46 @@
+from django.db import transaction
+from .jobs import task
+from .models import User, Advertisement, Bid, Comment, Event, Ticket
+from .search import index_advertisements
+from .stats import rebuild_contractor_stats
+
+
+@task('stats.refresh', priority=10)
+def refresh_contractor_stats(contractor_id):
+    rebuild_contractor_stats([contractor_id])
+
+
+@task('search.index', priority=5)
+def index_advertisement(advertisement_id):
+    index_advertisements([advertisement_id])
+
+
+def delete_in_batches(queryset, batch_size):
+    while True:
+        ids = list(queryset.values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return
+        with transaction.atomic():
+            # through the ORM so the stats, change log and search signals see every row
+            queryset.model.objects.filter(pk__in=ids).delete()
+
+
+@task('users.delete')
+def delete_user(user_id, batch_size=200):
+    """
+    The cascade behind UserViewSet.destroy(): the user's rows go in short
+    transactions, then the user. Safe to re-run after a crash.
+    """
+    if not User.objects.filter(pk=user_id).exists():
+        return
+    for queryset in (
+        Bid.objects.filter(contractor_id=user_id),
+        Comment.objects.filter(author_id=user_id),
+        Comment.objects.filter(contractor_id=user_id),
+        Ticket.objects.filter(author_id=user_id),
+        Event.objects.filter(user_id=user_id),
+        Advertisement.objects.filter(owner_id=user_id),
+    ):
+        delete_in_batches(queryset, batch_size)
+    with transaction.atomic():
+        User.objects.filter(pk=user_id).delete()
@@ -0,0 +1,433 @@
+import re
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import caches
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APITestCase
+
+from . import changes, lifecycle, ticket_queue, tokens
+from .backends import EmailPhoneUsernameBackend
+from .management.commands.check_query_plans import COVERING, FULL_SCAN, RANKED_ONCE, SEARCH, hot_queries, version_queries
+from .management.commands.check_read_serializers import VIEWSETS
+from .cache import cache_user, cached_leaderboard, get_cache, get_cached_user, invalidate_user, leaderboard_key
+from .models import User, Advertisement, Bid, Comment, Ticket
+from .readers import ValuesReader, values_reader
+from .scheduling import find_time_conflicts
+from .search import rebuild_search_index
+from .stats import rebuild_contractor_stats
+
+# every alias in this process: the file-based shared caches would outlive the test database
+LOCAL_CACHES = {
+    alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': alias}
+    for alias in settings.CACHES
+}
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class QueryBudgetTests(APITestCase):
+    """
+    Every endpoint and action runs a fixed number of SQL queries, checked with
+    10, 100 and 1000 rows behind each list: an N+1 changes the count with the
+    row count and fails here. Requests authenticate with bearer tokens, which
+    are checked without a query.
+    """
+    sizes = (10, 100, 1000)
+
+    @classmethod
+    def setUpTestData(cls):
+        def make(username, role):
+            return User.objects.create_user(username=username, email=f'{username}@example.com', password='pw', role=role)
+        cls.customer = make('customer', User.Role.CUSTOMER)
+        cls.contractor = make('contractor', User.Role.CONTRACTOR)
+        cls.bidder = make('bidder', User.Role.CONTRACTOR)
+        cls.support = make('support', User.Role.SUPPORT)
+        cls.admin = make('admin', User.Role.ADMIN)
+
+    def setUp(self):
+        self.rows = 0
+        # timed, so available_bidders runs the conflict check for every bidder on the page
+        self.open_ad = self.ad(status=Advertisement.Status.OPEN, assigned_contractor=None)
+
+    def ad(self, **fields):
+        values = {
+            'title': 'Fix the kitchen sink', 'description': 'Leaking pipe', 'category': 'plumbing',
+            'owner': self.customer, 'status': Advertisement.Status.ASSIGNED, 'assigned_contractor': self.contractor,
+            'execution_time': timezone.now() + timedelta(days=365),
+        }
+        values.update(fields)
+        return Advertisement.objects.create(**values)
+
+    def populate(self, rows):
+        """Top every list up to `rows` rows: ads, bids, comments, tickets, contractors and bids on open_ad."""
+        new = range(self.rows, rows)
+        self.rows = rows
+        start = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        ads = Advertisement.objects.bulk_create([
+            Advertisement(title=f'Ad {i}', description='Paint the walls', category='painting', owner=self.customer,
+                          status=Advertisement.Status.ASSIGNED, assigned_contractor=self.contractor,
+                          execution_time=start + timedelta(minutes=i))
+            for i in new
+        ])
+        Bid.objects.bulk_create([Bid(advertisement=ad, contractor=self.contractor) for ad in ads])
+        Comment.objects.bulk_create([
+            Comment(text='Great job', score=i % 5 + 1, author=self.customer, advertisement=ad, contractor=self.contractor)
+            for i, ad in zip(new, ads)
+        ])
+        tickets = Ticket.objects.bulk_create([
+            Ticket(title=f'Ticket {i}', message='Help', author=self.customer) for i in new
+        ])
+        contractors = User.objects.bulk_create([
+            User(username=f'contractor{i}', email=f'contractor{i}@example.com', role=User.Role.CONTRACTOR)
+            for i in new
+        ])
+        Bid.objects.bulk_create([Bid(advertisement=self.open_ad, contractor=user) for user in contractors])
+        changes.record(Ticket, Ticket.objects.filter(pk__in=[ticket.pk for ticket in tickets]))
+        rebuild_contractor_stats()
+        rebuild_search_index()
+
+    def request(self, user, method, url, data=None):
+        token = tokens.issue(user, tokens.ACCESS)
+        response = getattr(self.client, method)(url, data, format='json', HTTP_AUTHORIZATION=f'Bearer {token}')
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response
+
+    def assertQueries(self, budget, user, method, url, data=None, status=200):
+        with self.assertNumQueries(budget):
+            response = self.request(user, method, url, data)
+        self.assertEqual(response.status_code, status, getattr(response, 'data', None))
+        return response
+
+    def check(self, run):
+        for rows in self.sizes:
+            self.populate(rows)
+            # every size starts cold, apart from the acting users, who are cached as after their first request
+            for cache in caches.all():
+                cache.clear()
+            for user in (self.customer, self.contractor, self.bidder, self.support, self.admin):
+                cache_user(user, get_cached_user(user.pk)[1])
+            with self.subTest(rows=rows):
+                run()
+
+    def test_advertisements(self):
+        def run():
+            ad = self.ad()
+            self.assertQueries(2, self.customer, 'get', '/api/advertisements/')
+            self.assertQueries(2, self.contractor, 'get', '/api/advertisements/')
+            self.assertQueries(2, self.support, 'get', '/api/advertisements/?q=paint')
+            self.assertQueries(2, self.customer, 'get', f'/api/advertisements/{ad.pk}/')
+            self.assertQueries(5, self.customer, 'post', '/api/advertisements/',
+                               {'title': 'New ad', 'description': 'Tiles', 'category': 'tiling'}, status=201)
+            self.assertQueries(9, self.customer, 'patch', f'/api/advertisements/{ad.pk}/', {'title': 'Renamed'})
+            self.assertQueries(9, self.customer, 'delete', f'/api/advertisements/{self.ad().pk}/', status=204)
+        self.check(run)
+
+    def test_advertisement_lifecycle(self):
+        def run():
+            ad = self.ad(status=Advertisement.Status.OPEN, assigned_contractor=None)
+            Bid.objects.create(advertisement=ad, contractor=self.bidder)
+            self.assertQueries(3, self.customer, 'get', f'/api/advertisements/{self.open_ad.pk}/available_bidders/')
+            self.assertQueries(9, self.customer, 'post', f'/api/advertisements/{ad.pk}/assign/',
+                               {'contractor_id': self.bidder.pk})
+            self.assertQueries(6, self.bidder, 'post', f'/api/advertisements/{ad.pk}/mark_done/')
+            self.assertQueries(8, self.customer, 'post', f'/api/advertisements/{ad.pk}/confirm_done/')
+            self.assertQueries(8, self.customer, 'post', f'/api/advertisements/{self.ad().pk}/cancel/')
+        self.check(run)
+
+    def test_bids_and_comments(self):
+        def run():
+            ad = self.ad(status=Advertisement.Status.OPEN, assigned_contractor=None)
+            done = self.ad(status=Advertisement.Status.DONE)
+            self.assertQueries(1, self.contractor, 'get', '/api/bids/')
+            self.assertQueries(5, self.bidder, 'post', '/api/bids/', {'advertisement': ad.pk}, status=201)
+            self.assertQueries(1, self.customer, 'get', '/api/comments/')
+            self.assertQueries(1, self.customer, 'get', '/api/comments/?ordering=score')
+            self.assertQueries(7, self.customer, 'post', '/api/comments/',
+                               {'text': 'Good', 'score': 5, 'advertisement': done.pk, 'contractor': self.contractor.pk},
+                               status=201)
+        self.check(run)
+
+    def test_tickets(self):
+        def run():
+            ticket = Ticket.objects.create(title='Refund', message='Please', author=self.customer)
+            self.assertQueries(2, self.customer, 'get', '/api/tickets/')
+            self.assertQueries(2, self.support, 'get', '/api/tickets/')
+            self.assertQueries(2, self.customer, 'get', f'/api/tickets/{ticket.pk}/')
+            self.assertQueries(2, self.customer, 'post', '/api/tickets/', {'title': 'Late', 'message': 'Where'}, status=201)
+            claimed = self.assertQueries(8, self.support, 'post', '/api/tickets/next/')
+            self.assertQueries(5, self.support, 'post', f"/api/tickets/{claimed.data['id']}/release/")
+            self.assertQueries(6, self.support, 'post', f'/api/tickets/{ticket.pk}/reply/', {'response': 'Done'})
+        self.check(run)
+
+    def test_users(self):
+        def run():
+            self.assertQueries(1, self.admin, 'get', '/api/users/')
+            self.assertQueries(0, self.customer, 'get', '/api/users/me/')
+            self.assertQueries(3, self.customer, 'get', f'/api/users/{self.contractor.pk}/profile/')
+            self.assertQueries(3, self.customer, 'get', f'/api/users/{self.customer.pk}/profile/')
+            self.assertQueries(1, self.customer, 'get', '/api/users/contractors/?ordering=score')
+            self.assertQueries(1, self.customer, 'get', '/api/users/contractors/?min_score=1')
+            self.assertQueries(1, self.contractor, 'get', '/api/users/schedule/')
+            self.assertQueries(1, self.contractor, 'get', f'/api/users/schedule/?date={timezone.localdate()}')
+            self.assertQueries(0, self.contractor, 'get', '/api/users/schedule/?date=2024-02-30', status=400)
+            user = User.objects.create_user(username=f'newcomer{self.rows}', email=f'newcomer{self.rows}@example.com',
+                                            password='pw')
+            self.assertQueries(10, self.admin, 'post', f'/api/users/{user.pk}/change_role/', {'role': 'contractor'})
+            self.assertQueries(5, self.admin, 'delete', f'/api/users/{user.pk}/', status=202)
+        self.check(run)
+
+    def test_async_endpoints(self):
+        def run():
+            ad = self.ad()
+            self.assertQueries(1, self.customer, 'get', '/api/async/advertisements/')
+            self.assertQueries(1, self.customer, 'get', f'/api/async/advertisements/{ad.pk}/')
+            self.assertQueries(3, self.customer, 'get', f'/api/async/users/{self.contractor.pk}/profile/')
+            self.assertQueries(1, self.customer, 'get', '/api/async/users/contractors/')
+            self.assertQueries(1, self.contractor, 'get', '/api/async/users/schedule/')
+            self.assertQueries(0, self.contractor, 'get', '/api/async/users/schedule/?date=2024-02-30', status=400)
+        self.check(run)
+
+    def test_exports_and_sync(self):
+        def run():
+            self.assertQueries(1, self.support, 'get', '/api/export/advertisements/?format=csv')
+            self.assertQueries(1, self.support, 'get', '/api/export/comments/?format=ndjson')
+            self.assertQueries(1, self.support, 'get', '/api/export/tickets/?format=csv')
+            token = changes.encode_token(0, timezone.now())
+            self.assertQueries(3, self.customer, 'get', f'/api/changes/?since={token}')
+            self.assertQueries(5, self.admin, 'get', '/api/metrics/jobs/')
+        self.check(run)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class TimeConflictTests(TestCase):
+    def test_thousands_of_candidates(self):
+        customer = User.objects.create_user(username='customer', email='customer@example.com', password='pw')
+        contractors = User.objects.bulk_create([
+            User(username=f'contractor{i}', email=f'contractor{i}@example.com', role=User.Role.CONTRACTOR)
+            for i in range(3000)
+        ])
+        when = timezone.now() + timedelta(days=1)
+        busy = Advertisement.objects.create(
+            title='Busy', description='Tiles', category='tiling', owner=customer,
+            status=Advertisement.Status.ASSIGNED, assigned_contractor=contractors[-1], execution_time=when
+        )
+        candidates = [(contractor.pk, when) for contractor in contractors]
+        conflicts = find_time_conflicts(candidates)
+        self.assertEqual(conflicts[candidates[-1]], [busy])
+        self.assertFalse(any(conflicts[pair] for pair in candidates[:-1]))
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class RacingWriteTests(TestCase):
+    """An edit that read a row before another request changed it must not write the old values back."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user(username='customer', email='customer@example.com', password='pw')
+        cls.contractor = User.objects.create_user(username='contractor', email='contractor@example.com', password='pw',
+                                                  role=User.Role.CONTRACTOR)
+        cls.support = User.objects.create_user(username='support', email='support@example.com', password='pw',
+                                               role=User.Role.SUPPORT)
+
+    def test_ad_edit_after_transition(self):
+        ad = Advertisement.objects.create(title='Sink', description='Leak', category='plumbing', owner=self.customer,
+                                          status=Advertisement.Status.ASSIGNED, assigned_contractor=self.contractor)
+        stale = Advertisement.objects.get(pk=ad.pk)
+        self.assertTrue(lifecycle.cancel(ad))
+        self.assertFalse(lifecycle.update(stale, {'title': 'Kitchen sink'}))
+        ad.refresh_from_db()
+        self.assertEqual((ad.status, ad.title), (Advertisement.Status.CANCELLED, 'Sink'))
+
+        fresh = Advertisement.objects.get(pk=ad.pk)
+        self.assertTrue(lifecycle.update(fresh, {'title': 'Kitchen sink'}))
+        ad.refresh_from_db()
+        self.assertEqual((ad.status, ad.title), (Advertisement.Status.CANCELLED, 'Kitchen sink'))
+
+    def test_reply_after_claim(self):
+        ticket = Ticket.objects.create(title='Refund', message='Please', author=self.customer)
+        stale = Ticket.objects.get(pk=ticket.pk)
+        self.assertEqual(ticket_queue.claim_next(self.support).pk, ticket.pk)
+        self.assertFalse(ticket_queue.reply(stale, 'Done'))
+        ticket.refresh_from_db()
+        self.assertEqual((ticket.status, ticket.response), (Ticket.Status.IN_PROGRESS, None))
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class UserCacheTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='customer', email='customer@example.com', password='pw')
+        self.backend = EmailPhoneUsernameBackend()
+
+    def test_write_reaches_every_reader(self):
+        self.assertEqual(self.backend.get_user(self.user.pk).role, User.Role.CUSTOMER)
+        changed = User.objects.get(pk=self.user.pk)
+        changed.role = User.Role.SUPPORT
+        changed.save()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.backend.get_user(self.user.pk).role, User.Role.SUPPORT)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.backend.get_user(self.user.pk).role, User.Role.SUPPORT)
+
+    def test_copy_read_before_a_write_is_not_cached(self):
+        _, version = get_cached_user(self.user.pk)
+        stale = User.objects.get(pk=self.user.pk)
+        self.user.is_active = False
+        self.user.save()
+        cache_user(stale, version)
+        self.assertIsNone(get_cached_user(self.user.pk)[0])
+        self.assertIsNone(self.backend.get_user(self.user.pk))
+
+
+@override_settings(CACHES=LOCAL_CACHES, LEADERBOARD_WAIT_TIMEOUT=2, LEADERBOARD_WAIT_INTERVAL=0.01)
+class LeaderboardStampedeTests(SimpleTestCase):
+    def setUp(self):
+        self.request = Request(APIRequestFactory().get('/api/users/contractors/?ordering=score'))
+        get_cache().clear()
+        self.computed = 0
+
+    def compute(self):
+        self.computed += 1
+        time.sleep(0.2)
+        return {'results': []}
+
+    def test_cold_key_is_computed_once(self):
+        start = threading.Barrier(8)
+        outcomes = []
+
+        def call():
+            start.wait()
+            outcomes.append(cached_leaderboard(self.request, self.compute)[1])
+
+        threads = [threading.Thread(target=call) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.computed, 1)
+        self.assertEqual(sorted(outcomes), ['HIT'] * 7 + ['MISS'])
+
+    @override_settings(LEADERBOARD_WAIT_TIMEOUT=0.05)
+    def test_waiter_computes_when_the_lock_holder_is_gone(self):
+        get_cache().add(leaderboard_key(self.request) + ':lock', 1)
+        self.assertEqual(cached_leaderboard(self.request, self.compute), ({'results': []}, 'MISS'))
+        self.assertEqual(self.computed, 1)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class BearerTokenTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='customer', email='customer@example.com', password='pw')
+        self.token = tokens.issue(self.user, tokens.ACCESS)
+
+    def me(self):
+        return self.client.get('/api/users/me/', HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+    def test_role_change_applies_to_the_next_request(self):
+        self.assertEqual(self.me().data['role'], User.Role.CUSTOMER)
+        self.user.role = User.Role.SUPPORT
+        self.user.save()
+        self.assertEqual(self.me().data['role'], User.Role.SUPPORT)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.me().data['role'], User.Role.SUPPORT)
+
+    def test_closed_account(self):
+        self.assertEqual(self.me().status_code, 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.me().status_code, 401)
+        User.objects.filter(pk=self.user.pk).update(is_active=True)
+        invalidate_user(self.user.pk)
+        # revoke_user() has ended the token itself, not just the account
+        self.assertEqual(self.me().status_code, 401)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class ServerTimingTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='customer', email='customer@example.com', password='pw')
+        Advertisement.objects.create(title='Fix sink', description='Leaking', category='plumbing', owner=self.user)
+        self.client.force_authenticate(self.user)
+
+    def serializer_ms(self, path):
+        response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return float(re.search(r'\bser;dur=([\d.]+)', response['Server-Timing']).group(1))
+
+    def test_values_reader_counts_as_serialization(self):
+        represent = ValuesReader.represent
+
+        def slow_represent(reader, rows):
+            time.sleep(0.005)
+            return represent(reader, rows)
+
+        with mock.patch.object(ValuesReader, 'represent', slow_represent):
+            self.assertGreaterEqual(self.serializer_ms('/api/advertisements/'), 5)
+            self.assertGreaterEqual(self.serializer_ms(f'/api/advertisements/{Advertisement.objects.get().pk}/'), 5)
+
+
+class SharedCacheSettingsTests(SimpleTestCase):
+    def test_cross_worker_state_is_not_per_process(self):
+        # a logout, revocation or user change in one worker must reach every other worker
+        for alias in (settings.SESSION_CACHE_ALIAS, settings.USER_CACHE_ALIAS, settings.TOKEN_DENY_LIST_CACHE_ALIAS):
+            with self.subTest(alias=alias):
+                self.assertNotIn('locmem', settings.CACHES[alias]['BACKEND'])
+
+
+class QueryPlanTests(TestCase):
+    def test_hot_queries_use_their_indexes(self):
+        versions = version_queries()
+        for name, queryset in (hot_queries() | versions).items():
+            with self.subTest(query=name):
+                plan = queryset.explain()
+                self.assertEqual(FULL_SCAN.findall(plan), [], plan)
+                if name in versions:
+                    # the conditional GET versions are answered from the index alone
+                    self.assertRegex(plan, COVERING)
+                if name == SEARCH:
+                    self.assertRegex(plan, RANKED_ONCE)
+
+
+@override_settings(CACHES=LOCAL_CACHES)
+class ValuesReaderTests(TestCase):
+    """Every values() reader renders the same JSON as the serializer it replaces."""
+
+    @classmethod
+    def setUpTestData(cls):
+        customer = User.objects.create_user(username='customer', email='customer@example.com', password='pw')
+        contractor = User.objects.create_user(username='contractor', email='contractor@example.com', password='pw',
+                                              role=User.Role.CONTRACTOR)
+        support = User.objects.create_user(username='support', email='support@example.com', password='pw',
+                                           role=User.Role.SUPPORT)
+        # nullable columns both empty and set, and a non-UTC offset on the times
+        plain = Advertisement.objects.create(title='Sink', description='Leak', category='plumbing', owner=customer)
+        done = Advertisement.objects.create(
+            title='Wall', description='Paint', category='painting', owner=customer, location='Tehran',
+            status=Advertisement.Status.DONE, assigned_contractor=contractor, contractor_done=True,
+            customer_confirmed=True, execution_time=timezone.now().replace(microsecond=123456) + timedelta(days=2),
+        )
+        Bid.objects.create(advertisement=plain, contractor=contractor)
+        Comment.objects.create(text='Great', score=5, author=customer, advertisement=done, contractor=contractor)
+        Ticket.objects.create(title='Refund', message='Please', author=customer)
+        Ticket.objects.create(title='Late', message='Where', author=customer, related_advertisement=done,
+                              response='Done', status=Ticket.Status.CLOSED, claimed_by=support)
+
+    def test_same_json_as_the_serializer(self):
+        renderer = JSONRenderer()
+        for zone in ('UTC', 'Asia/Tehran'):
+            for viewset in VIEWSETS:
+                with self.subTest(serializer=viewset.serializer_class.__name__, zone=zone), timezone.override(zone):
+                    reader = values_reader(viewset.serializer_class)
+                    self.assertIsNotNone(reader)
+                    queryset = viewset.queryset.order_by('-created_at', '-id')
+                    self.assertTrue(queryset.exists())
+                    self.assertEqual(
+                        renderer.render(reader.represent(reader.values(queryset))),
+                        renderer.render(viewset.serializer_class(queryset, many=True).data),
+                    )
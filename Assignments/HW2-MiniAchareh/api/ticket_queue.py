@@ -0,0 +1,99 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from . import changes
+from .models import Ticket
+
+# a claim loses only when another agent took the same row in between
+CLAIM_ATTEMPTS = 5
+
+
+def lease_duration():
+    return settings.TICKET_LEASE
+
+
+def expired_leases(now):
+    return Ticket.objects.filter(status=Ticket.Status.IN_PROGRESS, lease_expiry__lt=now)
+
+
+def unclaimed():
+    return Ticket.objects.filter(status=Ticket.Status.OPEN, lease_expiry=None)
+
+
+def next_candidate(now):
+    """
+    Abandoned tickets first (their lease ran out), then the oldest open one.
+
+    Both lookups are a seek on ticket_queue_idx (status, lease_expiry, created_at)
+    that stops at the first row; an OR of the two would sort every open ticket.
+    """
+    return (expired_leases(now).order_by('lease_expiry').values_list('pk', flat=True).first()
+            or unclaimed().order_by('created_at', 'id').values_list('pk', flat=True).first())
+
+
+def claimable(now):
+    return (Q(status=Ticket.Status.OPEN, lease_expiry=None)
+            | Q(status=Ticket.Status.IN_PROGRESS, lease_expiry__lt=now))
+
+
+def claim_next(agent):
+    """
+    Lease the next ticket to `agent` and move it to IN_PROGRESS.
+
+    The claim is a conditional UPDATE that only matches while the ticket is still
+    claimable, so two agents never get the same ticket; the loser moves on to the
+    next candidate. Returns None when the queue is empty.
+    """
+    for _ in range(CLAIM_ATTEMPTS):
+        now = timezone.now()
+        pk = next_candidate(now)
+        if pk is None:
+            return None
+        with transaction.atomic():
+            claimed = Ticket.objects.filter(claimable(now), pk=pk).update(
+                status=Ticket.Status.IN_PROGRESS, claimed_by=agent,
+                lease_expiry=now + lease_duration(), updated_at=now,
+            )
+            if claimed:
+                changes.record(Ticket, Ticket.objects.filter(pk=pk))
+        if claimed:
+            return Ticket.objects.select_related('author').get(pk=pk)
+    return None
+
+
+def held_by_other(ticket, agent):
+    """True while someone else's lease on `ticket` is still running."""
+    return (ticket.status == Ticket.Status.IN_PROGRESS and ticket.claimed_by_id not in (None, agent.pk)
+            and ticket.lease_expiry is not None and ticket.lease_expiry >= timezone.now())
+
+
+def release(ticket, agent):
+    """Hand a claimed ticket back to the queue; only the lease holder may do so."""
+    now = timezone.now()
+    with transaction.atomic():
+        released = Ticket.objects.filter(
+            pk=ticket.pk, status=Ticket.Status.IN_PROGRESS, claimed_by=agent,
+        ).update(status=Ticket.Status.OPEN, claimed_by=None, lease_expiry=None, updated_at=now)
+        if released:
+            changes.record(Ticket, [ticket])
+    return bool(released)
+
+
+def reply(ticket, text):
+    """
+    Close `ticket` with the answer `text` in one conditional UPDATE of those columns.
+
+    It only matches while the ticket still has the status, claim and lease it
+    was read with, so a reply racing a claim, a release or another reply is
+    not written over them; the caller answers 409 when this returns False.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        replied = Ticket.objects.filter(
+            pk=ticket.pk, status=ticket.status, claimed_by_id=ticket.claimed_by_id, lease_expiry=ticket.lease_expiry,
+        ).update(response=text, status=Ticket.Status.CLOSED, lease_expiry=None, updated_at=now)
+        if replied:
+            ticket.response, ticket.status, ticket.lease_expiry, ticket.updated_at = text, Ticket.Status.CLOSED, None, now
+            changes.record(Ticket, [ticket])
+    return bool(replied)
@@ -0,0 +1,90 @@
+import time
+import uuid
+from datetime import timedelta
+from django.conf import settings
+from django.core import signing
+from django.core.cache import caches
+
+ACCESS, REFRESH = 'access', 'refresh'
+SALTS = {ACCESS: 'api.tokens.access', REFRESH: 'api.tokens.refresh'}
+
+
+class InvalidToken(Exception):
+    pass
+
+
+def lifetime(kind):
+    if kind == ACCESS:
+        return getattr(settings, 'ACCESS_TOKEN_LIFETIME', timedelta(minutes=15))
+    return getattr(settings, 'REFRESH_TOKEN_LIFETIME', timedelta(days=7))
+
+
+def deny_list():
+    return caches[settings.TOKEN_DENY_LIST_CACHE_ALIAS]
+
+
+def issue(user, kind):
+    claims = {
+        'uid': user.pk,
+        'jti': uuid.uuid4().hex,
+        'iat': time.time(),
+        'exp': int(time.time() + lifetime(kind).total_seconds()),
+    }
+    return signing.dumps(claims, salt=SALTS[kind])
+
+
+def issue_pair(user):
+    return {
+        'access': issue(user, ACCESS),
+        'refresh': issue(user, REFRESH),
+        'expires_in': int(lifetime(ACCESS).total_seconds()),
+    }
+
+
+def decode(token, kind):
+    try:
+        claims = signing.loads(token, salt=SALTS[kind])
+    except signing.BadSignature:
+        raise InvalidToken('Invalid token.')
+    if claims.get('exp', 0) < time.time():
+        raise InvalidToken('Token has expired.')
+    return claims
+
+
+def deny_keys(claims):
+    return ['token:revoked:' + claims['jti'], f"token:user:{claims['uid']}"]
+
+
+def check(claims, denied):
+    if 'token:revoked:' + claims['jti'] in denied:
+        raise InvalidToken('Token has been revoked.')
+    # tokens issued before revoke_user() for their user
+    revoked_before = denied.get(f"token:user:{claims['uid']}")
+    if revoked_before is not None and claims.get('iat', 0) <= revoked_before:
+        raise InvalidToken('Token has been revoked.')
+    return claims
+
+
+def verify(token, kind):
+    """Check signature, expiry and the deny-list; returns the claims. Only HMAC and one deny-list lookup, no hashing of passwords."""
+    claims = decode(token, kind)
+    return check(claims, deny_list().get_many(deny_keys(claims)))
+
+
+async def averify(token, kind):
+    """verify() for async views."""
+    claims = decode(token, kind)
+    return check(claims, await deny_list().aget_many(deny_keys(claims)))
+
+
+def revoke(claims):
+    # entries expire together with the token, so the deny-list only holds live tokens
+    remaining = int(claims['exp'] - time.time()) + 1
+    if remaining > 0:
+        deny_list().set('token:revoked:' + claims['jti'], 1, timeout=remaining)
+
+
+def revoke_user(user_id):
+    """Revoke every token issued to the user so far, e.g. when the account is deactivated or deleted."""
+    longest = max(lifetime(ACCESS), lifetime(REFRESH))
+    deny_list().set(f'token:user:{user_id}', time.time(), timeout=int(longest.total_seconds()) + 1)
@@ -1,6 +1,9 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import UserViewSet, AdvertisementViewSet, BidViewSet, CommentViewSet, TicketViewSet, LoginView, LogoutView
+from .views import UserViewSet, AdvertisementViewSet, BidViewSet, CommentViewSet, TicketViewSet, LoginView, LogoutView, TokenObtainView, TokenRefreshView, TokenRevokeView, RouteMetricsView, JobMetricsView
+from .exports import AdvertisementExportView, CommentExportView, TicketExportView
+from .changes import ChangeFeedView
+from . import async_views
 
 router = DefaultRouter()
 router.register(r'users', UserViewSet)
@@ -13,4 +16,19 @@ urlpatterns = [
     path('', include(router.urls)),
     path('login/', LoginView.as_view(), name='login'),
     path('logout/', LogoutView.as_view(), name='logout'),
+    path('token/', TokenObtainView.as_view(), name='token-obtain'),
+    path('token/refresh/', TokenRefreshView.as_view(), name='token-refresh'),
+    path('token/revoke/', TokenRevokeView.as_view(), name='token-revoke'),
+    path('metrics/routes/', RouteMetricsView.as_view(), name='metrics-routes'),
+    path('metrics/jobs/', JobMetricsView.as_view(), name='metrics-jobs'),
+    path('export/advertisements/', AdvertisementExportView.as_view(), name='export-advertisements'),
+    path('export/comments/', CommentExportView.as_view(), name='export-comments'),
+    path('export/tickets/', TicketExportView.as_view(), name='export-tickets'),
+    path('changes/', ChangeFeedView.as_view(), name='changes'),
+    path('async/advertisements/', async_views.advertisement_list, name='async-advertisement-list'),
+    path('async/advertisements/<int:pk>/', async_views.advertisement_detail, name='async-advertisement-detail'),
+    path('async/users/contractors/', async_views.contractor_list, name='async-user-contractors'),
+    path('async/users/schedule/', async_views.schedule, name='async-user-schedule'),
+    path('async/users/<int:pk>/profile/', async_views.user_profile, name='async-user-profile'),
+    path('events/', async_views.event_stream, name='events'),
 ]
@@ -1,37 +1,67 @@
-from rest_framework import viewsets, permissions, status, filters, views
+from functools import partial
+from rest_framework import viewsets, permissions, status, filters, views, exceptions
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db.models import Avg, Count, Q
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Value
+from django.db.models.functions import Coalesce
 from django.contrib.auth import authenticate, login, logout
 from django_filters.rest_framework import DjangoFilterBackend
 from drf_spectacular.utils import extend_schema
-from datetime import timedelta
-from .models import User, Advertisement, Bid, Comment, Ticket
-from .serializers import UserSerializer, AdvertisementSerializer, BidSerializer, CommentSerializer, TicketSerializer, LoginSerializer, ChangeRoleSerializer
+from .models import User, Advertisement, Bid, Comment, ContractorStats, Ticket
+from .serializers import UserSerializer, ContractorSerializer, AdvertisementSerializer, BidSerializer, CommentSerializer, TicketSerializer, LoginSerializer, ChangeRoleSerializer, RefreshTokenSerializer, TokenPairSerializer
 from .permissions import IsCustomer, IsContractor, IsSupport, IsAdmin, IsOwnerOrReadOnly, IsOwnerOrAssignedContractor, IsSelfOrSupportOrAdmin
-from .filters import ContractorFilter, CommentFilter
+from .conditional import ConditionalReadMixin, collection_version, conditional_response, make_etag
+from .readers import ValuesReadMixin
+from .policies import PolicyMixin, ADVERTISEMENTS, BIDS, COMMENTS, TICKETS, USERS
+from .filters import ContractorFilter, CommentFilter, AdvertisementSearchFilter
+from .stats import rebuild_contractor_stats
+from . import events, jobs, lifecycle, ticket_queue, tokens
+from .cache import cached_leaderboard, invalidate_leaderboard, leaderboard_cache_stats
+from .scheduling import check_contractor_time_conflict, find_time_conflicts, contractor_schedule, parse_day
+from .middleware import route_histograms, serialize
 
 
-def check_contractor_time_conflict(contractor, execution_time, exclude_ad_id=None):
-    if not execution_time:
-        return False, None
+def conflict_summary(ads):
+    return [{"id": ad.id, "title": ad.title, "execution_time": ad.execution_time} for ad in ads]
 
-    time_buffer = timedelta(hours=2)
-    start_time = execution_time - time_buffer
-    end_time = execution_time + time_buffer
 
-    conflicting_ads = Advertisement.objects.filter(
-        assigned_contractor=contractor,
-        status__in=[Advertisement.Status.ASSIGNED, Advertisement.Status.OPEN],
-        execution_time__isnull=False,
-        execution_time__range=(start_time, end_time)
+def state_conflict(ad, message):
+    # report the status as it is now, not as this request read it
+    return Response({"error": message, "status": lifecycle.current_status(ad)}, status=status.HTTP_409_CONFLICT)
+
+
+class StateConflict(exceptions.APIException):
+    """state_conflict() for code that cannot return a response, like perform_update()."""
+    status_code = status.HTTP_409_CONFLICT
+    default_code = 'state_conflict'
+
+    def __init__(self, ad, message):
+        super().__init__({"error": message, "status": lifecycle.current_status(ad)})
+
+
+def contractor_leaderboard(params):
+    queryset = User.objects.filter(role=User.Role.CONTRACTOR)
+
+    queryset = queryset.annotate(
+        avg_score=F('stats__avg_score'),
+        comment_count=Coalesce('stats__comment_count', 0)
     )
 
-    if exclude_ad_id:
-        conflicting_ads = conflicting_ads.exclude(id=exclude_ad_id)
+    filterset = ContractorFilter(params, queryset=queryset)
+    queryset = filterset.qs
 
-    conflicting_ad = conflicting_ads.first()
-    return conflicting_ad is not None, conflicting_ad
+    sort_by = params.get('ordering')
+    if sort_by == 'score':
+        # contractors without comments have a NULL average; rank them last
+        queryset = queryset.annotate(
+            score_rank=Coalesce('avg_score', Value(0.0))
+        ).order_by('-score_rank')
+    elif sort_by == 'comments':
+        queryset = queryset.order_by('-comment_count')
+    else:
+        queryset = queryset.order_by('-date_joined')
+    return queryset
 
 
 class LoginView(views.APIView):
@@ -51,22 +81,105 @@ class LoginView(views.APIView):
 
             if user is not None:
                 login(request, user)
-                return Response(UserSerializer(user).data)
+                return Response(serialize(UserSerializer(user)))
             else:
                 return Response({'error': 'Invalid credentials'}, status=status.HTTP_401_UNAUTHORIZED)
         else:
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
+class TokenObtainView(views.APIView):
+    permission_classes = [permissions.AllowAny]
+    authentication_classes = []
+
+    @extend_schema(
+        request=LoginSerializer,
+        responses={200: TokenPairSerializer, 401: None}
+    )
+    def post(self, request):
+        serializer = LoginSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        user = authenticate(request, username=serializer.validated_data['username'],
+                            password=serializer.validated_data['password'])
+        if user is None:
+            return Response({'error': 'Invalid credentials'}, status=status.HTTP_401_UNAUTHORIZED)
+        return Response(tokens.issue_pair(user))
+
+
+class TokenRefreshView(views.APIView):
+    permission_classes = [permissions.AllowAny]
+    authentication_classes = []
+
+    @extend_schema(
+        request=RefreshTokenSerializer,
+        responses={200: TokenPairSerializer, 401: None}
+    )
+    def post(self, request):
+        serializer = RefreshTokenSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            claims = tokens.verify(serializer.validated_data['refresh'], tokens.REFRESH)
+        except tokens.InvalidToken as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_401_UNAUTHORIZED)
+        # a closed account gets no new pair even if its refresh token was issued before revoke_user()
+        user = User.objects.filter(pk=claims['uid'], is_active=True).first()
+        if user is None:
+            return Response({'error': 'User not found'}, status=status.HTTP_401_UNAUTHORIZED)
+        tokens.revoke(claims)
+        return Response(tokens.issue_pair(user))
+
+
+class TokenRevokeView(views.APIView):
+    @extend_schema(request=RefreshTokenSerializer)
+    def post(self, request):
+        serializer = RefreshTokenSerializer(data=request.data)
+        if serializer.is_valid():
+            try:
+                claims = tokens.verify(serializer.validated_data['refresh'], tokens.REFRESH)
+            except tokens.InvalidToken:
+                claims = None
+            if claims and claims['uid'] == request.user.pk:
+                tokens.revoke(claims)
+        if isinstance(request.auth, dict) and 'jti' in request.auth:
+            tokens.revoke(request.auth)
+        return Response({'message': 'Tokens revoked'})
+
+
 class LogoutView(views.APIView):
     def post(self, request):
         logout(request)
         return Response({'message': 'Logout successful'})
 
 
-class UserViewSet(viewsets.ModelViewSet):
+class RouteMetricsView(views.APIView):
+    """Latency histograms per API route collected by RequestTimingMiddleware in this worker process."""
+    permission_classes = [IsAdmin]
+
+    def get(self, request):
+        return Response(route_histograms.snapshot())
+
+    def delete(self, request):
+        route_histograms.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class JobMetricsView(views.APIView):
+    """Depth of the background job queue per job name, and jobs finished recently."""
+    permission_classes = [IsAdmin]
+
+    def get(self, request):
+        return Response(jobs.queue_stats())
+
+
+class UserViewSet(PolicyMixin, viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
+    policy = USERS
+    denied_messages = {'profile': "Not allowed to view this profile."}
+    ordering_fields = ['date_joined', 'username']
+    ordering = ['-date_joined']
 
     def get_permissions(self):
         if self.action == 'create':
@@ -79,50 +192,74 @@ class UserViewSet(viewsets.ModelViewSet):
             return [permissions.IsAuthenticated(), IsAdmin()]
         return [permissions.IsAuthenticated()]
 
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'profile':
+            # the contractor counters come with the user row
+            queryset = queryset.select_related('stats')
+        return queryset
+
+    def embedded_page(self, queryset):
+        # newest first, bounded by the paginator's page size and walked with ?cursor=
+        return self.paginator.paginate_queryset(queryset.order_by('-created_at'), self.request, view=self)
+
+    def destroy(self, request, *args, **kwargs):
+        user = self.get_object()
+        # the account is closed right away: deactivating revokes its tokens (api.signals)
+        # and sessions stop authenticating; the users.delete job removes it and its rows
+        with transaction.atomic():
+            user.is_active = False
+            user.save(update_fields=['is_active'])
+            jobs.enqueue('users.delete', key=f'users.delete:{user.pk}', user_id=user.pk)
+        return Response({"status": "deletion scheduled"}, status=status.HTTP_202_ACCEPTED)
+
     @action(detail=False, methods=['get'])
     def me(self, request):
         serializer = self.get_serializer(request.user)
-        return Response(serializer.data)
+        return Response(serialize(serializer))
 
     @action(detail=True, methods=['get'])
     def profile(self, request, pk=None):
         user = self.get_object()
-        requester = request.user
-        if requester.role not in (User.Role.ADMIN, User.Role.SUPPORT):
-            if requester.role == User.Role.CUSTOMER:
-                if not (user.role == User.Role.CONTRACTOR or user == requester):
-                    return Response({"detail": "Not allowed to view this profile."}, status=status.HTTP_403_FORBIDDEN)
-            elif requester.role == User.Role.CONTRACTOR:
-                if user.role != User.Role.CONTRACTOR:
-                    return Response({"detail": "Not allowed to view this profile."}, status=status.HTTP_403_FORBIDDEN)
-            else:
-                return Response({"detail": "Not allowed to view this profile."}, status=status.HTTP_403_FORBIDDEN)
+        # the ETag covers the user row, the counters and the embedded list's version,
+        # so an unchanged profile is answered with 304 before the page is read
+        fields = (user.pk, user.username, user.email, user.phone_number, user.role,
+                  request.accepted_media_type, request.get_full_path())
         if user.role == User.Role.CONTRACTOR:
-            comments = Comment.objects.filter(
-                contractor=user).order_by('-created_at')
-            avg_score = comments.aggregate(Avg('score'))['score__avg']
-            done_ads_count = Advertisement.objects.filter(
-                assigned_contractor=user, status=Advertisement.Status.DONE).count()
-            in_progress_count = Advertisement.objects.filter(
-                assigned_contractor=user, status=Advertisement.Status.ASSIGNED).count()
-            not_done_count = Advertisement.objects.filter(
-                assigned_contractor=user).exclude(status=Advertisement.Status.DONE).count()
-            serializer = self.get_serializer(user)
-            data = serializer.data
-            data['avg_score'] = avg_score
-            data['done_ads_count'] = done_ads_count
-            data['in_progress_count'] = in_progress_count
-            data['not_done_count'] = not_done_count
-            data['comments'] = CommentSerializer(comments, many=True).data
-            return Response(data)
+            try:
+                stats = user.stats
+            except ContractorStats.DoesNotExist:
+                rebuild_contractor_stats([user.id])
+                stats = ContractorStats.objects.get(contractor=user)
+            comments = Comment.objects.filter(contractor=user)
+            etag = make_etag('profile', *fields, stats.avg_score, stats.done_count, stats.assigned_count,
+                             stats.not_done_count, *collection_version(comments))
+            return conditional_response(request, etag, None, partial(self.contractor_profile, user, stats, comments))
         elif user.role == User.Role.CUSTOMER:
             ads = Advertisement.objects.filter(owner=user)
-            serializer = self.get_serializer(user)
-            data = serializer.data
-            data['ads'] = AdvertisementSerializer(ads, many=True).data
-            return Response(data)
-        return Response(self.get_serializer(user).data)
+            etag = make_etag('profile', *fields, *collection_version(ads))
+            return conditional_response(request, etag, None, partial(self.customer_profile, user, ads))
+        return Response(serialize(self.get_serializer(user)))
+
+    def contractor_profile(self, user, stats, comments):
+        page = self.embedded_page(comments.select_related('author'))
+        data = serialize(self.get_serializer(user))
+        data['avg_score'] = stats.avg_score
+        data['done_ads_count'] = stats.done_count
+        data['in_progress_count'] = stats.assigned_count
+        data['not_done_count'] = stats.not_done_count
+        data['comments'] = serialize(CommentSerializer(page, many=True))
+        data['comments_next'] = self.paginator.get_next_link()
+        return Response(data)
+
+    def customer_profile(self, user, ads):
+        page = self.embedded_page(ads.select_related('owner'))
+        data = serialize(self.get_serializer(user))
+        data['ads'] = serialize(AdvertisementSerializer(page, many=True))
+        data['ads_next'] = self.paginator.get_next_link()
+        return Response(data)
 
+    @extend_schema(responses=ContractorSerializer(many=True))
     @action(detail=False, methods=['get'])
     def contractors(self, request):
         """
@@ -131,30 +268,19 @@ class UserViewSet(viewsets.ModelViewSet):
         - min_comments:
         - ordering: comments or avg_score
         """
-        queryset = User.objects.filter(role=User.Role.CONTRACTOR)
+        data, outcome = cached_leaderboard(request, lambda: self.leaderboard_page(request))
+        response = Response(data)
+        response['X-Cache'] = outcome
+        return response
 
-        queryset = queryset.annotate(
-            avg_score=Avg('comments_received__score'),
-            comment_count=Count('comments_received')
-        )
-
-        filterset = ContractorFilter(request.query_params, queryset=queryset)
-        queryset = filterset.qs
-
-        sort_by = request.query_params.get('ordering')
-        if sort_by == 'score':
-            queryset = queryset.order_by('-avg_score')
-        elif sort_by == 'comments':
-            queryset = queryset.order_by('-comment_count')
-
-        serializer = self.get_serializer(queryset, many=True)
-        data = serializer.data
+    def leaderboard_page(self, request):
+        page = self.paginate_queryset(contractor_leaderboard(request.query_params))
+        serializer = ContractorSerializer(page, many=True)
+        return self.get_paginated_response(serialize(serializer)).data
 
-        for i, contractor in enumerate(queryset):
-            data[i]['avg_score'] = contractor.avg_score
-            data[i]['comment_count'] = contractor.comment_count
-
-        return Response(data)
+    @action(detail=False, methods=['get'], permission_classes=[IsAdmin])
+    def contractors_cache_stats(self, request):
+        return Response(leaderboard_cache_stats())
 
     @extend_schema(request=ChangeRoleSerializer)
     @action(detail=True, methods=['post'], permission_classes=[IsAdmin])
@@ -167,6 +293,9 @@ class UserViewSet(viewsets.ModelViewSet):
         new_role = serializer.validated_data['role']
         user.role = new_role
         user.save()
+        invalidate_leaderboard()
+        if new_role == User.Role.CONTRACTOR and not ContractorStats.objects.filter(contractor=user).exists():
+            rebuild_contractor_stats([user.id])
         return Response({"status": "role updated", "role": user.role})
 
     @action(detail=False, methods=['get'], permission_classes=[IsContractor])
@@ -174,121 +303,155 @@ class UserViewSet(viewsets.ModelViewSet):
         if request.user.role != User.Role.CONTRACTOR:
             return Response({"error": "Only contractors can access schedule"}, status=status.HTTP_403_FORBIDDEN)
 
-        ads = Advertisement.objects.filter(
-            assigned_contractor=request.user,
-            status=Advertisement.Status.ASSIGNED,
-            execution_time__isnull=False
-        ).order_by('execution_time')
-
+        day = None
         date_str = request.query_params.get('date')
         if date_str:
-            ads = ads.filter(execution_time__date=date_str)
+            day = parse_day(date_str)
+            if day is None:
+                return Response({"error": "date must be in YYYY-MM-DD format"}, status=status.HTTP_400_BAD_REQUEST)
 
+        ads = contractor_schedule(request.user.id, day).select_related('owner')
         serializer = AdvertisementSerializer(ads, many=True)
-        return Response(serializer.data)
+        return Response(serialize(serializer))
 
 
-class AdvertisementViewSet(viewsets.ModelViewSet):
-    queryset = Advertisement.objects.all()
+class AdvertisementViewSet(ConditionalReadMixin, ValuesReadMixin, PolicyMixin, viewsets.ModelViewSet):
+    queryset = Advertisement.objects.select_related('owner')
     serializer_class = AdvertisementSerializer
+    policy = ADVERTISEMENTS
     permission_classes = [permissions.IsAuthenticated,
                           IsOwnerOrAssignedContractor]
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, AdvertisementSearchFilter]
+    ordering_fields = ['created_at']
+    ordering = ['-created_at']
 
     def perform_create(self, serializer):
         if self.request.user.role != User.Role.CUSTOMER:
-            raise permissions.PermissionDenied(
+            raise exceptions.PermissionDenied(
                 "Only customers can create advertisements.")
         serializer.save(owner=self.request.user)
 
     def perform_update(self, serializer):
-        ad = self.get_object()
-        if self.request.user == ad.assigned_contractor:
+        ad = serializer.instance
+        if self.request.user.id == ad.assigned_contractor_id:
             allowed_fields = {'execution_time', 'location'}
             if not set(serializer.validated_data.keys()).issubset(allowed_fields):
-                raise permissions.PermissionDenied(
+                raise exceptions.PermissionDenied(
                     "Contractor can only update execution_time and location.")
 
             if 'execution_time' in serializer.validated_data:
                 new_execution_time = serializer.validated_data['execution_time']
                 if new_execution_time:
                     has_conflict, conflicting_ad = check_contractor_time_conflict(
-                        ad.assigned_contractor,
+                        ad.assigned_contractor_id,
                         new_execution_time,
-                        exclude_ad_id=ad.id
+                        exclude_ad_id=ad.id,
+                        category=serializer.validated_data.get('category', ad.category)
                     )
                     if has_conflict:
-                        raise permissions.PermissionDenied(
+                        raise exceptions.PermissionDenied(
                             f"Time conflict with another assignment: {conflicting_ad.title} "
                             f"at {conflicting_ad.execution_time}"
                         )
-        serializer.save()
+        # the checks above read the ad's status and contractor; a transition in between answers 409
+        if not lifecycle.update(ad, serializer.validated_data):
+            raise StateConflict(ad, "The ad changed while updating; reload and try again")
 
     @action(detail=True, methods=['post'], permission_classes=[IsCustomer, IsOwnerOrReadOnly])
     def assign(self, request, pk=None):
         ad = self.get_object()
-        contractor_id = request.data.get('contractor_id')
+        if ad.status != Advertisement.Status.OPEN:
+            return state_conflict(ad, "Only open ads can be assigned")
         try:
-            contractor = User.objects.get(
-                id=contractor_id, role=User.Role.CONTRACTOR)
-        except User.DoesNotExist:
+            contractor_id = int(request.data.get('contractor_id'))
+        except (TypeError, ValueError):
             return Response({"error": "Contractor not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        if not Bid.objects.filter(advertisement=ad, contractor=contractor).exists():
+        # one query answers both "is this a contractor" and "did they bid"
+        has_bid = User.objects.filter(id=contractor_id, role=User.Role.CONTRACTOR).annotate(
+            has_bid=Exists(Bid.objects.filter(advertisement=ad, contractor=OuterRef('pk')))
+        ).values_list('has_bid', flat=True).first()
+        if has_bid is None:
+            return Response({"error": "Contractor not found"}, status=status.HTTP_404_NOT_FOUND)
+        if not has_bid:
             return Response({"error": "Contractor has not applied for this ad"}, status=status.HTTP_400_BAD_REQUEST)
 
         if ad.execution_time:
-            has_conflict, conflicting_ad = check_contractor_time_conflict(
-                contractor, ad.execution_time, exclude_ad_id=ad.id)
-            if has_conflict:
+            conflicts = find_time_conflicts(
+                [(contractor_id, ad.execution_time)], ad.category, exclude_ad_id=ad.id
+            )[(contractor_id, ad.execution_time)]
+            if conflicts:
                 return Response({
                     "error": "Contractor has a time conflict with another assignment",
-                    "conflicting_ad_id": conflicting_ad.id,
-                    "conflicting_ad_title": conflicting_ad.title,
-                    "conflicting_execution_time": conflicting_ad.execution_time
+                    "conflicting_ad_id": conflicts[0].id,
+                    "conflicting_ad_title": conflicts[0].title,
+                    "conflicting_execution_time": conflicts[0].execution_time,
+                    "conflicts": conflict_summary(conflicts)
                 }, status=status.HTTP_400_BAD_REQUEST)
 
-        ad.assigned_contractor = contractor
-        ad.status = Advertisement.Status.ASSIGNED
-        ad.save()
+        # the checks above are repeated inside the UPDATE, so a request that raced us loses here
+        if not lifecycle.assign(ad, contractor_id):
+            return state_conflict(ad, "The ad or the contractor changed while assigning; reload and try again")
         return Response({"status": "assigned"})
 
+    @action(detail=True, methods=['get'], permission_classes=[IsCustomer, IsOwnerOrReadOnly])
+    def available_bidders(self, request, pk=None):
+        ad = self.get_object()
+        if ad.owner_id != request.user.id:
+            return Response({"error": "You are not the owner of this ad"}, status=status.HTTP_403_FORBIDDEN)
+        # oldest bids first, a page at a time: popular ads collect thousands of bidders
+        bids = self.paginate_queryset(
+            Bid.objects.filter(advertisement=ad).select_related('contractor').order_by('created_at')
+        )
+        conflicts = find_time_conflicts(
+            [(bid.contractor_id, ad.execution_time) for bid in bids], ad.category, exclude_ad_id=ad.id
+        )
+        return self.get_paginated_response([{
+            "contractor_id": bid.contractor_id,
+            "contractor": bid.contractor.username,
+            "free": not conflicts[(bid.contractor_id, ad.execution_time)],
+            "conflicts": conflict_summary(conflicts[(bid.contractor_id, ad.execution_time)])
+        } for bid in bids])
+
     @action(detail=True, methods=['post'], permission_classes=[IsContractor])
     def mark_done(self, request, pk=None):
         ad = self.get_object()
-        if ad.assigned_contractor != request.user:
+        if ad.assigned_contractor_id != request.user.id:
             return Response({"error": "You are not the assigned contractor"}, status=status.HTTP_403_FORBIDDEN)
-        ad.contractor_done = True
-        ad.save()
+        if not lifecycle.mark_done(ad):
+            return state_conflict(ad, "Only assigned ads that are not marked as done yet can be marked as done")
         return Response({"status": "marked as done by contractor"})
 
     @action(detail=True, methods=['post'], permission_classes=[IsCustomer, IsOwnerOrReadOnly])
     def confirm_done(self, request, pk=None):
         ad = self.get_object()
         if not ad.contractor_done:
-            return Response({"error": "Contractor has not marked as done yet"}, status=status.HTTP_400_BAD_REQUEST)
-        ad.customer_confirmed = True
-        ad.status = Advertisement.Status.DONE
-        ad.save()
+            return state_conflict(ad, "Contractor has not marked as done yet")
+        if not lifecycle.confirm_done(ad):
+            return state_conflict(ad, "Only assigned ads can be confirmed")
         return Response({"status": "confirmed done"})
 
     @action(detail=True, methods=['post'], permission_classes=[IsCustomer, IsOwnerOrReadOnly])
     def cancel(self, request, pk=None):
         ad = self.get_object()
         if ad.status == Advertisement.Status.DONE:
-            return Response({"error": "Cannot cancel done ad"}, status=status.HTTP_400_BAD_REQUEST)
-        ad.status = Advertisement.Status.CANCELLED
-        ad.save()
+            return state_conflict(ad, "Cannot cancel done ad")
+        if not lifecycle.cancel(ad):
+            return state_conflict(ad, "Only open or assigned ads can be cancelled")
         return Response({"status": "cancelled"})
 
 
-class BidViewSet(viewsets.ModelViewSet):
-    queryset = Bid.objects.all()
+class BidViewSet(ValuesReadMixin, PolicyMixin, viewsets.ModelViewSet):
+    queryset = Bid.objects.select_related('contractor')
     serializer_class = BidSerializer
+    policy = BIDS
     permission_classes = [permissions.IsAuthenticated, IsContractor]
+    ordering_fields = ['created_at']
+    ordering = ['-created_at']
 
     def perform_create(self, serializer):
         if self.request.user.role != User.Role.CONTRACTOR:
-            raise permissions.PermissionDenied("Only contractors can bid.")
+            raise exceptions.PermissionDenied("Only contractors can bid.")
 
         advertisement = serializer.validated_data.get('advertisement')
         if advertisement is None:
@@ -296,23 +459,16 @@ class BidViewSet(viewsets.ModelViewSet):
             return
 
         if Bid.objects.filter(advertisement=advertisement, contractor=self.request.user).exists():
-            raise permissions.PermissionDenied(
+            raise exceptions.PermissionDenied(
                 "You have already placed a bid on this advertisement.")
 
         serializer.save(contractor=self.request.user)
 
-    def get_queryset(self):
-        user = self.request.user
-        if user.role == User.Role.CONTRACTOR:
-            return Bid.objects.filter(contractor=user)
-        elif user.role == User.Role.CUSTOMER:
-            return Bid.objects.filter(advertisement__owner=user)
-        return Bid.objects.none()
-
 
-class CommentViewSet(viewsets.ModelViewSet):
-    queryset = Comment.objects.all()
+class CommentViewSet(ValuesReadMixin, PolicyMixin, viewsets.ModelViewSet):
+    queryset = Comment.objects.select_related('author')
     serializer_class = CommentSerializer
+    policy = COMMENTS
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_class = CommentFilter
@@ -321,38 +477,53 @@ class CommentViewSet(viewsets.ModelViewSet):
 
     def perform_create(self, serializer):
         if self.request.user.role != User.Role.CUSTOMER:
-            raise permissions.PermissionDenied("Only customers can comment.")
+            raise exceptions.PermissionDenied("Only customers can comment.")
         ad = serializer.validated_data['advertisement']
-        if ad.owner != self.request.user:
-            raise permissions.PermissionDenied(
+        if ad.owner_id != self.request.user.id:
+            raise exceptions.PermissionDenied(
                 "You can only comment on your own ads.")
         if ad.status != Advertisement.Status.DONE:
-            raise permissions.PermissionDenied("Ad must be done to comment.")
+            raise exceptions.PermissionDenied("Ad must be done to comment.")
 
         serializer.save(author=self.request.user)
 
 
-class TicketViewSet(viewsets.ModelViewSet):
-    queryset = Ticket.objects.all()
+class TicketViewSet(ConditionalReadMixin, ValuesReadMixin, PolicyMixin, viewsets.ModelViewSet):
+    queryset = Ticket.objects.select_related('author')
     serializer_class = TicketSerializer
+    policy = TICKETS
     permission_classes = [permissions.IsAuthenticated]
+    ordering_fields = ['created_at']
+    ordering = ['-created_at']
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
-    def get_queryset(self):
-        user = self.request.user
-        if user.role == User.Role.SUPPORT:
-            return Ticket.objects.all()
-        return Ticket.objects.filter(author=user)
-
     @action(detail=True, methods=['post'], permission_classes=[IsSupport])
     def reply(self, request, pk=None):
         ticket = self.get_object()
         response_text = request.data.get('response')
         if not response_text:
             return Response({"error": "Response text required"}, status=status.HTTP_400_BAD_REQUEST)
-        ticket.response = response_text
-        ticket.status = Ticket.Status.CLOSED
-        ticket.save()
+        if ticket_queue.held_by_other(ticket, request.user):
+            return Response({"error": "Ticket is claimed by another agent"}, status=status.HTTP_409_CONFLICT)
+        if not ticket_queue.reply(ticket, response_text):
+            return Response({"error": "The ticket changed while replying; reload and try again"},
+                            status=status.HTTP_409_CONFLICT)
+        events.publish([ticket.author_id], 'ticket.replied', {'ticket': ticket.pk, 'status': ticket.status})
         return Response({"status": "replied"})
+
+    @action(detail=False, methods=['post'], permission_classes=[IsSupport])
+    def next(self, request):
+        """Claim the next ticket of the support queue for TICKET_LEASE."""
+        ticket = ticket_queue.claim_next(request.user)
+        if ticket is None:
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        return Response(serialize(self.get_serializer(ticket)))
+
+    @action(detail=True, methods=['post'], permission_classes=[IsSupport])
+    def release(self, request, pk=None):
+        ticket = self.get_object()
+        if not ticket_queue.release(ticket, request.user):
+            return Response({"error": "You do not hold this ticket"}, status=status.HTTP_409_CONFLICT)
+        return Response({"status": "released"})
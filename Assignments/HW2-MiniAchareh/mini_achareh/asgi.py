@@ -4,4 +4,6 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mini_achareh.settings')
 
+# Serves the whole API; /api/events/ (Server-Sent Events) and /api/async/ need it,
+# e.g. `uvicorn mini_achareh.asgi:application --workers 4`.
 application = get_asgi_application()
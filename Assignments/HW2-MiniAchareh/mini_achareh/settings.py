@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+from datetime import timedelta
+from importlib.util import find_spec
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -50,14 +52,16 @@ INSTALLED_APPS = [
 
 AUTH_USER_MODEL = 'api.User'
 
+# EmailPhoneUsernameBackend extends ModelBackend (permissions included) and already
+# covers username logins, so ModelBackend would only repeat the lookup on failures
 AUTHENTICATION_BACKENDS = [
     'api.backends.EmailPhoneUsernameBackend',
-    'django.contrib.auth.backends.ModelBackend',
 ]
 
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
     'DEFAULT_AUTHENTICATION_CLASSES': [
+        'api.authentication.SignedTokenAuthentication',
         'rest_framework.authentication.SessionAuthentication',
         'rest_framework.authentication.BasicAuthentication',
     ],
@@ -68,8 +72,121 @@ REST_FRAMEWORK = {
         'django_filters.rest_framework.DjangoFilterBackend',
         'rest_framework.filters.OrderingFilter',
     ],
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.KeysetPagination',
+    'PAGE_SIZE': 20,
+    # chosen with Accept / Content-Type; orjson and msgpack are optional
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ] + (['api.renderers.MessagePackRenderer'] if find_spec('msgpack') else []),
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ] + (['api.parsers.MessagePackParser'] if find_spec('msgpack') else []),
 }
 
+# LocMemCache evicts least-recently-used entries once MAX_ENTRIES is reached
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'mini-achareh',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    # State every worker process must agree on: sessions, users resolved for
+    # requests and their per-user versions (api.cache). FileBasedCache shares it between the
+    # processes of one host without a database query (SQLite keeps the app on
+    # one host anyway); on several hosts point it at Redis or Memcached.
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'shared',
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+    # Revoked tokens must stay revoked in every worker process and are checked
+    # on every bearer request, so the deny-list is a shared file cache of its
+    # own rather than the database or the per-process default cache. Entries
+    # expire with their token, and MAX_ENTRIES is far above the number of
+    # revoked tokens still live, so none is culled early. Redis or Memcached
+    # on several hosts, like `shared`.
+    'tokens': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'tokens',
+        'OPTIONS': {'MAX_ENTRIES': 1000000},
+    },
+}
+TOKEN_DENY_LIST_CACHE_ALIAS = 'tokens'
+
+ACCESS_TOKEN_LIFETIME = timedelta(minutes=15)
+REFRESH_TOKEN_LIFETIME = timedelta(days=7)
+
+# Sessions live in the shared cache, so a logout or flush in one worker ends
+# the session in all of them, and are written to the database when their data
+# changes or, for sliding-expiry refreshes, at most once per interval.
+SESSION_ENGINE = 'api.sessions'
+SESSION_CACHE_ALIAS = 'shared'
+SESSION_SAVE_EVERY_REQUEST = True
+SESSION_DB_WRITE_INTERVAL = 300
+
+# Users resolved for session requests are cached in the shared cache; every save
+# bumps the user's version there, which every worker checks on read
+USER_CACHE_ALIAS = 'shared'
+USER_CACHE_TIMEOUT = 300
+
+LEADERBOARD_CACHE_TIMEOUT = 300
+LEADERBOARD_LOCK_TIMEOUT = 30
+# While one request computes a missing leaderboard page the others poll the
+# cache for it, and compute it themselves only after this many seconds
+LEADERBOARD_WAIT_TIMEOUT = 5
+LEADERBOARD_WAIT_INTERVAL = 0.05
+
+# Minimum gap (in hours) between two jobs of the same contractor, optionally per ad category
+CONFLICT_BUFFER_HOURS = 2
+CONFLICT_BUFFER_HOURS_BY_CATEGORY = {}
+
+# How long a ticket claimed from /api/tickets/next/ stays with the agent before it
+# goes back to the queue
+TICKET_LEASE = timedelta(minutes=15)
+
+# /api/changes/ tokens older than this answer 410; `manage.py compact_changes`
+# deletes log entries past it
+CHANGE_LOG_RETENTION = timedelta(days=7)
+
+# /api/events/ (Server-Sent Events, ASGI only). EVENT_FANOUT_BACKEND carries published events
+# to the streams: api.events.DatabaseFanout polls the Event table every POLL_INTERVAL seconds
+# in each worker, api.events.LocalFanout only reaches streams of the publishing process.
+# A stream more than STREAM_BUFFER events behind is closed and resumes from Last-Event-ID.
+EVENT_FANOUT_BACKEND = 'api.events.DatabaseFanout'
+EVENT_POLL_INTERVAL = 0.5
+EVENT_STREAM_BUFFER = 256
+EVENT_HEARTBEAT = 15
+EVENT_RETRY_MS = 3000
+EVENT_RETENTION = timedelta(days=1)
+
+# api.jobs: background jobs run by `manage.py run_jobs`. A job is retried after failures
+# with a delay doubling from RETRY_DELAY seconds, and a worker that dies mid-job loses it
+# to another after LEASE; finished jobs are kept for RETENTION.
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_DELAY = 5
+JOB_RETRY_MAX_DELAY = 600
+JOB_LEASE = timedelta(minutes=10)
+JOB_POLL_INTERVAL = 1.0
+JOB_RETENTION = timedelta(days=1)
+
+# api.middleware.RequestTimingMiddleware: requests slower than SLOW_MS or running at least
+# SLOW_QUERIES queries are logged to `api.slow_requests`, SAMPLE_RATE of them at random
+REQUEST_TIMING_SLOW_MS = 500
+REQUEST_TIMING_SLOW_QUERIES = 50
+REQUEST_TIMING_SAMPLE_RATE = 1.0
+REQUEST_TIMING_SLOWEST_QUERIES = 3
+REQUEST_TIMING_HEADER = True
+
+# api.compression.CompressionMiddleware: zstd (if zstandard is installed) or gzip
+# from Accept-Encoding, for API bodies (JSON, MessagePack, CSV, NDJSON) of at least
+# MIN_SIZE bytes and every export stream; HTML is left alone because of BREACH
+RESPONSE_COMPRESSION_MIN_SIZE = 1024
+RESPONSE_COMPRESSION_GZIP_LEVEL = 6
+RESPONSE_COMPRESSION_ZSTD_LEVEL = 3
+
 SPECTACULAR_SETTINGS = {
     'TITLE': 'MiniAchareh API',
     'DESCRIPTION': 'API for MiniAchareh project',
@@ -78,6 +195,8 @@ SPECTACULAR_SETTINGS = {
 }
 
 MIDDLEWARE = [
+    'api.middleware.RequestTimingMiddleware',
+    'api.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -114,6 +233,14 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Job workers (run_jobs --processes N) write next to the web process.
+        # Transactions take the write lock when they begin, so a writer waits up
+        # to `timeout` seconds for the others instead of failing with
+        # "database is locked" halfway through.
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 